@@ -0,0 +1,93 @@
+"""
+HTTP API for other internal apps, on the same triage core as the CLI (`utils/triage.py`).
+
+    uvicorn api:app --port 8000
+
+POST /v1/triage/text    {"description": "..."}        -> one result
+POST /v1/triage/image   raw image bytes as the body     -> one result (422 if not an image)
+POST /v1/triage/batch   {"items": [{"id", "description"}, ...]}
+                        -> one JSON line per item, streamed as each finishes
+GET  /healthz, GET /metrics (Prometheus text; needs METRICS_ENABLED=1 for data)
+"""
+import json
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from utils import metrics, settings
+from utils.triage import TriageItem, TriageRunner
+
+# Larger uploads are rejected before they reach the preprocessing pool
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+MAX_BATCH_ITEMS = 1000
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with TriageRunner(settings.TRIAGE_CONCURRENCY, settings.TRIAGE_PREP_WORKERS) as runner:
+        app.state.runner = runner
+        yield
+
+
+app = FastAPI(title="FirstAid AI triage", lifespan=lifespan)
+
+
+class TextReport(BaseModel):
+    description: str = Field(min_length=1)
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    description: str = Field(min_length=1)
+
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
+
+
+@app.post("/v1/triage/text")
+async def triage_text(report: TextReport, request: Request) -> dict:
+    item = TriageItem(id="text", kind="text", source="api", text=report.description)
+    return await request.app.state.runner.triage(item)
+
+
+@app.post("/v1/triage/image")
+async def triage_image(request: Request) -> dict:
+    # The photo is the raw request body (Content-Type image/jpeg, image/png, ...)
+    data = await request.body()
+    if not data:
+        raise HTTPException(status_code=400, detail="Send the image as the request body.")
+    if len(data) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail=f"Images are limited to {MAX_IMAGE_BYTES // (1024 * 1024)} MB.")
+    item = TriageItem(id="image", kind="image", source="api", data=data)
+    result = await request.app.state.runner.triage(item)
+    if result["status"] == "invalid":
+        raise HTTPException(status_code=422, detail=result["error"])
+    return result
+
+
+@app.post("/v1/triage/batch")
+async def triage_batch(batch: BatchRequest, request: Request) -> StreamingResponse:
+    items = [
+        TriageItem(id=entry.id or str(i), kind="text", source="api", text=entry.description)
+        for i, entry in enumerate(batch.items)
+    ]
+
+    async def lines():
+        async for record in request.app.state.runner.map(items):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/healthz")
+async def healthz() -> dict:
+    return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> str:
+    return metrics.render_prometheus()
@@ -1,13 +1,29 @@
+import time
+
 import streamlit as st
-import pandas as pd
 from utils.map_helper import (
-    find_nearby_facilities, 
-    find_nearby_facilities_by_coords,
-    show_facilities_map, 
-    parse_facilities_to_df,
-    reverse_geocode
+    reverse_geocode,
+    search_facilities_for_query,
+    search_facilities_near
+)
+from utils.ui_helper import (
+    show_first_aid_result,
+    show_location_banner,
+    show_location_result,
+    show_nearby_hospitals,
+    show_search_results
+)
+from utils import metrics, session_store, settings
+from utils.ai_helpers import (
+    IMAGE_ANALYSIS_FAILED,
+    GenerationStats,
+    analyze_image,
+    analyze_image_with_steps,
+    is_complete_answer,
+    stream_first_aid_steps
 )
-from utils.ai_helpers import analyze_image, generate_first_aid_steps
+from utils.image_prep import preprocess_image
+from utils.orchestration import StageTimer, run_stages
 from streamlit_geolocation import streamlit_geolocation
 
 
@@ -23,146 +39,245 @@ st.markdown(
 with st.sidebar:
     st.header("Navigation")
     page = st.radio("Go to:", ["First Aid Guide", "Find Nearby Hospitals"])
+    # Results are kept across reruns for this session; this forces fresh answers
+    if st.button("🔄 Clear saved results"):
+        session_store.invalidate()
 
-# --- PAGE 1: First Aid Guide ---
-if page == "First Aid Guide":
-    st.subheader("Analyze Injury")
+    # Diagnostics (METRICS_ENABLED=1): Prometheus endpoint, current metrics, per-request profiling
+    request_profile = None
+    if metrics.enabled:
+        metrics.serve()
+        with st.expander("📈 Diagnostics"):
+            # One-shot: the switch turns itself off once an interaction has been profiled
+            if st.session_state.pop("profile_done", False):
+                st.session_state["profile_request"] = False
+            armed = st.checkbox(
+                "Profile the next interaction",
+                key="profile_request",
+                on_change=lambda: st.session_state.update(profile_toggled=True),
+                help=f"Runs the next interaction under {settings.PROFILER}, once.",
+            )
+            # The rerun caused by ticking the box itself is not worth profiling
+            if armed and not st.session_state.pop("profile_toggled", False):
+                try:
+                    request_profile = metrics.Profile().start()
+                except metrics.ProfilerBusy:
+                    st.caption("Another session is being profiled; this interaction is not.")
+            st.session_state.pop("profile_toggled", None)
+            st.code(metrics.render_prometheus(), language="text")
 
-    uploaded_image = st.file_uploader("Upload an image (optional)", type=["jpg", "jpeg", "png"])
-    injury_description = st.text_area("Or describe the injury:")
+try:
+    # --- PAGE 1: First Aid Guide ---
+    if page == "First Aid Guide":
+        st.subheader("Analyze Injury")
 
-    if st.button("Analyze"):
-        if uploaded_image:
-            with st.spinner("Analyzing image..."):
-                analysis = analyze_image(uploaded_image)
-                st.success("✅ Image analyzed successfully.")
-                st.markdown(f"**Analysis Result:** {analysis}")
+        uploaded_image = st.file_uploader("Upload an image (optional)", type=["jpg", "jpeg", "png"])
+        injury_description = st.text_area("Or describe the injury:")
+        analysis_key = session_store.analysis_key(uploaded_image, injury_description)
+
+        if st.button("Analyze"):
+            stored = session_store.get(analysis_key) if analysis_key else None
+            if stored is not None:
+                show_first_aid_result(stored)
+                session_store.set_active("first_aid", analysis_key)
+            elif uploaded_image:
+                with st.spinner("Analyzing image..."):
+                    # Downscale and re-encode before upload
+                    try:
+                        prepared_image = preprocess_image(uploaded_image)
+                    except Exception as e:
+                        st.error(f"Error reading image: {e}")
+                        st.stop()
+                    st.caption(f"Image prepared for upload: {prepared_image.summary()}")
+                
+                    result = {}
+                    if settings.IMAGE_ANALYSIS_MODE == "two_step":
+                        analysis = analyze_image(prepared_image, on_error=st.error)
+                        st.success("✅ Image analyzed successfully.")
+                        st.markdown(f"**Analysis Result:** {analysis}")
+                        st.markdown("### 🩹 First Aid Steps")
+                        result = {
+                            "description": analysis,
+                            "steps": st.write_stream(stream_first_aid_steps(analysis, on_error=st.error))
+                        }
+                    else:
+                        # One request returns both sections; render each as soon as it arrives
+                        for section, text in analyze_image_with_steps(prepared_image, on_error=st.error):
+                            result[section] = text
+                            if section == "description":
+                                st.success("✅ Image analyzed successfully.")
+                                st.markdown(f"**Analysis Result:** {text}")
+                            else:
+                                st.markdown("### 🩹 First Aid Steps")
+                                st.write(text)
+                
+                    if is_complete_answer(result.get("steps")) and result["description"] != IMAGE_ANALYSIS_FAILED:
+                        session_store.put(analysis_key, result)
+                        session_store.set_active("first_aid", analysis_key)
+            elif injury_description:
                 st.markdown("### 🩹 First Aid Steps")
-                st.write(generate_first_aid_steps(analysis))
-        elif injury_description:
-            with st.spinner("Analyzing text..."):
-                steps = generate_first_aid_steps(injury_description)
+                # Stream the instructions so the first steps show up while the rest is generated
+                stats = GenerationStats()
+                steps = st.write_stream(stream_first_aid_steps(injury_description, stats, on_error=st.error))
                 st.success("✅ First aid advice ready.")
-                st.markdown("### 🩹 First Aid Steps")
-                st.write(steps)
-        else:
-            st.warning("Please upload an image or describe the injury.")
+                if stats.time_to_first_token is not None:
+                    st.caption(f"First words after {stats.time_to_first_token:.2f}s · complete in {stats.total_time:.2f}s")
+                # Only complete answers are kept: a partial answer followed by an error or a
+                # stored card would otherwise be shown again instead of asking once more
+                if is_complete_answer(steps):
+                    session_store.put(analysis_key, {"steps": steps})
+                    session_store.set_active("first_aid", analysis_key)
+            else:
+                st.warning("Please upload an image or describe the injury.")
+    
+        # On any other rerun, show the last answer again as long as the inputs are unchanged
+        elif analysis_key is not None and session_store.get_active("first_aid") == analysis_key:
+            show_first_aid_result(session_store.get(analysis_key))
 
-# --- PAGE 2: Find Nearby Hospitals ---
-elif page == "Find Nearby Hospitals":
-    st.subheader("🏥 Find Nearby Healthcare Facilities")
+    # --- PAGE 2: Find Nearby Hospitals ---
+    elif page == "Find Nearby Hospitals":
+        st.subheader("🏥 Find Nearby Healthcare Facilities")
+    
+        # Initialize session state for location
+        if 'user_location' not in st.session_state:
+            st.session_state.user_location = None
+        if 'use_auto_location' not in st.session_state:
+            st.session_state.use_auto_location = False
     
-    # Initialize session state for location
-    if 'user_location' not in st.session_state:
-        st.session_state.user_location = None
-    if 'use_auto_location' not in st.session_state:
-        st.session_state.use_auto_location = False
+        # Option 1: Use Device Location (Auto-detect)
+        col1, col2 = st.columns([1, 1])
     
-    # Option 1: Use Device Location (Auto-detect)
-    col1, col2 = st.columns([1, 1])
+        with col1:
+            st.markdown("**📍 Option 1: Use My Location**")
+            use_location = st.button("🗺️ Detect My Location", type="primary", use_container_width=True)
     
-    with col1:
-        st.markdown("**📍 Option 1: Use My Location**")
-        use_location = st.button("🗺️ Detect My Location", type="primary", use_container_width=True)
+        with col2:
+            st.markdown("**🔍 Option 2: Search by Address**")
+            location_query = st.text_input(
+                "Enter city or address:", 
+                placeholder="e.g., Austin, TX",
+                label_visibility="collapsed"
+            )
+            search_location = st.button("🔍 Search Hospitals", use_container_width=True)
     
-    with col2:
-        st.markdown("**🔍 Option 2: Search by Address**")
-        location_query = st.text_input(
-            "Enter city or address:", 
-            placeholder="e.g., Austin, TX",
-            label_visibility="collapsed"
+        # Hospitals are ranked nearest first and anything beyond this radius is left out
+        radius_km = st.select_slider(
+            "Search radius",
+            options=sorted({*settings.SEARCH_RADIUS_OPTIONS_KM, settings.FACILITY_SEARCH_RADIUS_KM}),
+            value=settings.FACILITY_SEARCH_RADIUS_KM,
+            format_func=lambda km: f"{km:g} km"
         )
-        search_location = st.button("🔍 Search Hospitals", use_container_width=True)
     
-    # Handle geolocation request
-    if use_location:
-        st.session_state.use_auto_location = True
+        # Handle geolocation request
+        if use_location:
+            st.session_state.use_auto_location = True
     
-    # Get user's geolocation if requested
-    if st.session_state.use_auto_location:
-        st.info("📍 **Your browser will now prompt you for location permission.**\n\nYou'll see options to:\n- ✅ **Allow this time** (one-time access)\n- ✅ **Allow always** (remember this choice)\n- ❌ **Deny** (block location access)")
+        # Get user's geolocation if requested
+        if st.session_state.use_auto_location:
+            st.info("📍 **Your browser will now prompt you for location permission.**\n\nYou'll see options to:\n- ✅ **Allow this time** (one-time access)\n- ✅ **Allow always** (remember this choice)\n- ❌ **Deny** (block location access)")
         
-        # Use streamlit-geolocation component which triggers browser's native permission dialog
-        # The browser's native dialog will show: "Allow this time", "Allow always", or "Deny"
-        try:
-            location_data = streamlit_geolocation(key="location_request")
+            # Use streamlit-geolocation component which triggers browser's native permission dialog
+            # The browser's native dialog will show: "Allow this time", "Allow always", or "Deny"
+            try:
+                location_data = streamlit_geolocation(key="location_request")
             
-            # Check if location was successfully obtained
-            if location_data and isinstance(location_data, dict) and 'latitude' in location_data and 'longitude' in location_data:
-                lat = location_data['latitude']
-                lon = location_data['longitude']
-                st.session_state.user_location = {'lat': lat, 'lon': lon}
+                # Check if location was successfully obtained
+                if location_data and isinstance(location_data, dict) and 'latitude' in location_data and 'longitude' in location_data:
+                    lat = location_data['latitude']
+                    lon = location_data['longitude']
+                    st.session_state.user_location = {'lat': lat, 'lon': lon}
+                    location_key = session_store.coords_key(lat, lon, radius_km)
+                    stored = session_store.get(location_key)
                 
-                # Get address from coordinates
-                address = reverse_geocode(lat, lon)
-                
-                if address:
-                    st.success(f"✅ Location detected: {address}")
-                    st.caption(f"Coordinates: {lat:.6f}, {lon:.6f}")
-                else:
-                    st.success(f"✅ Location detected at coordinates: {lat:.6f}, {lon:.6f}")
-                
-                # Automatically search for hospitals
-                with st.spinner("🔍 Searching nearby hospitals..."):
-                    results_text = find_nearby_facilities_by_coords(lat, lon)
-                    st.markdown("### 🏥 Nearby Hospitals")
-                    st.markdown(results_text)
+                    if stored is not None:
+                        show_location_result(stored)
+                    else:
+                        # Reverse geocoding and the hospital search don't depend on each other:
+                        # run them concurrently and render whichever finishes first
+                        location_slot = st.empty()
+                        location_slot.info(f"📍 Location detected at coordinates: {lat:.6f}, {lon:.6f} — looking up address...")
+                        hospitals_slot = st.container()
+                        search_timer = StageTimer()
+                        flow_start = time.perf_counter()
+                        stage_timings = {}
+                        result = {"lat": lat, "lon": lon, "address": None}
                     
-                    # Parse results and show map
-                    facilities_df = parse_facilities_to_df(results_text)
+                        with st.spinner("🔍 Searching nearby hospitals..."):
+                            for stage in run_stages(
+                                {
+                                    "address": lambda: reverse_geocode(lat, lon),
+                                    "hospitals": lambda: search_facilities_near(lat, lon, radius_km, timer=search_timer),
+                                },
+                                deadline=settings.LOCATION_FLOW_DEADLINE,
+                            ):
+                                stage_timings[stage.name] = stage.elapsed
+                            
+                                if stage.name == "address":
+                                    result["address"] = stage.value if stage.ok else None
+                                    show_location_banner(location_slot, result)
+                                    continue
+                            
+                                with hospitals_slot:
+                                    if not stage.ok:
+                                        st.markdown("### 🏥 Nearby Hospitals")
+                                        st.error(f"⚠️ Could not search for hospitals: {stage.error}")
+                                        continue
+                                
+                                    result["results_text"], result["facilities_df"] = stage.value
+                                    show_nearby_hospitals(lat, lon, result["results_text"], result["facilities_df"])
                     
-                    if not facilities_df.empty:
-                        # Add user location to map
-                        user_df = pd.DataFrame([{
-                            "name": "Your Location",
-                            "address": address or f"Lat: {lat}, Lon: {lon}",
-                            "lat": lat,
-                            "lon": lon
-                        }])
-                        
-                        # Combine user location with facilities
-                        combined_df = pd.concat([user_df, facilities_df], ignore_index=True)
-                        
-                        st.markdown("---")
-                        st.markdown("### 📍 Hospital Locations Map")
-                        st.map(combined_df, zoom=13)
-                        
-                        # Show facilities in a list
-                        st.markdown("### 📋 Hospitals Nearby")
-                        for idx, row in facilities_df.iterrows():
-                            if "lat" in row and "lon" in row:
-                                st.markdown(f"**{idx + 1}. {row['name']}**")
-                                st.markdown(f"📍 {row['address']}")
-                                st.markdown(f"Coordinates: ({row['lat']:.4f}, {row['lon']:.4f})")
-                            else:
-                                st.markdown(f"**{idx + 1}. {row['name']}**")
-                                st.markdown(f"📍 {row['address']}")
-                            st.markdown("---")
+                        # Keep successful searches for later reruns of this session
+                        if "facilities_df" in result and not str(result["results_text"]).startswith("⚠️"):
+                            session_store.put(location_key, result)
+                    
+                        # Per-stage timings: wall time vs. what the old sequential flow would have taken
+                        wall_time = time.perf_counter() - flow_start
+                        with st.expander("⏱️ Timings"):
+                            for name, elapsed in {**stage_timings, **search_timer.timings}.items():
+                                st.caption(f"{name}: {elapsed:.2f}s")
+                            st.caption(f"Total: {wall_time:.2f}s (sequential would be ~{sum(stage_timings.values()):.2f}s)")
                 
-                # Reset auto location flag after successful location
-                st.session_state.use_auto_location = False
-            elif location_data is not None:
-                st.warning("⚠️ Unable to get your location. Please check your browser permissions or try searching by address.")
+                    session_store.set_active("hospitals", location_key)
+                    # Reset auto location flag after successful location
+                    st.session_state.use_auto_location = False
+                elif location_data is not None:
+                    st.warning("⚠️ Unable to get your location. Please check your browser permissions or try searching by address.")
+                    st.session_state.use_auto_location = False
+            except Exception as e:
+                st.error(f"Error getting location: {e}")
+                st.info("💡 Please try searching by address instead, or check your browser's location permissions.")
                 st.session_state.use_auto_location = False
-        except Exception as e:
-            st.error(f"Error getting location: {e}")
-            st.info("💡 Please try searching by address instead, or check your browser's location permissions.")
-            st.session_state.use_auto_location = False
     
-    # Handle manual search by address
-    elif search_location:
-        if location_query.strip():
-            with st.spinner("🔍 Searching nearby hospitals..."):
-                results_text = find_nearby_facilities(location_query)
-                st.markdown("### 🏥 Nearby Hospitals")
-                st.markdown(results_text)
-                
-                # Parse results and show map
-                facilities_df = parse_facilities_to_df(results_text)
-                
-                if not facilities_df.empty:
-                    st.markdown("---")
-                    st.markdown("### 📍 Hospital Locations Map")
-                    show_facilities_map(facilities_df)
+        # Handle manual search by address
+        elif search_location:
+            if location_query.strip():
+                search_key = session_store.query_key(location_query, radius_km)
+                stored = session_store.get(search_key)
+                if stored is None:
+                    with st.spinner("🔍 Searching nearby hospitals..."):
+                        # Search, parse and rank by distance from the (concurrently geocoded) searched place
+                        results_text, facilities_df, origin = search_facilities_for_query(location_query, radius_km, on_error=st.error)
+                        stored = {"results_text": results_text, "facilities_df": facilities_df, "origin": origin}
+                    if not results_text.startswith("⚠️"):
+                        session_store.put(search_key, stored)
+            
+                session_store.set_active("hospitals", search_key)
+                show_search_results(stored["results_text"], stored["facilities_df"], stored["origin"])
+            else:
+                st.warning("Please enter a valid location.")
+    
+        # Any other rerun (e.g. toggling the sidebar): show the last search again without new requests
         else:
-            st.warning("Please enter a valid location.")
+            active_key = session_store.get_active("hospitals")
+            if active_key is not None:
+                stored = session_store.get(active_key)
+                if active_key[0] == "coords":
+                    show_location_result(stored)
+                else:
+                    show_search_results(stored["results_text"], stored["facilities_df"], stored["origin"])
+finally:
+    # Also on st.stop() and errors: a profiler left running would block every later profile
+    if request_profile is not None:
+        with st.sidebar.expander("🔬 Profile", expanded=True):
+            st.code(request_profile.stop(), language="text")
+        st.session_state["profile_done"] = True
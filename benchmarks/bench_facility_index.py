@@ -0,0 +1,72 @@
+"""
+Offline hospital index benchmark over a synthetic country-sized dataset.
+
+Builds an index of random points spread over a Germany-sized bounding box and
+times k-NN and radius queries against a brute-force NumPy scan. Run from the
+repository root:
+
+    python -m benchmarks.bench_facility_index --points 200000 --queries 2000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utils.facility_index import FacilityIndex
+from utils.geo import haversine_km
+
+BBOX = (47.3, 55.0, 5.9, 15.0)  # lat_min, lat_max, lon_min, lon_max
+
+
+def per_query_us(fn, queries):
+    start = time.perf_counter()
+    for lat, lon in queries:
+        fn(lat, lon)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--radius-km", type=float, default=10.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    lat_min, lat_max, lon_min, lon_max = BBOX
+    lats = rng.uniform(lat_min, lat_max, args.points)
+    lons = rng.uniform(lon_min, lon_max, args.points)
+    names = np.char.add("Hospital ", np.arange(args.points).astype(str))
+
+    start = time.perf_counter()
+    index = FacilityIndex(names, np.full(args.points, ""), lats, lons)
+    build = time.perf_counter() - start
+
+    queries = np.column_stack((
+        rng.uniform(lat_min, lat_max, args.queries),
+        rng.uniform(lon_min, lon_max, args.queries),
+    ))
+
+    def brute_force(lat, lon):
+        dist = haversine_km(lat, lon, lats, lons)
+        return np.argpartition(dist, args.k)[:args.k]
+
+    # Sanity check: the index must agree with the exhaustive scan.
+    for lat, lon in queries[:50]:
+        idx, _ = index.query(lat, lon, k=args.k)
+        assert set(idx) == set(brute_force(lat, lon)), "index disagrees with brute force"
+
+    knn = per_query_us(lambda lat, lon: index.query(lat, lon, k=args.k), queries)
+    radius = per_query_us(lambda lat, lon: index.query(lat, lon, k=None, radius_km=args.radius_km), queries)
+    scan = per_query_us(brute_force, queries[: max(len(queries) // 10, 1)])
+
+    print(f"{args.points:,} facilities, {args.queries:,} queries")
+    print(f"  build                      {build * 1000:10.1f} ms")
+    print(f"  k-NN (k={args.k}) query         {knn:10.1f} us")
+    print(f"  radius ({args.radius_km:g} km) query     {radius:10.1f} us")
+    print(f"  brute-force NumPy scan     {scan:10.1f} us  ({scan / knn:.0f}x slower than k-NN)")
+
+
+if __name__ == "__main__":
+    main()
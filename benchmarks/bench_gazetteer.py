@@ -0,0 +1,118 @@
+"""
+Offline reverse geocoder benchmark over a synthetic world-sized gazetteer.
+
+Builds a gazetteer of clustered places (about the size of the GeoNames
+cities500 dump, up to Svalbard at 80N), saves and memory-maps it, checks lookups
+against a brute-force scan (including high latitudes, where grid cells are
+narrow) and reports lookups/sec, bytes per place and the process RSS growth.
+Run from the repository root:
+
+    python -m benchmarks.bench_gazetteer --places 200000 --queries 20000
+"""
+import argparse
+import math
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+
+from utils.gazetteer import Gazetteer, build_gazetteer
+from utils.geo import haversine_km
+
+# Footprint targets: bytes per place on disk, and RSS growth once mapped and queried
+TARGET_BYTES_PER_PLACE = 40
+TARGET_RSS_MB = 16
+# High-latitude points checked against the full scan besides random ones (Svalbard, Tromso)
+POLAR_CHECKS = [(79.39, -7.85), (78.22, 15.65), (69.65, 18.96)]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:  # not Linux: peak RSS is the best available figure
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if os.uname().sysname == "Darwin" else peak / 1e3
+
+
+def synthetic_places(n, rng):
+    """Places clustered around random "metro areas", with repeating region and country names."""
+    centers = np.column_stack((rng.uniform(-55, 80, n // 50 + 1), rng.uniform(-180, 180, n // 50 + 1)))
+    which = rng.integers(0, len(centers), n)
+    lats = np.clip(centers[which, 0] + rng.normal(0, 0.5, n), -89.9, 89.9)
+    lons = (centers[which, 1] + rng.normal(0, 0.5, n) + 180) % 360 - 180
+    # Two to four syllables: about the length of real place names, with the odd repeat
+    syllables = np.array(["ka", "lo", "mer", "san", "ville", "ton", "ber", "ri", "a", "dor", "wick", "ham", "el", "os"])
+    names = ["".join(syllables[rng.integers(0, len(syllables), rng.integers(2, 5))]).title() for _ in range(n)]
+    return [
+        {"name": names[i], "region": f"Region {which[i] % 3000}", "country": f"C{which[i] % 250}",
+         "lat": float(lats[i]), "lon": float(lons[i])}
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--places", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--max-km", type=float, default=25.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    records = synthetic_places(args.places, rng)
+    # Queries near real places (what users send) plus some in the middle of nowhere
+    near = rng.integers(0, args.places, args.queries)
+    queries = np.column_stack((
+        [records[i]["lat"] for i in near] + rng.normal(0, 0.05, args.queries),
+        [records[i]["lon"] for i in near] + rng.normal(0, 0.05, args.queries),
+    ))
+    queries[::10] = np.column_stack((rng.uniform(-60, 75, len(queries[::10])), rng.uniform(-180, 180, len(queries[::10]))))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        build_gazetteer(records).save(tmp)
+        build = time.perf_counter() - start
+        disk = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+        del records
+
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        gazetteer = Gazetteer.load(tmp)
+        load = time.perf_counter() - start
+
+        # Sanity check: the grid search must agree with an exhaustive scan, also at high
+        # latitudes where a degree of longitude is a fraction of a degree of latitude
+        lats, lons = np.asarray(gazetteer.lats, dtype=np.float64), np.asarray(gazetteer.lons, dtype=np.float64)
+        polar = np.column_stack((rng.uniform(55, 80, 200), rng.uniform(-180, 180, 200)))
+        for lat, lon in np.vstack((queries[:200], polar, POLAR_CHECKS)):
+            _, dist = gazetteer.query(lat, lon, max_km=args.max_km)
+            exact = haversine_km(lat, lon, lats, lons).min()
+            expected = exact if exact <= args.max_km else math.inf
+            assert math.isclose(dist, expected, rel_tol=1e-4, abs_tol=1e-3), f"grid {dist} != scan {expected}"
+        del lats, lons
+
+        rss_mapped = rss_mb()
+        start = time.perf_counter()
+        hits = sum(gazetteer.query(lat, lon, max_km=args.max_km)[0] >= 0 for lat, lon in queries)
+        lookup = time.perf_counter() - start
+        start = time.perf_counter()
+        for lat, lon in queries[:2000]:
+            gazetteer.describe(lat, lon, max_km=args.max_km)
+        describe = (time.perf_counter() - start) / min(len(queries), 2000)
+        rss_after = rss_mb()
+
+    bytes_per_place = disk / args.places
+    print(f"{args.places:,} places, {args.queries:,} queries ({hits / len(queries):.0%} within {args.max_km:g} km)")
+    print(f"  build + save          {build * 1000:10.1f} ms")
+    print(f"  load (memory-map)     {load * 1000:10.2f} ms")
+    print(f"  nearest place         {lookup / len(queries) * 1e6:10.1f} us   ({len(queries) / lookup:,.0f} lookups/s)")
+    print(f"  describe() with names {describe * 1e6:10.1f} us")
+    print(f"  on disk               {disk / 1e6:10.2f} MB   ({bytes_per_place:.1f} B/place, target <= {TARGET_BYTES_PER_PLACE})")
+    print(f"  RSS growth            {max(rss_after - rss_before, 0.0):10.2f} MB   "
+          f"(after the check scan {rss_mapped - rss_before:+.1f} MB, target <= {TARGET_RSS_MB})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Geocoding pipeline benchmark against a local stub Nominatim server.
+
+Compares the old one-at-a-time lookups with the concurrent pipeline, cold and
+with a warm cache. By default the pipeline keeps the configured rate limit
+(NOMINATIM_RATE_PER_SEC, 1 request/s for the public server), which caps cold
+lookups whatever the concurrency; `--rate 0` models a self-hosted Nominatim
+without a limit. Run from the repository root:
+
+    python -m benchmarks.bench_geocoding --addresses 5 --latency 0.3
+    python -m benchmarks.bench_geocoding --addresses 5 --latency 0.3 --rate 0
+"""
+import argparse
+import tempfile
+import time
+
+import requests
+
+from benchmarks.stubs import StubNominatim
+from utils import settings
+from utils.rate_limit import TokenBucket
+
+
+def serial_lookup(url, addresses, rate):
+    """The pre-pipeline behaviour: a fresh blocking request per address, within the same rate limit."""
+    bucket = TokenBucket(rate=rate, capacity=1)
+    for address in addresses:
+        bucket.acquire()
+        requests.get(
+            f"{url}/search",
+            params={"q": address, "format": "json", "limit": 1},
+            headers={"User-Agent": "FirstAid-AI-Agent/1.0"},
+            timeout=5,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--addresses", type=int, default=5, help="number of hospital addresses per answer")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub server latency in seconds")
+    parser.add_argument("--workers", type=int, default=5, help="geocoding worker pool size")
+    parser.add_argument(
+        "--rate", type=float, default=settings.NOMINATIM_RATE_PER_SEC,
+        help="token bucket rate (req/s); defaults to NOMINATIM_RATE_PER_SEC, 0 disables it",
+    )
+    args = parser.parse_args()
+
+    addresses = [f"{100 + i} Medical Center Dr, Austin, TX" for i in range(args.addresses)]
+
+    with StubNominatim(latency=args.latency) as stub, tempfile.TemporaryDirectory() as cache_dir:
+        # The rate limiter is built when utils.geocoding is imported, so set these first
+        settings.NOMINATIM_URL = stub.url
+        settings.NOMINATIM_RATE_PER_SEC = args.rate
+        settings.CACHE_DIR = cache_dir
+        from utils import geocoding
+
+        start = time.perf_counter()
+        serial_lookup(stub.url, addresses, args.rate)
+        serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        geocoding.geocode_many(addresses, max_workers=args.workers)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        geocoding.geocode_many(addresses, max_workers=args.workers)
+        warm = time.perf_counter() - start
+
+    print(f"{args.addresses} addresses, {args.latency * 1000:.0f} ms stub latency, "
+          f"{args.workers} workers, rate={args.rate or 'unlimited'}")
+    print(f"  serial (old)        {serial * 1000:8.1f} ms")
+    print(f"  concurrent, cold    {cold * 1000:8.1f} ms  ({serial / cold:.1f}x)")
+    print(f"  concurrent, cached  {warm * 1000:8.1f} ms  ({serial / warm:.0f}x)")
+    print(f"  stub requests served: {stub.requests}")
+    if args.rate:
+        print(f"  note: at {args.rate:g} req/s the rate limit, not the latency, bounds cold lookups; "
+              f"concurrency only pays off with the cache or a self-hosted Nominatim (--rate 0)")
+
+
+if __name__ == "__main__":
+    main()
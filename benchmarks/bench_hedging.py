@@ -0,0 +1,114 @@
+"""
+Hedged requests and latency budget benchmark.
+
+Runs first aid requests against offline models with a heavy tail: the primary
+usually starts answering in about 0.6 s but stalls for 8-30 s on some calls, the
+lighter hedge model is a bit faster and stalls less often. Compares waiting for
+the primary, a budget alone (stored protocol card on a miss) and a budget with
+adaptive hedging, reporting latency percentiles, protocol fallbacks, extra
+upstream calls and the hedge delay learned, for each primary stall rate in
+--primary-stall (rates above 100 - HEDGE_PERCENTILE check that a degrading
+primary is hedged sooner, not later). Latencies are scaled by --scale so a run
+takes seconds. Run from the repository root:
+
+    python -m benchmarks.bench_hedging --requests 400 --scale 0.1 --primary-stall 0.08 0.25 1
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import settings
+from utils.fake_gemini import FakeAPIError, FakeModel, FakeResponse
+from utils.gemini_client import GeminiClient, set_gemini_client
+from utils.hedging import HedgePolicy, LatencyBudgetExceeded, hedged_generate
+
+PRIMARY, HEDGE = "primary-model", "hedge-model"
+# (median first token s, stall probability, generation time after the first token s)
+PROFILES = {PRIMARY: (0.6, 0.08, 0.8), HEDGE: (0.4, 0.02, 0.6)}
+
+
+class TailLatencyModel(FakeModel):
+    """
+    FakeModel whose time to first token is drawn per call from a log-normal with occasional
+    stalls. Like the real SDK it gives up at the request timeout (the deadline), which frees
+    the client's concurrency slot.
+    """
+
+    scale = 0.1
+
+    def generate_content(self, contents, *, stream=False, request_options=None, **kwargs):
+        median, stall, rest = PROFILES[self.model_name]
+        first = random.uniform(8, 30) if random.random() < stall else random.lognormvariate(0, 0.35) * median
+        timeout = (request_options or {}).get("timeout") or float("inf")
+        return self._tail_stream(self.responder(self.model_name, contents), first * self.scale, rest * self.scale, timeout)
+
+    def _tail_stream(self, text, first, rest, timeout):
+        if first > timeout:
+            time.sleep(timeout)
+            raise FakeAPIError(504, "deadline exceeded")
+        time.sleep(first)
+        words = text.split(" ")
+        for i in range(0, len(words), 4):
+            time.sleep(rest / (len(words) / 4))
+            yield FakeResponse(" ".join(words[i:i + 4]) + " ", 0)
+
+
+def run(mode, requests, concurrency, budget, scale):
+    policy = HedgePolicy(initial_delay=settings.HEDGE_INITIAL_DELAY * scale, min_delay=settings.HEDGE_MIN_DELAY * scale)
+    # Abandoned stalled calls keep their slot until the deadline (as with the real SDK);
+    # enough slots that this does not delay new requests and skew the policy being measured
+    client = GeminiClient(model_factory=TailLatencyModel, max_concurrency=concurrency * 8, max_retries=0)
+    set_gemini_client(client)
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            hedged_generate("steps", f"request {i}", PRIMARY, HEDGE if mode == "hedged" else None,
+                            budget=0 if mode == "wait" else budget * scale, policy=policy)
+            fallback = False
+        except LatencyBudgetExceeded:
+            fallback = True
+        return (time.perf_counter() - start) / scale, fallback
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    set_gemini_client(None)
+    latencies = sorted(r[0] for r in results)
+    pct = lambda p: latencies[min(int(len(latencies) * p / 100), len(latencies) - 1)]
+    return {
+        "p50": pct(50), "p95": pct(95), "p99": pct(99), "max": latencies[-1],
+        "fallbacks": sum(r[1] for r in results) / requests,
+        "extra_calls": client.calls / requests - 1,
+        "delay": policy.stats(budget * scale).get("steps", {}).get("hedge_delay", 0) / scale,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--budget", type=float, default=settings.LATENCY_BUDGET_SECONDS)
+    parser.add_argument("--scale", type=float, default=0.1, help="multiplies every simulated latency")
+    parser.add_argument("--primary-stall", type=float, nargs="+", default=[0.08, 0.25],
+                        help="share of primary calls that stall for 8-30 s")
+    args = parser.parse_args()
+
+    TailLatencyModel.scale = args.scale
+    print(f"{args.requests} requests, {args.concurrency} concurrent, budget {args.budget:g}s "
+          f"(latencies in unscaled seconds)")
+    for stall in args.primary_stall:
+        random.seed(42)
+        median, _, rest = PROFILES[PRIMARY]
+        PROFILES[PRIMARY] = (median, stall, rest)
+        print(f"\nprimary stalls {stall:.0%}")
+        print(f"{'mode':<10}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}{'protocol':>10}{'extra calls':>13}{'hedge after':>13}")
+        for mode in ("wait", "budget", "hedged"):
+            r = run(mode, args.requests, args.concurrency, args.budget, args.scale)
+            hedge_after = f"{r['delay']:.2f}s" if mode == "hedged" else "-"
+            print(f"{mode:<10}{r['p50']:>8.2f}{r['p95']:>8.2f}{r['p99']:>8.2f}{r['max']:>8.2f}"
+                  f"{r['fallbacks']:>10.1%}{r['extra_calls']:>13.1%}{hedge_after:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Image triage latency benchmark: two-step path vs the combined single request.
+
+Uses the offline FakeModel, so each model call costs a fixed, configurable
+latency. Reports when the description and the first aid steps become
+available for each mode. Run from the repository root:
+
+    python -m benchmarks.bench_image_analysis --latency 1.5 --runs 5
+"""
+import argparse
+import io
+import statistics
+import time
+
+from PIL import Image
+
+from utils.ai_helpers import analyze_image, analyze_image_with_steps, generate_first_aid_steps
+from utils.fake_gemini import fake_model_factory
+from utils.gemini_client import GeminiClient, set_gemini_client
+
+
+def sample_upload():
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (200, 120, 110)).save(buffer, format="JPEG")
+    buffer.seek(0)
+    return buffer
+
+
+def two_step():
+    start = time.perf_counter()
+    analysis = analyze_image(sample_upload())
+    description_at = time.perf_counter() - start
+    generate_first_aid_steps(analysis)
+    return description_at, time.perf_counter() - start
+
+
+def combined():
+    start = time.perf_counter()
+    times = {}
+    for section, _ in analyze_image_with_steps(sample_upload()):
+        times[section] = time.perf_counter() - start
+    return times["description"], times["steps"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=1.5, help="stub model latency per request (s)")
+    parser.add_argument("--first-token", type=float, default=0.5, help="stub time to first chunk (s)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    set_gemini_client(GeminiClient(
+        model_factory=fake_model_factory(latency=args.latency, first_token_latency=args.first_token)
+    ))
+
+    print(f"stub latency {args.latency:.2f}s per request, {args.runs} runs (median)")
+    results = {}
+    for label, fn in (("two_step", two_step), ("combined", combined)):
+        runs = [fn() for _ in range(args.runs)]
+        results[label] = [statistics.median(r[i] for r in runs) for i in (0, 1)]
+        description_at, steps_at = results[label]
+        print(f"  {label:<9} description at {description_at:6.2f}s   steps at {steps_at:6.2f}s")
+
+    saved = results["two_step"][1] - results["combined"][1]
+    print(f"Combined mode delivers the steps {saved:.2f}s sooner ({results['two_step'][1] / results['combined'][1]:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
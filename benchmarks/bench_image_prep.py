@@ -0,0 +1,90 @@
+"""
+Image preprocessing benchmark over a folder of sample photos.
+
+Without --folder, a few synthetic 12 MP phone-style JPEGs (with an EXIF
+orientation tag) are generated in a temporary directory. For each image it
+reports bytes before/after and preprocessing time, next to a naive full
+decode + re-encode at the same target size. Run from the repository root:
+
+    python -m benchmarks.bench_image_prep --folder ~/Pictures/injuries
+"""
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from utils.image_prep import preprocess_image
+
+EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def make_samples(folder, count=4, size=(4032, 3024)):
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        # Smooth gradient plus noise compresses roughly like a real photo.
+        y, x = np.mgrid[0:size[1], 0:size[0]]
+        base = np.stack([(x * 255 // size[0]), (y * 255 // size[1]), np.full_like(x, 120 + 30 * i)], axis=-1)
+        noise = rng.integers(-12, 12, base.shape)
+        pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientation: rotate 90° clockwise, as phones often do
+        Image.fromarray(pixels).save(os.path.join(folder, f"sample_{i}.jpg"), quality=92, exif=exif)
+
+
+def naive(data, max_edge, quality):
+    """Full-resolution decode, high-quality resize, re-encode."""
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    image.thumbnail((max_edge, max_edge), resample=Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=quality)
+    return len(out.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--folder", help="folder of sample images (default: generate synthetic photos)")
+    parser.add_argument("--max-edge", type=int, default=1024)
+    parser.add_argument("--format", default="JPEG", choices=["JPEG", "WEBP"])
+    parser.add_argument("--quality", type=int, default=85)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.folder
+        if folder is None:
+            folder = tmp
+            make_samples(folder)
+
+        paths = sorted(
+            os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(EXTENSIONS)
+        )
+        if not paths:
+            parser.error(f"no images found in {folder}")
+
+        prep_times, naive_times, bytes_in, bytes_out = [], [], 0, 0
+        for path in paths:
+            with open(path, "rb") as f:
+                upload = io.BytesIO(f.read())
+
+            prepared = preprocess_image(upload, max_edge=args.max_edge, fmt=args.format, quality=args.quality)
+            start = time.perf_counter()
+            naive(upload.getvalue(), args.max_edge, args.quality)
+            naive_times.append(time.perf_counter() - start)
+
+            prep_times.append(prepared.elapsed)
+            bytes_in += prepared.bytes_in
+            bytes_out += prepared.bytes_out
+            print(f"  {os.path.basename(path):<24} {prepared.summary()}")
+
+    print(f"\n{len(paths)} images: {bytes_in / 1e6:.2f} MB → {bytes_out / 1e6:.2f} MB "
+          f"({bytes_in / max(bytes_out, 1):.0f}x smaller uploads)")
+    print(f"  preprocess median {statistics.median(prep_times) * 1000:.0f} ms, "
+          f"naive full decode median {statistics.median(naive_times) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Import-time benchmark for the hospital helpers.
+
+Each measurement runs in a fresh interpreter with `python -X importtime`, the
+same cold start a new Streamlit worker pays. "eager" imports what
+utils/map_helper.py used to pull in at module load (streamlit,
+google.generativeai, pandas, requests); "lazy" imports the library as it is now.
+Run from the repository root:
+
+    python -m benchmarks.bench_import_time --runs 5
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+
+SCENARIOS = {
+    "eager (old map_helper deps)": "import streamlit, google.generativeai, pandas, requests",
+    "lazy utils.map_helper": "import utils.map_helper",
+}
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(statement: str):
+    """Returns (total_us, {top-level module: cumulative_us}) for one cold interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", statement],
+        capture_output=True, text=True, check=True,
+    )
+    top_level = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        # Top-level imports are the ones printed with a single space of indentation.
+        if match and len(match.group(3)) == 1:
+            top_level[match.group(4)] = int(match.group(2))
+    return sum(top_level.values()), top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="slowest top-level imports to list")
+    args = parser.parse_args()
+
+    results = {}
+    for label, statement in SCENARIOS.items():
+        runs = [measure(statement) for _ in range(args.runs)]
+        results[label] = statistics.median(total for total, _ in runs)
+        slowest = sorted(runs[-1][1].items(), key=lambda kv: kv[1], reverse=True)[: args.top]
+        print(f"{label}: median {results[label] / 1000:.1f} ms over {args.runs} runs")
+        for module, cumulative in slowest:
+            print(f"    {cumulative / 1000:8.1f} ms  {module}")
+
+    eager, lazy = results.values()
+    print(f"\nCold import saving: {(eager - lazy) / 1000:.1f} ms ({eager / max(lazy, 1):.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Instrumentation overhead benchmark.
+
+Times an empty function and two real hot paths (protocol matching and
+facility parsing) undecorated, with metrics disabled and with metrics
+enabled, then prints a sample of the Prometheus exposition. Run from the
+repository root:
+
+    python -m benchmarks.bench_metrics_overhead --runs 200000
+"""
+import argparse
+import json
+import time
+
+from utils import metrics
+from utils.map_helper import parse_facilities_to_df
+from utils.protocols import find_protocol
+
+
+def noop():
+    return None
+
+
+def per_call(fn, arg, runs):
+    start = time.perf_counter()
+    if arg is None:
+        for _ in range(runs):
+            fn()
+    else:
+        for _ in range(runs):
+            fn(arg)
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=200_000, help="calls of the empty function")
+    parser.add_argument("--hot-runs", type=int, default=2_000, help="calls of each hot path")
+    args = parser.parse_args()
+
+    facilities = json.dumps([
+        {"name": f"Hospital {i}", "address": f"{i} Main St", "lat": 30.2 + i / 100, "lon": -97.7,
+         "distance_km": 1.0 + i, "phone": None}
+        for i in range(8)
+    ])
+    cases = [
+        ("empty function", noop, None, args.runs),
+        ("find_protocol", find_protocol, "I burned my hand on the stove", args.hot_runs),
+        ("parse_facilities_to_df", parse_facilities_to_df, facilities, args.hot_runs),
+    ]
+
+    print(f"{'':<24}{'undecorated':>14}{'disabled':>14}{'enabled':>14}")
+    for label, fn, arg, runs in cases:
+        raw = getattr(fn, "__wrapped__", fn)
+        wrapped = metrics.timed(label)(raw) if raw is fn else fn
+        metrics.set_enabled(False)
+        timings = [per_call(raw, arg, runs), per_call(wrapped, arg, runs)]
+        metrics.set_enabled(True)
+        timings.append(per_call(wrapped, arg, runs))
+        print(f"{label:<24}" + "".join(f"{t * 1e6:12.2f}µs" for t in timings))
+
+    print("\nSample exposition:")
+    print("\n".join(line for line in metrics.render_prometheus().splitlines() if "_bucket" not in line))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Facility parsing benchmark: structured JSON answers vs the free-text regex fallback.
+
+Generates equivalent answers in both formats (no network) and reports parse
+time per answer and how many rows each path would have to send to the geocoder.
+Run from the repository root:
+
+    python -m benchmarks.bench_parse_facilities --rows 10 --runs 2000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import pandas as pd
+
+from utils.map_helper import _load_structured, _parse_free_text, _structured_to_df
+
+
+def make_answers(rows, missing_coords, seed=0):
+    """One JSON answer and one numbered free-text answer describing the same facilities."""
+    rng = random.Random(seed)
+    records, lines = [], []
+    for i in range(rows):
+        lat, lon = round(30.2 + rng.uniform(-0.1, 0.1), 6), round(-97.7 + rng.uniform(-0.1, 0.1), 6)
+        name = f"Hospital {i + 1}"
+        address = f"{100 + i} Main St, Austin, TX"
+        has_coords = rng.random() >= missing_coords
+        records.append({
+            "name": name, "address": address,
+            "lat": lat if has_coords else None, "lon": lon if has_coords else None,
+            "distance_km": round(rng.uniform(0.5, 10), 1), "phone": None,
+        })
+        # Free-text answers lose the coordinates more often than the structured ones do.
+        if has_coords and i % 2 == 0:
+            lines.append(f"{i + 1}. {name} | {address} | {lat}, {lon}")
+        else:
+            lines.append(f"{i + 1}. {name}, {address}")
+    return json.dumps(records), "\n".join(lines)
+
+
+def time_per_call(fn, text, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn(text)
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--missing-coords", type=float, default=0.1,
+                        help="share of structured rows the model leaves without coordinates")
+    args = parser.parse_args()
+
+    json_text, free_text_answer = make_answers(args.rows, args.missing_coords)
+
+    def structured(text):
+        return _structured_to_df(_load_structured(text))
+
+    def free_text(text):
+        return pd.DataFrame(_parse_free_text(text)[0])
+
+    timings = {
+        "json": [time_per_call(structured, json_text, args.runs) for _ in range(3)],
+        "regex": [time_per_call(free_text, free_text_answer, args.runs) for _ in range(3)],
+    }
+    df = structured(json_text)
+    geocode = {
+        "json": int(df["lat"].isna().sum()),
+        "regex": len(_parse_free_text(free_text_answer)[1]),
+    }
+
+    print(f"{args.rows} facilities per answer, {args.runs} runs (median of 3)")
+    for label in ("json", "regex"):
+        print(f"  {label:<6} {statistics.median(timings[label]) * 1e6:8.1f} µs per answer   "
+              f"{geocode[label]:3d} rows to geocode")
+    print("Each geocoded row costs at least one Nominatim request (1 req/s policy).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Offline accuracy and latency benchmark for the protocol card matcher.
+
+Runs every labelled description in benchmarks/data/triage_samples.csv through
+the matcher. "none" rows are long-tail cases and emergencies that should go to
+the LLM (red flags, negations, single vague words). For
+the configured threshold/margin it reports how many descriptions are answered
+offline (coverage), how many of those get the right card (precision), how many
+"none" rows are wrongly answered from a card, and the per-match latency.
+Run from the repository root:
+
+    python -m benchmarks.bench_protocol_match
+"""
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+from utils import settings
+from utils.protocols import get_protocol_matcher, safe_match
+
+SAMPLES = os.path.join(os.path.dirname(__file__), "data", "triage_samples.csv")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=SAMPLES)
+    parser.add_argument("--threshold", type=float, default=settings.PROTOCOL_MATCH_THRESHOLD)
+    parser.add_argument("--margin", type=float, default=settings.PROTOCOL_MATCH_MARGIN)
+    parser.add_argument("--repeat", type=int, default=200, help="timing repetitions per description")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every description and its match")
+    args = parser.parse_args()
+
+    with open(args.samples, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    start = time.perf_counter()
+    matcher = get_protocol_matcher()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    answered = correct = false_answers = 0
+    known = sum(row["label"] != "none" for row in rows)
+    for row in rows:
+        match = matcher.match(row["description"])
+        confident = safe_match(row["description"], args.threshold, args.margin) is not None
+        predicted = match.card.id if confident else "none"
+        if confident:
+            answered += 1
+            correct += predicted == row["label"]
+            false_answers += row["label"] == "none"
+        if args.verbose:
+            score = f"{match.score:.2f}/{match.runner_up:.2f}" if match else "-"
+            flag = "ok " if predicted == row["label"] else "BAD"
+            print(f"  {flag} {row['description'][:50]:<50} {row['label']:<18} -> {predicted:<18} {score}")
+
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            matcher.match(row["description"])
+        timings.append((time.perf_counter() - start) / args.repeat * 1e6)
+
+    print(f"{len(rows)} labelled descriptions ({known} with a card, {len(rows) - known} long tail), "
+          f"threshold {args.threshold}, margin {args.margin}")
+    print(f"  answered offline   {answered}/{len(rows)}  ({answered / known:.0%} of card-able descriptions)")
+    print(f"  precision          {correct}/{max(answered, 1)}  ({correct / max(answered, 1):.0%})")
+    print(f"  must-not-answer answered {false_answers}/{len(rows) - known} (should be 0)")
+    print(f"  index build        {build_ms:.1f} ms")
+    print(f"  match latency      p50 {np.percentile(timings, 50):.0f} us, p99 {np.percentile(timings, 99):.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Facility ranking and rendering benchmark.
+
+Ranking: a per-row Python loop (haversine + bearing with `math`, then sorted)
+against the vectorized `rank_facilities`. Rendering: the old per-row markdown
+list (three or four st.markdown calls per hospital, via iterrows) against one
+table and one pydeck layer, run through Streamlit's AppTest, counting the
+elements each script run sends to the browser. Run from the repository root:
+
+    python -m benchmarks.bench_rank_render --rows 5 50 500
+"""
+import argparse
+import math
+import time
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from utils.map_helper import rank_facilities
+
+ORIGIN = (30.2672, -97.7431)
+
+
+def synthetic_facilities(n, rng):
+    lats = ORIGIN[0] + rng.normal(0, 0.05, n)
+    lons = ORIGIN[1] + rng.normal(0, 0.05, n)
+    lats[::7] = np.nan  # some answers come without coordinates
+    lons[::7] = np.nan
+    return pd.DataFrame({
+        "name": [f"Hospital {i}" for i in range(n)],
+        "address": [f"{i} Main St, Austin, TX" for i in range(n)],
+        "lat": lats,
+        "lon": lons,
+        "distance_km": rng.uniform(0.5, 20, n),
+        "phone": "+1 512-000-0000",
+    })
+
+
+def rank_per_row(df, lat, lon, radius_km):
+    """Row-at-a-time equivalent of rank_facilities."""
+    rows = []
+    for _, row in df.iterrows():
+        if pd.notna(row["lat"]):
+            p1, p2 = math.radians(lat), math.radians(row["lat"])
+            dlon = math.radians(row["lon"] - lon)
+            a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
+            distance = 2 * 6371.0088 * math.asin(math.sqrt(min(a, 1.0)))
+            bearing = math.degrees(math.atan2(
+                math.sin(dlon) * math.cos(p2), math.cos(p1) * math.sin(p2) - math.sin(p1) * math.cos(p2) * math.cos(dlon)
+            )) % 360
+        else:
+            distance, bearing = row["distance_km"], math.nan
+        if not distance > radius_km:
+            rows.append({**row.to_dict(), "distance_km": distance, "bearing_deg": bearing})
+    rows.sort(key=lambda r: math.inf if pd.isna(r["distance_km"]) else r["distance_km"])
+    return pd.DataFrame(rows)
+
+
+def legacy_script():
+    import pandas as pd
+    import streamlit as st
+
+    facilities_df = st.session_state["facilities_df"]
+    lat, lon = 30.2672, -97.7431
+    user_df = pd.DataFrame([{"name": "Your Location", "address": f"Lat: {lat}, Lon: {lon}", "lat": lat, "lon": lon}])
+    st.map(pd.concat([user_df, facilities_df], ignore_index=True).dropna(subset=["lat", "lon"]), zoom=13)
+    for idx, row in facilities_df.iterrows():
+        st.markdown(f"**{idx + 1}. {row['name']}**")
+        st.markdown(f"📍 {row['address']}")
+        if pd.notna(row.get("lat")) and pd.notna(row.get("lon")):
+            st.markdown(f"Coordinates: ({row['lat']:.4f}, {row['lon']:.4f})")
+            if pd.notna(row.get("distance_km")):
+                st.markdown(f"Distance: {row['distance_km']:.1f} km")
+        st.markdown("---")
+
+
+def batched_script():
+    import streamlit as st
+    from utils.ui_helper import show_facilities_map, show_facilities_table
+
+    facilities_df = st.session_state["facilities_df"]
+    show_facilities_table(facilities_df)
+    show_facilities_map(facilities_df, origin=(30.2672, -97.7431))
+
+
+def render(script, df, runs):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_function(script, default_timeout=60)
+    at.session_state["facilities_df"] = df
+    at.run()
+    elements = sum(1 for _ in at.main)
+    start = time.perf_counter()
+    for _ in range(runs):
+        at.run()
+    return elements, (time.perf_counter() - start) / runs
+
+
+def per_call(fn, runs):
+    """Best of three timings, after one warm-up call."""
+    fn()
+    return min(timeit.repeat(fn, number=runs, repeat=3)) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[5, 50, 500])
+    parser.add_argument("--radius-km", type=float, default=10.0)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'rows':>6}{'rank per-row':>15}{'vectorized':>13}{'old render':>22}{'table + layer':>22}")
+    for n in args.rows:
+        df = synthetic_facilities(n, rng)
+        ranked = rank_facilities(df, *ORIGIN, args.radius_km)
+        expected = rank_per_row(df, *ORIGIN, args.radius_km)
+        assert list(ranked["name"]) == list(expected["name"]), "vectorized order differs from the per-row loop"
+
+        loop = per_call(lambda: rank_per_row(df, *ORIGIN, args.radius_km), args.runs)
+        vectorized = per_call(lambda: rank_facilities(df, *ORIGIN, args.radius_km), args.runs)
+        old_elements, old_time = render(legacy_script, df, max(args.runs // 4, 1))
+        new_elements, new_time = render(batched_script, ranked, max(args.runs // 4, 1))
+        print(f"{n:>6}{loop * 1e3:>12.2f} ms{vectorized * 1e3:>10.2f} ms"
+              f"{old_elements:>8} el {old_time * 1e3:>7.1f} ms{new_elements:>8} el {new_time * 1e3:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
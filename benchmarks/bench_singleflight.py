@@ -0,0 +1,99 @@
+"""
+Request coalescing benchmark: a burst of sessions searching the same area at once.
+
+Every simulated session geocodes the city, runs the address and coordinate
+hospital searches (same city spelled differently, GPS positions a few metres
+apart) and reverse geocodes its position, all starting together. The burst
+runs against the offline FakeModel and a local stub Nominatim, once with
+single flight disabled and once enabled, each with empty caches. Run from the
+repository root:
+
+    python -m benchmarks.bench_singleflight --sessions 50 --latency 1.0
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.stubs import StubNominatim
+
+SPELLINGS = ["Austin, TX", "austin tx", "Austin,  TX", "AUSTIN, TX."]
+
+
+def session(i, barrier, latencies):
+    from utils import map_helper
+
+    rng = random.Random(i)
+    lat, lon = 30.2672 + rng.uniform(-2e-4, 2e-4), -97.7431 + rng.uniform(-2e-4, 2e-4)
+    city = SPELLINGS[i % len(SPELLINGS)]
+    barrier.wait()
+    start = time.perf_counter()
+    map_helper.geocode_address(city)
+    map_helper.find_nearby_facilities(city)
+    map_helper.find_nearby_facilities_by_coords(lat, lon)
+    map_helper.reverse_geocode(lat, lon)
+    latencies.append(time.perf_counter() - start)
+
+
+def burst(sessions, enabled, cache_dir):
+    from utils import geocoding, map_helper, settings
+    from utils.fake_gemini import FakeModel
+
+    # Fresh caches and flight groups for each run
+    settings.CACHE_DIR = cache_dir
+    geocoding._cache = None
+    map_helper._facility_cache = None
+    for group in (geocoding.geocode_flights, map_helper.facility_flights, map_helper.reverse_flights):
+        group.enabled = enabled
+        group.calls = group.shared = 0
+
+    calls_before = FakeModel.calls
+    barrier = threading.Barrier(sessions)
+    latencies = []
+    threads = [threading.Thread(target=session, args=(i, barrier, latencies)) for i in range(sessions)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    return FakeModel.calls - calls_before, latencies, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=1.0, help="stub Gemini latency per request (s)")
+    parser.add_argument("--nominatim-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with StubNominatim(latency=args.nominatim_latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        # Settings are read at import time, so point them at the stubs first.
+        os.environ["NOMINATIM_URL"] = stub.url
+        os.environ["NOMINATIM_RATE_PER_SEC"] = "0"
+        os.environ["FACILITY_CACHE_BACKEND"] = "memory"
+        os.environ["FACILITY_INDEX_PATH"] = os.path.join(tmp, "missing.npz")
+        from utils.fake_gemini import fake_model_factory
+        from utils.gemini_client import GeminiClient, set_gemini_client
+
+        set_gemini_client(GeminiClient(
+            max_concurrency=args.sessions, model_factory=fake_model_factory(latency=args.latency)
+        ))
+
+        print(f"{args.sessions} concurrent sessions, Gemini {args.latency:.2f}s, "
+              f"Nominatim {args.nominatim_latency:.2f}s")
+        for label, enabled in (("off", False), ("on", True)):
+            nominatim_before = stub.requests
+            gemini, latencies, wall = burst(args.sessions, enabled, os.path.join(tmp, label))
+            latencies.sort()
+            p95 = latencies[int(0.95 * (len(latencies) - 1))]
+            print(f"  single flight {label:<3}  Gemini calls {gemini:4d}   Nominatim requests "
+                  f"{stub.requests - nominatim_before:4d}   session p50 {statistics.median(latencies):.2f}s "
+                  f"p95 {p95:.2f}s   burst {wall:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
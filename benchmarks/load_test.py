@@ -0,0 +1,395 @@
+"""
+Load test with local stand-ins for Gemini and Nominatim.
+
+Starts the stub Gemini REST endpoint and the stub Nominatim server from
+benchmarks/stubs.py, then runs each scenario (text triage, image triage,
+address search, coords search) in its own worker process with N concurrent
+simulated sessions. The real SDK and HTTP code paths are exercised; only the
+upstream services are fake. The "helpers" driver calls utils/ai_helpers.py and
+utils/map_helper.py directly; the "app" driver clicks through app.py with
+Streamlit's AppTest. Every session uses fresh inputs, so caches only help
+where the app itself repeats work. AppTest cannot run concurrently in one
+process, so the app driver runs each session in its own process.
+
+For each scenario the report gives p50/p95/p99 latency, operations per
+second, errors, upstream calls and the worker's peak RSS. Run from the
+repository root:
+
+    python -m benchmarks.load_test --sessions 20 --iterations 3
+    python -m benchmarks.load_test --driver app --sessions 5 --scenarios text coords
+    python -m benchmarks.load_test --output runs.jsonl            # append this run
+    python -m benchmarks.load_test --compare runs.jsonl           # diff against the last run
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SCENARIOS = ["text", "image", "address", "coords"]
+SAMPLES = os.path.join(os.path.dirname(__file__), "data", "triage_samples.csv")
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+# --- Inputs: unique per (session, iteration) so every operation is a fresh request ---
+
+def _descriptions():
+    with open(SAMPLES, encoding="utf-8") as f:
+        return [row["description"] for row in csv.DictReader(f)]
+
+
+def make_input(scenario, session, iteration, descriptions):
+    n = session * 1000 + iteration
+    if scenario == "text":
+        return f"{descriptions[n % len(descriptions)]} (case {session}-{iteration})"
+    if scenario == "image":
+        import numpy as np
+        from PIL import Image
+
+        rng = np.random.default_rng(n)
+        pixels = rng.integers(0, 255, (1200, 1600, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+        return buffer.getvalue()
+    if scenario == "address":
+        return f"{100 + iteration} Congress Ave, Austin, TX {78700 + session}"
+    # coords: grid points further apart than a facility cache cell
+    return 30.0 + 0.02 * session, -97.9 + 0.02 * iteration
+
+
+def is_failure(result) -> bool:
+    from utils.ai_helpers import FIRST_AID_FAILED, IMAGE_ANALYSIS_FAILED
+
+    text = result if isinstance(result, str) else json.dumps(result, default=str)
+    return text.startswith("⚠️") or FIRST_AID_FAILED in text or IMAGE_ANALYSIS_FAILED in text
+
+
+# --- Drivers: one operation per call, returning something is_failure() can inspect ---
+
+class HelperDriver:
+    """Calls the same helpers the app uses, in the same order."""
+
+    def __init__(self, scenario):
+        self.scenario = scenario
+
+    def run(self, value):
+        from utils import settings
+        from utils.ai_helpers import analyze_image_with_steps, stream_first_aid_steps
+        from utils.image_prep import preprocess_image
+        from utils.map_helper import reverse_geocode, search_facilities_for_query, search_facilities_near
+        from utils.orchestration import run_stages
+
+        if self.scenario == "text":
+            return "".join(stream_first_aid_steps(value))
+        if self.scenario == "image":
+            return dict(analyze_image_with_steps(preprocess_image(io.BytesIO(value))))
+        if self.scenario == "address":
+            text, _, _ = search_facilities_for_query(value)
+            return text
+        lat, lon = value
+        stages = run_stages(
+            {"address": lambda: reverse_geocode(lat, lon), "hospitals": lambda: search_facilities_near(lat, lon)},
+            deadline=settings.LOCATION_FLOW_DEADLINE,
+        )
+        results = {stage.name: stage for stage in stages}
+        if not results["hospitals"].ok:
+            raise results["hospitals"].error
+        return results["hospitals"].value[0] or ""
+
+
+class AppDriver:
+    """Drives app.py through Streamlit's AppTest, one AppTest (browser session) per simulated session."""
+
+    def __init__(self, scenario, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.scenario = scenario
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.at.run()
+        if scenario in ("address", "coords"):
+            self.at.sidebar.radio[0].set_value("Find Nearby Hospitals").run()
+
+    def _button(self, text):
+        return next(b for b in self.at.button if text in b.label)
+
+    def run(self, value):
+        at = self.at
+        if self.scenario == "text":
+            at.text_area[0].input(value)
+            self._button("Analyze").click().run()
+        elif self.scenario == "image":
+            at.file_uploader[0].set_value((f"upload-{hash(value)}.jpg", value, "image/jpeg"))
+            self._button("Analyze").click().run()
+        elif self.scenario == "address":
+            at.text_input[0].input(value)
+            self._button("Search Hospitals").click().run()
+        else:
+            at.session_state["_load_test_coords"] = value
+            self._button("Detect My Location").click().run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        rendered = [el.value for el in (*at.error, *at.markdown) if isinstance(el.value, str)]
+        expected = "First Aid Steps" if self.scenario in ("text", "image") else "Nearby Hospitals"
+        if not any(expected in text for text in rendered):
+            shown = [el.value for el in (*at.error, *at.warning)][:2]
+            raise RuntimeError(f"no '{expected}' section rendered (shown: {shown})")
+        return rendered
+
+
+def _fake_geolocation(key=None):
+    """Stands in for the browser geolocation component: returns the session's test position."""
+    import streamlit as st
+
+    lat, lon = st.session_state["_load_test_coords"]
+    return {"latitude": lat, "longitude": lon}
+
+
+def _wait_for_all(barrier_dir, parties):
+    """Cross-process start barrier: announce readiness, then wait until every worker is ready."""
+    open(os.path.join(barrier_dir, f"ready-{os.getpid()}"), "w").close()
+    while len(os.listdir(barrier_dir)) < parties:
+        time.sleep(0.01)
+
+
+def worker(args):
+    """Runs `args.sessions` sessions of one scenario in this process and prints a JSON summary."""
+    descriptions = _descriptions()
+    if args.driver == "app":
+        import streamlit_geolocation
+
+        streamlit_geolocation.streamlit_geolocation = _fake_geolocation
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.sessions + 1)
+
+    def session(index):
+        try:
+            driver = AppDriver(args.scenario, args.timeout) if args.driver == "app" else HelperDriver(args.scenario)
+            inputs = [make_input(args.scenario, index, i, descriptions) for i in range(args.iterations)]
+        except Exception as e:
+            with lock:
+                errors.append(f"setup: {e!r}")
+            inputs = []
+        barrier.wait()
+        for value in inputs:
+            start = time.perf_counter()
+            try:
+                failed = is_failure(driver.run(value))
+                error = "failure response" if failed else None
+            except Exception as e:
+                error = repr(e)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if error:
+                    errors.append(error)
+
+    threads = [
+        threading.Thread(target=session, args=(args.first_session + i,), name=f"session-{i}")
+        for i in range(args.sessions)
+    ]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    if args.barrier_dir:
+        _wait_for_all(args.barrier_dir, args.barrier_parties)
+    started = time.time()
+    for t in threads:
+        t.join()
+
+    print(json.dumps({
+        "latencies": latencies,
+        "started": started,
+        "finished": time.time(),
+        "errors": errors,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+# --- Parent: stubs, worker processes per scenario, report ---
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    index = min(int(round(q / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(args, scenario, gemini, nominatim, cache_dir):
+    """
+    Runs one scenario. The helpers driver runs all sessions as threads of one worker
+    process, like sessions of one Streamlit server. AppTest is not safe to run
+    concurrently in one process (it swaps process-global runtime state on every run),
+    so the app driver runs each session in its own worker process behind a start barrier;
+    its peak RSS is that of the largest session process.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    barrier_dir = tempfile.mkdtemp(dir=cache_dir)
+    env = {
+        **os.environ,
+        "GEMINI_API_ENDPOINT": gemini.url,
+        "GEMINI_API_KEY": "stub-key",
+        "GEMINI_FAKE": "0",
+        "NOMINATIM_URL": nominatim.url,
+        "NOMINATIM_RATE_PER_SEC": str(args.nominatim_rate),
+        "FIRSTAID_CACHE_DIR": cache_dir,
+        "FACILITY_INDEX_PATH": os.path.join(cache_dir, "no-index.npz"),
+        "PYTHONWARNINGS": "ignore",
+    }
+    per_process = 1 if args.driver == "app" else args.sessions
+    processes = args.sessions // per_process
+    commands = [
+        [
+            sys.executable, "-m", "benchmarks.load_test", "--worker", scenario,
+            "--driver", args.driver, "--sessions", str(per_process), "--first-session", str(p * per_process),
+            "--iterations", str(args.iterations), "--timeout", str(args.timeout),
+            "--barrier-dir", barrier_dir, "--barrier-parties", str(processes),
+        ]
+        for p in range(processes)
+    ]
+
+    gemini_before, nominatim_before = gemini.total_requests, nominatim.requests
+    running = [
+        subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for command in commands
+    ]
+    summaries = []
+    for process in running:
+        stdout, stderr = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"{scenario} worker failed:\n{stderr[-2000:]}")
+        summaries.append(json.loads(stdout.strip().splitlines()[-1]))
+
+    latencies = sorted(t for s in summaries for t in s["latencies"])
+    errors = [e for s in summaries for e in s["errors"]]
+    wall = max(s["finished"] for s in summaries) - min(s["started"] for s in summaries)
+    return {
+        "operations": len(latencies),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:3],
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "ops_per_sec": len(latencies) / wall if wall > 0 else 0.0,
+        "gemini_calls": gemini.total_requests - gemini_before,
+        "nominatim_calls": nominatim.requests - nominatim_before,
+        "peak_rss_mb": max(s["peak_rss_mb"] for s in summaries),
+    }
+
+
+def print_report(run, baseline=None):
+    print(f"\n{run['driver']} driver, {run['sessions']} sessions x {run['iterations']} operations, "
+          f"Gemini {run['stubs']['gemini_latency']:.2f}s ({run['stubs']['gemini_error_rate']:.0%} errors), "
+          f"Nominatim {run['stubs']['nominatim_latency']:.2f}s")
+    header = f"{'scenario':<9}{'ops':>5}{'err':>5}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'ops/s':>8}{'gemini':>8}{'nomin.':>8}{'RSS MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in run["scenarios"].items():
+        print(f"{name:<9}{r['operations']:>5}{r['errors']:>5}{r['p50']:>8.2f}{r['p95']:>8.2f}{r['p99']:>8.2f}"
+              f"{r['ops_per_sec']:>8.2f}{r['gemini_calls']:>8}{r['nominatim_calls']:>8}{r['peak_rss_mb']:>8.0f}")
+        for sample in r["error_samples"]:
+            print(f"{'':<9}  error: {sample[:100]}")
+
+    if baseline:
+        print(f"\nChange vs run at {baseline['timestamp']} ({baseline.get('commit') or 'unknown commit'}):")
+        for name, r in run["scenarios"].items():
+            before = baseline["scenarios"].get(name)
+            if not before:
+                continue
+            changes = ", ".join(
+                f"{key} {(r[key] - before[key]) / before[key]:+.0%}"
+                for key in ("p50", "p95", "ops_per_sec", "gemini_calls", "peak_rss_mb")
+                if before[key]
+            )
+            print(f"  {name:<9}{changes}")
+
+
+def load_baseline(path, run):
+    """Last recorded run with the same driver and load shape."""
+    if not path or not os.path.exists(path):
+        return None
+    baseline = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            previous = json.loads(line)
+            if all(previous.get(k) == run[k] for k in ("driver", "sessions", "iterations")):
+                baseline = previous
+    return baseline
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--driver", choices=["helpers", "app"], default="helpers")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument("--iterations", type=int, default=3, help="operations per session")
+    parser.add_argument("--gemini-latency", type=float, default=1.0, help="stub time per full answer (s)")
+    parser.add_argument("--gemini-first-token", type=float, default=0.3, help="stub time to first streamed chunk (s)")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="share of Gemini calls failing with 503")
+    parser.add_argument("--nominatim-latency", type=float, default=0.1)
+    parser.add_argument("--nominatim-error-rate", type=float, default=0.0)
+    parser.add_argument("--nominatim-rate", type=float, default=0,
+                        help="client token bucket rate (req/s); 0 disables it, 1 matches the public policy")
+    parser.add_argument("--timeout", type=float, default=120, help="AppTest script timeout (s)")
+    parser.add_argument("--output", help="append this run as one JSON line to this file")
+    parser.add_argument("--compare", help="JSONL file of earlier runs to compare with")
+    parser.add_argument("--worker", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--first-session", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--barrier-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--barrier-parties", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        args.scenario = args.worker
+        worker(args)
+        return
+
+    from benchmarks.stubs import StubGemini, StubNominatim
+
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "driver": args.driver,
+        "sessions": args.sessions,
+        "iterations": args.iterations,
+        "stubs": {
+            "gemini_latency": args.gemini_latency,
+            "gemini_error_rate": args.gemini_error_rate,
+            "nominatim_latency": args.nominatim_latency,
+            "nominatim_error_rate": args.nominatim_error_rate,
+        },
+        "scenarios": {},
+    }
+    with StubGemini(
+        latency=args.gemini_latency, first_token_latency=args.gemini_first_token, error_rate=args.gemini_error_rate
+    ) as gemini, StubNominatim(
+        latency=args.nominatim_latency, error_rate=args.nominatim_error_rate
+    ) as nominatim, tempfile.TemporaryDirectory() as tmp:
+        for scenario in args.scenarios:
+            print(f"running {scenario}...", file=sys.stderr)
+            run["scenarios"][scenario] = run_scenario(args, scenario, gemini, nominatim, os.path.join(tmp, scenario))
+
+    print_report(run, load_baseline(args.compare, run))
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Local stand-ins for external services, used by the benchmarks."""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from utils.fake_gemini import CANNED_DESCRIPTION, CANNED_FACILITIES, CANNED_STEPS
+
+
+class _StubServer:
+    """Runs a handler class on a ThreadingHTTPServer in a daemon thread (use as a context manager)."""
+
+    def _start_server(self, handler, port: int):
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubNominatim(_StubServer):
+    """
+    Minimal Nominatim look-alike serving /search and /reverse on localhost.
+    Every request sleeps `latency` seconds; coordinates are derived from the query text and
+    stay within a few km of downtown Austin, where the canned hospitals are.
+    A share `error_rate` of requests fails with HTTP 503.
+    """
+
+    def __init__(self, latency: float = 0.2, error_rate: float = 0.0, port: int = 0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    fail = stub._random.random() < stub.error_rate
+                time.sleep(stub.latency)
+                if fail:
+                    self.send_error(503)
+                    return
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path.endswith("/search"):
+                    seed = sum(map(ord, params.get("q", "")))
+                    body = [{"lat": str(30.2672 + seed % 100 / 2000), "lon": str(-97.7431 - seed % 77 / 2000)}]
+                elif url.path.endswith("/reverse"):
+                    body = {"display_name": f"Stub Street, near {params.get('lat')}, {params.get('lon')}"}
+                else:
+                    self.send_error(404)
+                    return
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._start_server(Handler, port)
+
+
+_GEMINI_PATH = re.compile(r"/models/(?P<model>[^:/]+):(?P<method>generateContent|streamGenerateContent)")
+
+
+class StubGemini(_StubServer):
+    """
+    Minimal Gemini REST look-alike serving generateContent and streamGenerateContent on
+    localhost. Point the SDK at it with GEMINI_API_ENDPOINT=<url> (REST transport).
+
+    Answers are the canned ones from utils.fake_gemini, shaped by the request's response
+    schema (hospital list, description + steps, or plain steps). `latency` is the time for
+    a whole answer and `first_token_latency` the delay before the first streamed chunk.
+    A share `error_rate` of requests fails with `error_status`; `responder(request_body)`
+    can replace the canned text.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        first_token_latency: float = None,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        responder=None,
+        port: int = 0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.first_token_latency = latency / 3 if first_token_latency is None else first_token_latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.responder = responder
+        self.requests = Counter()   # by method
+        self.errors = 0
+        self.bytes_received = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                match = _GEMINI_PATH.search(urlparse(self.path).path)
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if match is None:
+                    self.send_error(404)
+                    return
+                method = match.group("method")
+                with stub._lock:
+                    stub.requests[method] += 1
+                    stub.bytes_received += len(body)
+                    fail = stub._random.random() < stub.error_rate
+                    if fail:
+                        stub.errors += 1
+                if fail:
+                    time.sleep(stub.first_token_latency)
+                    self._send_json(stub.error_status, {"error": {
+                        "code": stub.error_status, "message": "stub upstream error", "status": "UNAVAILABLE",
+                    }})
+                    return
+
+                request = json.loads(body or b"{}")
+                text = stub.answer(request)
+                if method == "generateContent":
+                    time.sleep(stub.latency)
+                    self._send_json(200, _gemini_response(text, len(body) // 4, len(text.split())))
+                else:
+                    self._stream(text, len(body) // 4)
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, text, prompt_tokens):
+                # The REST transport reads a JSON array whose elements arrive one by one
+                words = text.split(" ")
+                chunks = [" ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "") for i in range(0, len(words), 4)]
+                rest = max(stub.latency - stub.first_token_latency, 0) / max(len(chunks), 1)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                output_tokens = 0
+                for i, chunk in enumerate(chunks):
+                    time.sleep(stub.first_token_latency if i == 0 else rest)
+                    output_tokens += len(chunk.split())
+                    prefix = "[" if i == 0 else ",\r\n"
+                    self.wfile.write((prefix + json.dumps(_gemini_response(chunk, prompt_tokens, output_tokens))).encode())
+                    self.wfile.flush()
+                self.wfile.write(b"]")
+
+            def log_message(self, *args):
+                pass
+
+        self._start_server(Handler, port)
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def answer(self, request: dict) -> str:
+        if self.responder is not None:
+            return self.responder(request)
+        config = request.get("generationConfig") or {}
+        if config.get("responseMimeType") != "application/json":
+            return CANNED_STEPS
+        schema_type = str((config.get("responseSchema") or {}).get("type", "")).upper()
+        if schema_type in ("ARRAY", "5"):
+            return json.dumps(CANNED_FACILITIES)
+        return json.dumps({"description": CANNED_DESCRIPTION, "first_aid_steps": CANNED_STEPS})
+
+
+def _gemini_response(text: str, prompt_tokens: int, output_tokens: int) -> dict:
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+    }
@@ -0,0 +1,15 @@
+import streamlit as st
+
+from utils.ui_helper import show_facilities_results
+
+
+# --- Streamlit UI Layout ---
+st.set_page_config(page_title="Nearby Healthcare Finder", page_icon="🏥", layout="centered")
+
+st.title("🏥 Nearby Healthcare Facilities Finder")
+st.write("Enter a city, state, or area to find hospitals near you.")
+
+location_query = st.text_input("📍 Enter a location", placeholder="e.g., Austin, TX")
+
+if st.button("Find Hospitals") and location_query:
+    show_facilities_results(location_query)
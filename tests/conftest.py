@@ -0,0 +1,51 @@
+"""
+Shared test setup: the offline FakeModel instead of Gemini, and no on-disk caches.
+Set before any `utils` module reads its settings.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("GEMINI_FAKE", "1")
+os.environ.setdefault("RESULT_CACHE_ENABLED", "0")
+os.environ.setdefault("FIRSTAID_CACHE_DIR", tempfile.mkdtemp(prefix="firstaid-tests-"))
+
+import pytest  # noqa: E402
+
+from utils import hedging, settings  # noqa: E402
+from utils.fake_gemini import FakeModel  # noqa: E402
+from utils.gemini_client import GeminiClient, set_gemini_client  # noqa: E402
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """
+    Installs a fake-backed client. Call the fixture with per-model FakeModel settings,
+    e.g. gemini({"gemini-2.5-flash": {"first_token_latency": 5}}, max_concurrency=2);
+    `model_class` swaps in a FakeModel subclass.
+    A fast hedge policy replaces the process-wide one.
+    """
+    monkeypatch.setattr(hedging, "_policy", hedging.HedgePolicy(initial_delay=0.05, min_delay=0.01, min_samples=1000))
+
+    def install(models=None, model_class=FakeModel, **client_kwargs):
+        models = models or {}
+
+        def factory(model_name, **kwargs):
+            return model_class(model_name, **{"latency": 0.02, **kwargs, **models.get(model_name, {})})
+
+        client = GeminiClient(model_factory=factory, **{"retry_base_delay": 0.001, **client_kwargs})
+        set_gemini_client(client)
+        return client
+
+    yield install
+    set_gemini_client(None)
+
+
+@pytest.fixture
+def result_cache(monkeypatch, tmp_path):
+    """A fresh, enabled model answer cache."""
+    from utils import result_cache
+
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(result_cache, "_cache", None)
+    return result_cache
@@ -0,0 +1,146 @@
+from utils import ai_helpers
+from utils.fake_gemini import CANNED_STEPS, FakeAPIError, FakeModel, FakeResponse
+from utils.ai_helpers import TEXT_MODEL, generate_first_aid_steps, first_aid_prompt
+from utils.result_cache import text_key
+
+DESCRIPTION = "a strange purple rash spreading on my leg"
+
+
+def _steps_key():
+    return text_key("steps", TEXT_MODEL, ai_helpers.PROMPT_VERSION, DESCRIPTION)
+
+
+def test_primary_answers_are_cached(gemini, result_cache):
+    gemini()
+    assert generate_first_aid_steps(DESCRIPTION)
+    assert result_cache.get_result(_steps_key()) is not None
+
+
+def test_hedge_answers_are_not_cached_under_the_primary_model(gemini, result_cache):
+    gemini({TEXT_MODEL: {"first_token_latency": 1.0, "latency": 1.0}})
+    answer = generate_first_aid_steps(DESCRIPTION)
+    assert answer and answer != ai_helpers.FIRST_AID_FAILED
+    assert result_cache.get_result(_steps_key()) is None
+
+
+def test_prompt_mentions_the_description():
+    assert DESCRIPTION in first_aid_prompt(DESCRIPTION)
+
+
+def test_failed_image_analysis_does_not_claim_a_timeout(gemini):
+    client = gemini()
+    steps = generate_first_aid_steps(ai_helpers.IMAGE_ANALYSIS_FAILED)
+    assert ai_helpers.NO_ANALYSIS_NOTE in steps
+    assert ai_helpers.LATE_ANSWER_NOTE not in steps
+    assert "".join(ai_helpers.stream_first_aid_steps(ai_helpers.IMAGE_ANALYSIS_FAILED)) == steps
+    assert client.calls == 0
+
+
+def test_missed_budget_shows_the_late_note(gemini, monkeypatch):
+    monkeypatch.setattr(ai_helpers.settings, "LATENCY_BUDGET_SECONDS", 0.2)
+    monkeypatch.setattr(ai_helpers.settings, "HEDGE_ENABLED", False)
+    gemini({TEXT_MODEL: {"first_token_latency": 2.0}})
+    assert ai_helpers.LATE_ANSWER_NOTE in generate_first_aid_steps(DESCRIPTION)
+
+
+class FailsAfterDescription(FakeModel):
+    """Streams the description section of the combined answer, then fails."""
+
+    def generate_content(self, contents, *, stream=False, **kwargs):
+        if "JSON" not in str(contents[0]):
+            return super().generate_content(contents, stream=stream, **kwargs)
+
+        def chunks():
+            yield FakeResponse('{"description": "A strange purple rash on the forearm", ')
+            raise FakeAPIError(500, "stream reset")
+
+        return chunks()
+
+
+def _image():
+    from utils.image_prep import PreparedImage
+
+    return PreparedImage(data=b"jpeg bytes", mime_type="image/jpeg", width=1, height=1, bytes_in=10, bytes_out=10, elapsed=0.0)
+
+
+def test_steps_are_generated_when_the_stream_fails_after_the_description(gemini):
+    gemini(model_class=FailsAfterDescription)
+    errors = []
+    sections = dict(ai_helpers.analyze_image_with_steps(_image(), on_error=errors.append))
+    assert sections == {"description": "A strange purple rash on the forearm", "steps": CANNED_STEPS}
+
+
+def test_cut_off_answer_is_not_shown_raw(gemini):
+    cut = '{"descr'
+    gemini({ai_helpers.VISION_MODEL: {"responder": lambda model, contents: cut}})
+    errors = []
+    sections = dict(ai_helpers.analyze_image_with_steps(_image(), on_error=errors.append))
+    assert sections["description"] == ai_helpers.IMAGE_ANALYSIS_FAILED
+    assert cut not in sections["steps"] and ai_helpers.NO_ANALYSIS_NOTE in sections["steps"]
+    assert errors
+
+
+def test_cut_off_steps_keep_the_description(gemini):
+    gemini({ai_helpers.VISION_MODEL: {
+        "responder": lambda model, contents: '{"description": "A strange purple rash on the leg", "first_aid_steps": "1. Remo'
+        if "JSON" in str(contents[0]) else CANNED_STEPS,
+    }})
+    sections = dict(ai_helpers.analyze_image_with_steps(_image()))
+    assert sections == {"description": "A strange purple rash on the leg", "steps": CANNED_STEPS}
+
+
+class AlwaysFails(FakeModel):
+    """Every call fails with a 500, like an outage that outlasts the retries."""
+
+    def generate_content(self, contents, *, stream=False, **kwargs):
+        raise FakeAPIError(500, "upstream outage")
+
+
+def test_hard_error_shows_the_stored_cards(gemini):
+    gemini(model_class=AlwaysFails)
+    errors = []
+    steps = generate_first_aid_steps(DESCRIPTION, on_error=errors.append)
+    assert ai_helpers.UNAVAILABLE_NOTE in steps and "**" in steps
+    assert not ai_helpers.is_complete_answer(steps)
+    assert errors
+
+
+def test_hard_error_while_streaming_shows_the_stored_cards(gemini):
+    gemini(model_class=AlwaysFails)
+    steps = "".join(ai_helpers.stream_first_aid_steps(DESCRIPTION))
+    assert ai_helpers.UNAVAILABLE_NOTE in steps
+    assert ai_helpers.FIRST_AID_FAILED not in steps
+
+
+def test_hard_error_on_the_image_still_yields_steps(gemini):
+    gemini(model_class=AlwaysFails)
+    errors = []
+    sections = list(ai_helpers.analyze_image_with_steps(_image(), on_error=errors.append))
+    assert [name for name, _ in sections] == ["description", "steps"]
+    assert sections[0][1] == ai_helpers.IMAGE_ANALYSIS_FAILED
+    assert ai_helpers.NO_ANALYSIS_NOTE in sections[1][1]
+    assert errors
+
+
+def _break_protocols(monkeypatch):
+    from utils import protocols
+
+    def missing(*args, **kwargs):
+        raise FileNotFoundError("data/protocols.json")
+
+    monkeypatch.setattr(protocols, "_matcher", None)
+    monkeypatch.setattr(protocols, "load_cards", missing)
+
+
+def test_unreadable_protocols_still_ask_the_model(gemini, monkeypatch):
+    _break_protocols(monkeypatch)
+    gemini()
+    assert generate_first_aid_steps("burned my hand on the stove") == CANNED_STEPS
+    assert "".join(ai_helpers.stream_first_aid_steps("burned my hand on the stove")).strip() == CANNED_STEPS
+
+
+def test_unreadable_protocols_and_a_failed_call_do_not_crash(gemini, monkeypatch):
+    _break_protocols(monkeypatch)
+    gemini(model_class=AlwaysFails)
+    assert generate_first_aid_steps(DESCRIPTION) == ai_helpers.FIRST_AID_FAILED
+    assert "".join(ai_helpers.stream_first_aid_steps(DESCRIPTION)) == ai_helpers.FIRST_AID_FAILED
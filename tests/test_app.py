@@ -0,0 +1,50 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from utils.ai_helpers import TEXT_MODEL
+from utils.fake_gemini import FakeAPIError, FakeModel, FakeResponse
+
+APP = os.path.join(os.path.dirname(__file__), os.pardir, "app.py")
+DESCRIPTION = "a strange purple rash spreading on my leg"
+
+
+class FailsMidStream(FakeModel):
+    def generate_content(self, contents, *, stream=False, **kwargs):
+        def chunks():
+            yield FakeResponse("1. Keep the leg ")
+            raise FakeAPIError(500, "stream reset")
+
+        return chunks()
+
+
+def _analyze_text(description):
+    at = AppTest.from_file(APP, default_timeout=30).run()
+    at.text_area[0].input(description)
+    next(b for b in at.button if b.label == "Analyze").click().run()
+    assert not at.exception
+    return at
+
+
+def _stored_steps(at):
+    results = at.session_state["_session_results"] if "_session_results" in at.session_state else {}
+    return [value["steps"] for value in results.values()]
+
+
+def test_completed_text_answer_is_kept_for_reruns(gemini):
+    gemini()
+    assert len(_stored_steps(_analyze_text(DESCRIPTION))) == 1
+
+
+@pytest.mark.parametrize("model", [
+    {"model_class": FailsMidStream},
+    {"models": {TEXT_MODEL: {"first_token_latency": 0.01, "latency": 3.0}}},  # misses the budget mid-stream
+])
+def test_partial_text_answer_is_not_kept(gemini, monkeypatch, model):
+    from utils import settings
+
+    monkeypatch.setattr(settings, "LATENCY_BUDGET_SECONDS", 0.5)
+    monkeypatch.setattr(settings, "HEDGE_ENABLED", False)
+    gemini(max_retries=0, **model)
+    assert _stored_steps(_analyze_text(DESCRIPTION)) == []
@@ -0,0 +1,112 @@
+import pytest
+
+from utils import cache
+from utils.cache import MemoryCache, ResponseCache, SQLiteCache, make_cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Points RedisCache at an in-process fakeredis server."""
+    fakeredis = pytest.importorskip("fakeredis")
+    import redis
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", lambda url, **kwargs: fakeredis.FakeRedis(server=server))
+    return server
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "redis":
+        request.getfixturevalue("fake_redis")
+
+    def make(ttl=60, max_entries=3):
+        return make_cache(request.param, ttl=ttl, max_entries=max_entries,
+                          path=str(tmp_path / "cache.sqlite3"), url="redis://localhost:6379/0")
+    return make
+
+
+def test_entries_expire_after_the_ttl(backend, clock):
+    store = backend(ttl=60)
+    store.set("k", {"v": 1})
+    clock.now += 59
+    assert store.get("k") == {"v": 1}
+    clock.now += 2
+    assert store.get("k") is None
+    assert len(store) == 0
+
+
+def test_least_recently_used_entry_is_evicted(backend, clock):
+    store = backend(max_entries=3)
+    for key in ("a", "b", "c"):
+        store.set(key, key)
+        clock.now += 1
+    assert store.get("a") == "a"  # "b" is now the least recently used
+    clock.now += 1
+    store.set("d", "d")
+    assert store.get("b") is None
+    assert [store.get(k) for k in ("a", "c", "d")] == ["a", "c", "d"]
+    assert len(store) == 3
+
+
+def test_redis_len_skips_keys_redis_already_expired(fake_redis, clock):
+    store = make_cache("redis", ttl=60, max_entries=10, url="redis://localhost:6379/0")
+    store.set("old", 1)
+    clock.now += 30
+    store.set("new", 2)
+    clock.now += 31
+    # "old" expired inside Redis without being read again
+    assert len(store) == 1
+    assert store.get("new") == 2 and store.get("old") is None
+
+
+def test_redis_namespaces_do_not_share_entries(fake_redis):
+    facilities = make_cache("redis", ttl=60, max_entries=10, url="redis://x", namespace="firstaid:facilities")
+    other = make_cache("redis", ttl=60, max_entries=10, url="redis://x", namespace="firstaid:other")
+    facilities.set("k", "v")
+    assert other.get("k") is None and len(other) == 0
+    other.clear()
+    assert facilities.get("k") == "v"
+
+
+def test_sqlite_entries_survive_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCache(path, ttl=60, max_entries=10).set("k", [1, 2])
+    assert SQLiteCache(path, ttl=60, max_entries=10).get("k") == [1, 2]
+
+
+def test_response_cache_counts_hits_and_survives_a_broken_backend():
+    responses = ResponseCache(MemoryCache(ttl=60, max_entries=10))
+    responses.set("k", "v")
+    assert responses.get("k") == "v" and responses.get("missing") is None
+    assert responses.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+    class Broken:
+        def get(self, key):
+            raise OSError("disk full")
+
+        set = get
+
+    broken = ResponseCache(Broken())
+    broken.set("k", "v")
+    assert broken.get("k") is None
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        make_cache("memcached", ttl=1, max_entries=1)
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from utils import facility_index
+from utils.facility_index import FacilityIndex, build_index
+from utils.geo import haversine_km
+
+
+@pytest.fixture(params=["kdtree", "scan"])
+def make_index(request, monkeypatch):
+    """Builds indexes with the KD-tree and with the linear scan used when scipy is missing."""
+    if request.param == "scan":
+        monkeypatch.setattr(facility_index, "cKDTree", None)
+
+    def make(points):
+        lats, lons = zip(*points) if points else ((), ())
+        return FacilityIndex([f"H{i}" for i in range(len(points))], [f"{i} Main St" for i in range(len(points))], lats, lons)
+
+    return make
+
+
+def _brute_force(index, lat, lon):
+    return haversine_km(lat, lon, index.lats, index.lons)
+
+
+def _random_points(rng, n, lat_range=(-90, 90)):
+    return list(zip(rng.uniform(*lat_range, n), rng.uniform(-180, 180, n)))
+
+
+# Random queries, then ones across the antimeridian and near both poles
+QUERIES = [(12.5, 45.0), (-33.9, 151.2), (0.0, 179.9), (0.0, -179.9), (89.95, 10.0), (-89.95, -120.0)]
+
+
+@pytest.mark.parametrize("lat,lon", QUERIES)
+def test_knn_matches_brute_force(make_index, lat, lon):
+    rng = np.random.default_rng(3)
+    index = make_index(_random_points(rng, 2000))
+    idx, dist = index.query(lat, lon, k=5)
+    exact = _brute_force(index, lat, lon)
+    assert np.allclose(dist, np.sort(exact)[:5])
+    assert np.allclose(exact[idx], dist)
+
+
+@pytest.mark.parametrize("lat,lon", QUERIES)
+def test_radius_query_matches_brute_force(make_index, lat, lon):
+    rng = np.random.default_rng(4)
+    index = make_index(_random_points(rng, 2000))
+    idx, dist = index.query(lat, lon, k=None, radius_km=800)
+    exact = _brute_force(index, lat, lon)
+    assert sorted(idx.tolist()) == sorted(np.flatnonzero(exact <= 800).tolist())
+    assert np.all(np.diff(dist) >= 0)
+
+
+def test_nearest_across_the_antimeridian(make_index):
+    index = make_index([(0.0, -179.95), (0.0, 178.0)])
+    idx, dist = index.query(0.0, 179.95, k=1)
+    assert idx.tolist() == [0]
+    assert dist[0] == pytest.approx(11.1, abs=0.1)
+
+
+def test_nearest_across_the_pole(make_index):
+    # Both points are 1 km from the pole, on opposite meridians
+    index = make_index([(89.991, 180.0), (89.0, 0.0)])
+    idx, dist = index.query(89.991, 0.0, k=1)
+    assert idx.tolist() == [0]
+    assert dist[0] == pytest.approx(2.0, abs=0.01)
+
+
+def test_k_larger_than_the_index(make_index):
+    index = make_index([(10, 10), (11, 11)])
+    idx, _ = index.query(10, 10, k=5)
+    assert idx.tolist() == [0, 1]
+
+
+def test_radius_limits_the_k_nearest(make_index):
+    index = make_index([(0, 0), (0, 0.05), (0, 1)])
+    idx, dist = index.query(0, 0, k=5, radius_km=10)
+    assert idx.tolist() == [0, 1]
+    assert dist.max() <= 10
+
+
+def test_empty_index(make_index):
+    index = make_index([])
+    assert len(index) == 0
+    idx, dist = index.query(0, 0, k=5)
+    assert idx.size == 0 and dist.size == 0
+    assert index.nearest(0, 0, k=None, radius_km=10).empty
+
+
+def test_save_load_round_trip(tmp_path):
+    index = build_index([
+        {"name": "City General", "address": "1 Main St", "lat": 30.27, "lon": -97.73},
+        {"name": "Hôpital Nord", "address": "", "lat": 43.38, "lon": 5.39},
+    ])
+    path = tmp_path / "nested" / "facilities.npz"
+    index.save(str(path))
+    loaded = FacilityIndex.load(str(path))
+    assert loaded.names.tolist() == ["City General", "Hôpital Nord"]
+    assert loaded.addresses.tolist() == ["1 Main St", ""]
+    assert np.array_equal(loaded.lats, index.lats) and np.array_equal(loaded.lons, index.lons)
+    assert loaded.nearest(43.3, 5.4, k=1)["name"].tolist() == ["Hôpital Nord"]
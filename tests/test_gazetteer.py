@@ -0,0 +1,38 @@
+import math
+
+import numpy as np
+import pytest
+
+from utils.gazetteer import build_gazetteer
+from utils.geo import haversine_km
+
+
+def _places(points):
+    return [{"name": f"P{i}", "region": "", "country": "", "lat": lat, "lon": lon} for i, (lat, lon) in enumerate(points)]
+
+
+def test_nearest_place_east_of_a_high_latitude_query():
+    # At 79.4N a degree of longitude is ~20 km: the place 0.5 deg east (~10 km) is nearer
+    # than the one 0.18 deg north (~20 km), though it is more grid cells away
+    gazetteer = build_gazetteer(_places([(79.39, -7.35), (79.57, -7.85)]))
+    i, dist = gazetteer.query(79.39, -7.85, max_km=25)
+    assert gazetteer.place(i)["name"] == "P0"
+    assert dist == pytest.approx(10.2, abs=0.2)
+
+
+@pytest.mark.parametrize("lat_range", [(-60, 60), (55, 80), (80, 89.9)])
+def test_grid_search_matches_a_full_scan(lat_range):
+    rng = np.random.default_rng(7)
+    points = list(zip(rng.uniform(*lat_range, 3000), rng.uniform(-180, 180, 3000)))
+    gazetteer = build_gazetteer(_places(points))
+    lats, lons = np.asarray(gazetteer.lats, dtype=np.float64), np.asarray(gazetteer.lons, dtype=np.float64)
+    for lat, lon in zip(rng.uniform(*lat_range, 300), rng.uniform(-180, 180, 300)):
+        _, dist = gazetteer.query(lat, lon, max_km=50)
+        exact = haversine_km(lat, lon, lats, lons).min()
+        assert math.isclose(dist, exact if exact <= 50 else math.inf, rel_tol=1e-4, abs_tol=1e-3)
+
+
+def test_no_place_within_max_km():
+    gazetteer = build_gazetteer(_places([(10, 10)]))
+    assert gazetteer.query(40, 40, max_km=25) == (-1, math.inf)
+    assert gazetteer.describe(40, 40, max_km=25) is None
@@ -0,0 +1,55 @@
+import gc
+
+import pytest
+
+from utils.fake_gemini import FakeAPIError, fake_model_factory
+from utils.gemini_client import GeminiClient
+
+
+def _client(**defaults):
+    return GeminiClient(model_factory=fake_model_factory(**{"latency": 0.01, **defaults}), max_concurrency=2,
+                        max_retries=2, retry_base_delay=0.001)
+
+
+def _free_slots(client):
+    return client._semaphore._value
+
+
+def test_closing_an_unstarted_stream_frees_its_slot():
+    client = _client()
+    chunks = client.generate("m", "hello", stream=True)
+    assert _free_slots(client) == 1
+    chunks.close()
+    assert _free_slots(client) == 2
+
+
+def test_dropping_an_unstarted_stream_frees_its_slot():
+    client = _client()
+    client.generate("m", "hello", stream=True)
+    gc.collect()
+    assert _free_slots(client) == 2
+
+
+def test_slot_is_released_once():
+    client = _client()
+    chunks = client.generate("m", "hello", stream=True)
+    assert "".join(c.text for c in chunks)
+    chunks.close()
+    del chunks
+    gc.collect()
+    assert _free_slots(client) == 2
+
+
+def test_retries_transient_errors_and_counts_calls():
+    client = _client(errors=[503, 429])
+    assert client.generate("m", "hello").text
+    assert (client.calls, client.retries) == (3, 2)
+    assert _free_slots(client) == 2
+
+
+def test_does_not_retry_client_errors():
+    client = _client(errors=[400])
+    with pytest.raises(FakeAPIError):
+        client.generate("m", "hello")
+    assert (client.calls, client.retries) == (1, 0)
+    assert _free_slots(client) == 2
@@ -0,0 +1,39 @@
+import math
+
+import numpy as np
+import pytest
+
+from utils.geo import bearing_deg, compass_point
+
+
+@pytest.mark.parametrize("lat,lon,expected", [
+    (1.0, 0.0, 0.0),     # north
+    (0.0, 1.0, 90.0),    # east
+    (-1.0, 0.0, 180.0),  # south
+    (0.0, -1.0, 270.0),  # west
+])
+def test_bearing_at_the_cardinal_points(lat, lon, expected):
+    assert math.isclose(float(bearing_deg(0.0, 0.0, lat, lon)), expected, abs_tol=1e-9)
+
+
+def test_bearing_is_in_zero_to_360():
+    rng = np.random.default_rng(5)
+    bearings = bearing_deg(10.0, 20.0, rng.uniform(-80, 80, 1000), rng.uniform(-180, 180, 1000))
+    assert np.all((bearings >= 0) & (bearings < 360))
+
+
+def test_bearing_across_the_antimeridian_points_east():
+    assert math.isclose(float(bearing_deg(0.0, 179.5, 0.0, -179.5)), 90.0, abs_tol=1e-9)
+
+
+def test_compass_points():
+    bearings = [0, 45, 90, 135, 180, 225, 270, 315]
+    assert compass_point(bearings).tolist() == ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+
+
+def test_compass_sectors_wrap_around_north():
+    assert compass_point([359.9, 360.0, 337.6, 22.4, 22.6, 337.4]).tolist() == ["N", "N", "N", "N", "NE", "NW"]
+
+
+def test_compass_of_nan_is_blank():
+    assert compass_point([np.nan, 90.0]).tolist() == ["", "E"]
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from utils import geocoding
+from utils.cache import SQLiteCache
+from utils.rate_limit import TokenBucket
+
+
+class FakeClock:
+    """Monotonic time that only moves when the bucket sleeps."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _bucket(rate, capacity=1.0):
+    clock = FakeClock()
+    return TokenBucket(rate, capacity, clock=clock, sleep=clock.sleep), clock
+
+
+def test_bucket_paces_requests_at_the_rate():
+    bucket, clock = _bucket(rate=2)
+    for _ in range(5):
+        bucket.acquire()
+    # The first token is free, then one every 1/rate seconds
+    assert clock.sleeps == pytest.approx([0.5] * 4)
+    assert clock.now == pytest.approx(102.0)
+
+
+def test_bucket_allows_a_burst_up_to_its_capacity():
+    bucket, clock = _bucket(rate=1, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.sleeps == pytest.approx([1.0])
+
+
+def test_idle_time_refills_no_more_than_the_capacity():
+    bucket, clock = _bucket(rate=1, capacity=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 60  # a long pause
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == pytest.approx([1.0])
+
+
+def test_rate_zero_disables_the_limit():
+    bucket, clock = _bucket(rate=0)
+    for _ in range(10):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+@pytest.fixture
+def nominatim(monkeypatch, tmp_path):
+    """Replaces Nominatim with a table of known addresses and counts the lookups."""
+    monkeypatch.setattr(geocoding, "_cache", SQLiteCache(str(tmp_path / "geocode.sqlite3"), ttl=3600, max_entries=100))
+    known = {"12 main st": (30.1, -97.1), "5 oak ave": (30.2, -97.2)}
+    queries = []
+    lock = threading.Lock()
+
+    def fake_get(path, params):
+        with lock:
+            queries.append(params["q"])
+        time.sleep(0.05)  # long enough for concurrent lookups of the same address to overlap
+        coords = known.get(geocoding.normalize_address(params["q"]))
+        return FakeResponse([{"lat": str(coords[0]), "lon": str(coords[1])}] if coords else [])
+
+    monkeypatch.setattr(geocoding, "nominatim_get", fake_get)
+    return queries
+
+
+def test_geocode_many_keeps_the_input_order_with_duplicates(nominatim):
+    addresses = ["5 Oak Ave", "12 Main St", "nowhere", "5 Oak Ave", "12 Main St"]
+    results = geocoding.geocode_many(addresses, max_workers=4)
+    assert results == [(30.2, -97.2), (30.1, -97.1), None, (30.2, -97.2), (30.1, -97.1)]
+    assert sorted(nominatim) == ["12 Main St", "5 Oak Ave", "nowhere"]
+
+
+def test_differently_written_duplicates_share_one_lookup(nominatim):
+    results = geocoding.geocode_many(["12 Main St", "12  main st,", "12 MAIN ST."], max_workers=3)
+    assert results == [(30.1, -97.1)] * 3
+    assert len(nominatim) == 1
+
+
+def test_not_found_answers_are_cached(nominatim):
+    assert geocoding.geocode("nowhere") is None
+    assert geocoding.geocode("Nowhere") is None
+    assert nominatim == ["nowhere"]
+
+
+def test_errors_are_not_cached(nominatim, monkeypatch):
+    def failing_get(path, params):
+        raise ConnectionError("offline")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(geocoding, "nominatim_get", failing_get)
+        assert geocoding.geocode("12 Main St") is None
+    assert geocoding.geocode("12 Main St") == (30.1, -97.1)
+    assert nominatim == ["12 Main St"]
@@ -0,0 +1,150 @@
+import math
+import time
+
+import pytest
+
+from utils import hedging
+from utils.fake_gemini import CANNED_STEPS, FakeAPIError
+from utils.hedging import HedgePolicy, LatencyBudgetExceeded, RaceInfo, hedged_generate, hedged_stream
+
+
+def _policy(**kwargs):
+    return HedgePolicy(**{"percentile": 90, "window": 100, "min_samples": 10, "initial_delay": 2.0, "min_delay": 0.1, **kwargs})
+
+
+def _record(policy, samples):
+    for sample in samples:
+        policy.record("steps", sample, "primary")
+
+
+def test_initial_delay_until_enough_samples():
+    policy = _policy()
+    _record(policy, [0.5] * 9)
+    assert policy.delay("steps", budget=12) == 2.0
+
+
+def test_delay_is_the_percentile_of_answers():
+    policy = _policy()
+    _record(policy, [i / 10 for i in range(1, 101)])
+    assert math.isclose(policy.delay("steps", budget=30), 9.1)
+
+
+def test_delay_leaves_the_hedge_half_the_budget():
+    policy = _policy()
+    _record(policy, [10.0] * 20)
+    assert policy.delay("steps", budget=12) == 6.0
+
+
+def test_stalls_beyond_the_percentile_do_not_delay_hedging():
+    healthy = [0.4 + i / 100 for i in range(75)]
+    calm, degraded = _policy(), _policy()
+    _record(calm, healthy + [math.inf] * 5)
+    _record(degraded, healthy + [math.inf] * 25)  # 25% of primaries abandoned
+    assert degraded.delay("steps", budget=12) <= calm.delay("steps", budget=12) < 1.5
+
+
+def test_a_primary_that_stopped_answering_is_hedged_at_once():
+    policy = _policy()
+    _record(policy, [math.inf] * 90 + [9.0] * 10)  # only stragglers answer
+    assert policy.delay("steps", budget=12) == 0.1
+
+
+def test_failures_are_not_latency_samples():
+    policy = _policy()
+    _record(policy, [None] * 50)
+    assert policy.delay("steps", budget=12) == 2.0
+    assert policy.stats()["steps"]["outcomes"] == {"primary": 50}
+
+
+PRIMARY, HEDGE = "primary-model", "hedge-model"
+
+
+def _wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def _free_slots(client):
+    return client._semaphore._value
+
+
+def test_hedge_wins_when_the_primary_stalls(gemini):
+    gemini({PRIMARY: {"first_token_latency": 1.0, "latency": 1.0}}, max_retries=0)
+    info = RaceInfo()
+    start = time.monotonic()
+    assert hedged_generate("steps", "a cut", PRIMARY, HEDGE, budget=3, info=info) == CANNED_STEPS
+    assert time.monotonic() - start < 0.8
+    assert info == RaceInfo(model=HEDGE, hedged=True)
+
+
+def test_no_hedge_when_the_primary_answers_in_time(gemini):
+    client = gemini(max_retries=0)
+    info = RaceInfo()
+    assert hedged_generate("steps", "a cut", PRIMARY, HEDGE, budget=3, info=info) == CANNED_STEPS
+    assert info == RaceInfo(model=PRIMARY, hedged=False)
+    assert client.calls == 1
+
+
+def test_primary_error_hedges_at_once(gemini, monkeypatch):
+    monkeypatch.setattr(hedging, "_policy", HedgePolicy(initial_delay=5, min_delay=5, min_samples=1000))
+    gemini({PRIMARY: {"errors": [500], "first_token_latency": 0}}, max_retries=0)
+    info = RaceInfo()
+    start = time.monotonic()
+    assert hedged_generate("steps", "a cut", PRIMARY, HEDGE, budget=12, info=info) == CANNED_STEPS
+    assert time.monotonic() - start < 1
+    assert info.model == HEDGE
+
+
+def test_both_errors_raise_the_primary_error(gemini):
+    gemini({PRIMARY: {"errors": [500], "first_token_latency": 0}, HEDGE: {"errors": [503], "first_token_latency": 0}},
+           max_retries=0)
+    with pytest.raises(FakeAPIError) as error:
+        hedged_generate("steps", "a cut", PRIMARY, HEDGE, budget=3)
+    assert error.value.code == 500
+
+
+def test_deadline_mid_stream_raises_after_the_first_chunks(gemini):
+    gemini({PRIMARY: {"first_token_latency": 0.01, "latency": 5.0}}, max_retries=0)
+    chunks = []
+    with pytest.raises(LatencyBudgetExceeded):
+        for chunk in hedged_stream("steps", "a cut", PRIMARY, HEDGE, budget=0.5):
+            chunks.append(chunk)
+    assert chunks and "".join(chunks) != CANNED_STEPS
+
+
+def test_closing_the_stream_early_frees_the_client_slots(gemini):
+    client = gemini({PRIMARY: {"first_token_latency": 0.01, "latency": 0.5}}, max_concurrency=2, max_retries=0)
+    chunks = hedged_stream("steps", "a cut", PRIMARY, HEDGE, budget=3)
+    assert next(chunks)
+    chunks.close()
+    assert _wait_for(lambda: _free_slots(client) == 2)
+
+
+def test_budget_records_the_primary_time_to_first_token(gemini):
+    policy = _policy(min_samples=1)
+    gemini({PRIMARY: {"first_token_latency": 0.05}}, max_retries=0)
+    hedged_generate("steps", "a cut", PRIMARY, HEDGE, budget=3, policy=policy)
+    stats = policy.stats(budget=3)["steps"]
+    assert stats["samples"] == 1 and stats["outcomes"] == {"primary": 1}
+    assert 0.05 <= stats["hedge_delay"] < 0.5
+
+
+def test_cold_client_setup_does_not_count_as_model_latency(gemini, monkeypatch):
+    client = gemini(max_retries=0)
+    lookups = []
+
+    def slow_first_client():
+        if not lookups:
+            time.sleep(0.3)  # SDK import and configuration on a fresh worker
+        lookups.append(client)
+        return client
+
+    monkeypatch.setattr(hedging, "get_gemini_client", slow_first_client)
+    policy = _policy(min_samples=1, initial_delay=0.1, min_delay=0.01)
+    info = RaceInfo()
+    assert hedged_generate("steps", "a cut", PRIMARY, HEDGE, budget=3, policy=policy, info=info) == CANNED_STEPS
+    assert info == RaceInfo(model=PRIMARY, hedged=False)
+    assert client.calls == 1
+    assert policy.stats(budget=3)["steps"]["hedge_delay"] < 0.2
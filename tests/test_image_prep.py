@@ -0,0 +1,68 @@
+import io
+
+import pytest
+from PIL import Image
+
+from utils.image_prep import preprocess_image
+
+ORIENTATION = 0x0112
+GPS_IFD = 0x8825
+
+
+def _encode(image, fmt="JPEG", exif=None):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **({"exif": exif} if exif is not None else {}))
+    buffer.seek(0)
+    return buffer
+
+
+def _decoded(prepared):
+    return Image.open(io.BytesIO(prepared.data))
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6  # stored sideways: rotate 90 degrees clockwise to display
+    upload = _encode(Image.new("RGB", (200, 100), "red"), exif=exif)
+    prepared = preprocess_image(upload, max_edge=1024)
+    assert (prepared.width, prepared.height) == (100, 200)
+    assert _decoded(prepared).size == (100, 200)
+
+
+def test_longest_edge_is_scaled_down_to_max_edge():
+    prepared = preprocess_image(_encode(Image.new("RGB", (3000, 1500), "white")), max_edge=1024)
+    assert (prepared.width, prepared.height) == (1024, 512)
+    assert prepared.bytes_in > 0 and prepared.mime_type == "image/jpeg"
+
+
+def test_small_images_are_not_upscaled():
+    prepared = preprocess_image(_encode(Image.new("RGB", (300, 200), "white")), max_edge=1024)
+    assert (prepared.width, prepared.height) == (300, 200)
+
+
+def test_exif_and_gps_metadata_are_dropped():
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneMaker"  # camera make
+    exif.get_ifd(GPS_IFD).update({1: "N", 2: (30.0, 16.0, 2.0), 3: "W", 4: (97.0, 44.0, 35.0)})
+    upload = _encode(Image.new("RGB", (400, 300), "blue"), exif=exif)
+    assert Image.open(upload).getexif().get_ifd(GPS_IFD)
+    upload.seek(0)
+
+    decoded = _decoded(preprocess_image(upload))
+    assert "exif" not in decoded.info
+    assert not decoded.getexif() and not decoded.getexif().get_ifd(GPS_IFD)
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "P", "L", "LA", "CMYK"])
+def test_other_modes_are_uploaded_as_rgb(mode):
+    fmt = "JPEG" if mode == "CMYK" else "PNG"
+    upload = _encode(Image.new(mode, (64, 48)), fmt=fmt)
+    decoded = _decoded(preprocess_image(upload, fmt="JPEG"))
+    assert decoded.mode == "RGB" and decoded.format == "JPEG"
+
+
+def test_webp_keeps_the_alpha_channel():
+    upload = _encode(Image.new("RGBA", (64, 48), (255, 0, 0, 128)), fmt="PNG")
+    prepared = preprocess_image(upload, fmt="WEBP")
+    assert prepared.mime_type == "image/webp"
+    assert _decoded(prepared).mode == "RGBA"
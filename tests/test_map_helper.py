@@ -0,0 +1,138 @@
+import math
+
+from utils.map_helper import FACILITY_COLUMNS, _structured_to_df
+
+
+def test_structured_records_are_coerced_in_bulk():
+    df = _structured_to_df([
+        {"name": " City General ", "address": "1500 Red River St", "lat": "30.27", "lon": -97.73,
+         "distance_km": "1.2", "phone": None},
+        {"name": "No Pin", "lat": 95, "lon": 10, "distance_km": "far", "phone": 5125550100},
+        {"name": "", "lat": 1, "lon": 1},
+        {"address": "unnamed"},
+    ])
+    assert list(df.columns) == FACILITY_COLUMNS
+    assert df["name"].tolist() == ["City General", "No Pin"]
+    assert df.loc[0, ["lat", "lon", "distance_km"]].tolist() == [30.27, -97.73, 1.2]
+    assert df.loc[0, "phone"] == "" and df.loc[1, "address"] == "" and df.loc[1, "phone"] == "5125550100"
+    # Impossible coordinates and unparseable numbers become NaN
+    assert math.isnan(df.loc[1, "lat"]) and math.isnan(df.loc[1, "lon"]) and math.isnan(df.loc[1, "distance_km"])
+
+
+def test_no_records_gives_an_empty_frame_with_the_facility_columns():
+    df = _structured_to_df([])
+    assert df.empty and list(df.columns) == FACILITY_COLUMNS
+
+
+def test_concurrent_first_calls_create_one_facility_cache(monkeypatch):
+    import threading
+    import time
+
+    from utils import map_helper
+    from utils.cache import MemoryCache
+
+    created = []
+
+    def slow_make_cache(*args, **kwargs):
+        created.append(1)
+        time.sleep(0.05)
+        return MemoryCache(ttl=60, max_entries=10)
+
+    monkeypatch.setattr(map_helper, "_facility_cache", None)
+    monkeypatch.setattr(map_helper, "make_cache", slow_make_cache)
+    caches = []
+    threads = [threading.Thread(target=lambda: caches.append(map_helper.get_facility_cache())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1 and len({id(c) for c in caches}) == 1
+
+
+def test_search_errors_reach_on_error(gemini, monkeypatch):
+    from utils import map_helper
+
+    monkeypatch.setattr(map_helper, "_search_facilities", lambda *args: (_ for _ in ()).throw(ConnectionError("offline")))
+    errors = []
+    text = map_helper.find_nearby_facilities("Austin, TX", on_error=errors.append)
+    assert text.startswith("⚠️") and errors == ["Error finding facilities: offline"]
+    assert map_helper.find_nearby_facilities_by_coords(30.27, -97.74, 10).startswith("⚠️")
+
+
+def _facilities(rows):
+    import pandas as pd
+
+    return pd.DataFrame(rows, columns=["name", "lat", "lon", "distance_km"])
+
+
+def test_rank_facilities_sorts_by_distance_and_filters_by_radius():
+    from utils.map_helper import rank_facilities
+
+    df = _facilities([
+        ("Far", 0.0, 0.5, None),     # ~55 km
+        ("Near", 0.0, 0.01, None),   # ~1 km
+        ("Mid", 0.05, 0.0, None),    # ~5.6 km
+    ])
+    ranked = rank_facilities(df, 0.0, 0.0, radius_km=10)
+    assert ranked["name"].tolist() == ["Near", "Mid"]
+    assert ranked["distance_km"].tolist() == sorted(ranked["distance_km"])
+    assert ranked["direction"].tolist() == ["E", "N"]
+
+
+def test_rank_facilities_uses_the_reported_distance_without_coordinates():
+    from utils.map_helper import rank_facilities
+
+    df = _facilities([
+        ("Unknown", None, None, None),
+        ("Reported", None, None, 2.0),
+        ("Pinned", 0.0, 0.03, 9.0),      # ~3.3 km computed; the reported 9 km is ignored
+    ])
+    ranked = rank_facilities(df, 0.0, 0.0)
+    assert ranked["name"].tolist() == ["Reported", "Pinned", "Unknown"]
+    assert ranked["distance_km"].iloc[0] == 2.0
+    assert math.isclose(ranked["distance_km"].iloc[1], 3.34, abs_tol=0.01)
+    assert math.isnan(ranked["distance_km"].iloc[2])
+    assert ranked["direction"].tolist()[0] == "" and ranked["direction"].tolist()[2] == ""
+
+
+def test_rank_facilities_without_an_origin_keeps_reported_distances():
+    from utils.map_helper import rank_facilities
+
+    df = _facilities([("B", 1.0, 1.0, 5.0), ("C", 1.0, 1.0, None), ("A", 1.0, 1.0, 1.5)])
+    ranked = rank_facilities(df, None, None, radius_km=3)
+    # Rows with no distance at all are kept (they may be near) and listed last
+    assert ranked["name"].tolist() == ["A", "C"]
+    assert ranked["bearing_deg"].isna().all()
+
+
+def test_rank_facilities_on_an_empty_frame():
+    from utils.map_helper import rank_facilities
+
+    ranked = rank_facilities(_facilities([]), 0.0, 0.0, radius_km=5)
+    assert ranked.empty and {"distance_km", "bearing_deg", "direction"} <= set(ranked.columns)
+
+
+def test_facility_cache_keys():
+    from utils import map_helper
+
+    key = map_helper.facilities_cache_key_for_coords(30.26720, -97.74310, 10)
+    # GPS jitter of a few metres stays in the same geohash cell
+    assert map_helper.facilities_cache_key_for_coords(30.26725, -97.74318, 10) == key
+    assert map_helper.facilities_cache_key_for_coords(30.30, -97.74310, 10) != key
+    assert map_helper.facilities_cache_key_for_coords(30.26720, -97.74310, 25) != key
+    assert map_helper.facilities_cache_key_for_query("Austin,  TX") == map_helper.facilities_cache_key_for_query("austin tx")
+
+
+def test_nearby_coordinates_share_a_cached_search_until_the_prompt_changes(gemini, monkeypatch):
+    from utils import map_helper
+    from utils.cache import MemoryCache, ResponseCache
+
+    monkeypatch.setattr(map_helper, "_facility_cache", ResponseCache(MemoryCache(ttl=60, max_entries=10)))
+    client = gemini()
+    first = map_helper.find_nearby_facilities_by_coords(30.26720, -97.74310, 10)
+    assert map_helper.find_nearby_facilities_by_coords(30.26725, -97.74318, 10) == first
+    assert client.calls == 1
+
+    monkeypatch.setattr(map_helper, "FACILITY_PROMPT_VERSION", str(int(map_helper.FACILITY_PROMPT_VERSION) + 1))
+    map_helper.find_nearby_facilities_by_coords(30.26720, -97.74310, 10)
+    assert client.calls == 2
@@ -0,0 +1,38 @@
+import pytest
+
+from utils import metrics
+
+
+def test_only_one_profile_runs_at_a_time():
+    first = metrics.Profile(kind="cprofile").start()
+    try:
+        with pytest.raises(metrics.ProfilerBusy):
+            metrics.Profile(kind="cprofile").start()
+    finally:
+        assert "function calls" in first.stop()
+    # Stopping frees the profiler for the next request, and stopping twice is harmless
+    with metrics.Profile(kind="cprofile") as second:
+        sum(range(100))
+    assert second.stop() == second.report
+
+
+def test_failed_start_does_not_keep_the_profiler(monkeypatch):
+    monkeypatch.setattr(metrics.cProfile, "Profile", lambda: (_ for _ in ()).throw(ValueError("busy elsewhere")))
+    with pytest.raises(ValueError):
+        metrics.Profile(kind="cprofile").start()
+    monkeypatch.undo()
+    metrics.Profile(kind="cprofile").start().stop()
+
+
+def _busy_worker_step():
+    return sum(i * i for i in range(20_000))
+
+
+def test_cprofile_covers_worker_threads():
+    from utils.orchestration import run_stages
+
+    with metrics.Profile(kind="cprofile", limit=200) as profile:
+        results = list(run_stages({"work": _busy_worker_step}, deadline=5))
+    assert results[0].ok
+    assert "_busy_worker_step" in profile.report
+    assert "threads" in profile.report.splitlines()[0]
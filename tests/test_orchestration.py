@@ -0,0 +1,46 @@
+import threading
+import time
+
+import pytest
+
+from utils.orchestration import StageTimer, run_stages
+
+
+def test_results_arrive_in_completion_order():
+    results = list(run_stages({
+        "slow": lambda: time.sleep(0.2) or "slow done",
+        "fast": lambda: "fast done",
+    }, deadline=2))
+    assert [r.name for r in results] == ["fast", "slow"]
+    assert [r.value for r in results] == ["fast done", "slow done"]
+    assert all(r.ok for r in results)
+    assert results[1].elapsed >= 0.2
+
+
+def test_a_failing_stage_does_not_break_the_others():
+    def broken():
+        raise ValueError("geocoder down")
+
+    results = {r.name: r for r in run_stages({"broken": broken, "fine": lambda: 42}, deadline=2)}
+    assert not results["broken"].ok and isinstance(results["broken"].error, ValueError)
+    assert results["fine"].ok and results["fine"].value == 42
+
+
+def test_a_stage_that_misses_the_deadline_times_out():
+    release = threading.Event()
+    start = time.perf_counter()
+    results = list(run_stages({"stuck": lambda: release.wait(5), "quick": lambda: "ok"}, deadline=0.2))
+    release.set()
+    assert time.perf_counter() - start < 1
+    assert [r.name for r in results] == ["quick", "stuck"]
+    stuck = results[1]
+    assert isinstance(stuck.error, TimeoutError) and stuck.value is None
+    assert stuck.elapsed >= 0.2
+
+
+def test_stage_timer_records_failed_steps_too():
+    timer = StageTimer()
+    assert timer.measure("double", lambda x: x * 2, 21) == 42
+    with pytest.raises(ZeroDivisionError):
+        timer.measure("fails", lambda: 1 / 0)
+    assert set(timer.timings) == {"double", "fails"}
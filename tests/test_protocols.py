@@ -0,0 +1,62 @@
+import csv
+import os
+
+import pytest
+
+from utils.protocols import fallback_protocols, find_protocol, is_red_flag
+
+SAMPLES = os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks", "data", "triage_samples.csv")
+
+
+def _samples():
+    with open(SAMPLES, newline="", encoding="utf-8") as f:
+        return [(row["description"], row["label"]) for row in csv.DictReader(f)]
+
+
+def _must_not_answer():
+    return [description for description, label in _samples() if label == "none"]
+
+
+@pytest.mark.parametrize("description", _must_not_answer())
+def test_must_not_answer_rows_go_to_the_model(description):
+    assert find_protocol(description) is None
+
+
+@pytest.mark.parametrize("description,label", [row for row in _samples() if row[1] != "none"])
+def test_labelled_rows_never_get_the_wrong_card(description, label):
+    # A stored card skips the model, so a confident match has to be the right one
+    card = find_protocol(description)
+    assert card is None or card.id == label
+
+
+def test_a_cut_on_the_forehead_is_not_a_head_bump():
+    card = find_protocol("small cut on forehead bleeding")
+    assert card is None or card.id == "cut"
+
+
+@pytest.mark.parametrize("description", ["stroke, slurred speech", "heat stroke", "my dad collapsed", "chest pains"])
+def test_red_flags(description):
+    assert is_red_flag(description)
+
+
+def test_negation_only_blocks_the_cards_own_words():
+    assert find_protocol("I am not choking") is None
+    assert find_protocol("burned my hand on the stove").id == "burn"
+
+
+def test_single_words_are_not_answered():
+    for word in ("eye", "nose", "bone", "dog", "allergic", "burn"):
+        assert find_protocol(word) is None
+
+
+def test_fallback_always_starts_with_the_general_card():
+    assert fallback_protocols("")[0].id == "general"
+
+
+@pytest.mark.parametrize("description", ["heart attack", "my dad collapsed and is not breathing", "stroke"])
+def test_fallback_adds_no_card_for_emergencies(description):
+    assert [card.id for card in fallback_protocols(description)] == ["general"]
+
+
+def test_fallback_adds_a_safe_match():
+    assert [card.id for card in fallback_protocols("burned my hand on the stove")] == ["general", "burn"]
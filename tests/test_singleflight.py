@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def _run_concurrently(n, target):
+    results, errors = [None] * n, [None] * n
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def _wait_for_waiters(flight, n, timeout=2.0):
+    end = time.monotonic() + timeout
+    while flight.calls + flight.shared < n and time.monotonic() < end:
+        time.sleep(0.005)
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight(timeout=5)
+    release = threading.Event()
+    upstream = []
+
+    def fetch():
+        upstream.append(1)
+        release.wait(5)
+        return {"city": "Austin"}
+
+    threads, results, errors = _run_concurrently(8, lambda: flight.do("austin", fetch))
+    _wait_for_waiters(flight, 8)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(upstream) == 1
+    assert results == [{"city": "Austin"}] * 8 and errors == [None] * 8
+    assert flight.stats() == {"calls": 1, "shared": 7, "coalesced_rate": 7 / 8, "in_flight": 0}
+
+
+def test_errors_fan_out_to_every_waiter():
+    flight = SingleFlight(timeout=5)
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise ConnectionError("upstream down")
+
+    threads, results, errors = _run_concurrently(5, lambda: flight.do("x", fetch))
+    _wait_for_waiters(flight, 5)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(e, ConnectionError) for e in errors)
+    assert flight.calls == 1
+    # Nothing is remembered: the next call runs again
+    assert flight.do("x", lambda: "ok") == "ok"
+
+
+def test_waiter_timeout_leaves_the_call_running():
+    flight = SingleFlight(timeout=0.05)
+    release = threading.Event()
+    threads, results, _ = _run_concurrently(1, lambda: flight.do("slow", lambda: release.wait(5) and "done"))
+    _wait_for_waiters(flight, 1)
+    with pytest.raises(TimeoutError):
+        flight.do("slow", lambda: "never")
+    release.set()
+    threads[0].join()
+    assert results == ["done"]
+
+
+def test_different_keys_and_disabled_groups_do_not_coalesce():
+    flight = SingleFlight()
+    assert [flight.do(k, lambda k=k: k) for k in ("a", "b")] == ["a", "b"]
+    disabled = SingleFlight(enabled=False)
+    assert disabled.do("a", lambda: 1) == 1
+    assert disabled.stats()["calls"] == 0
@@ -0,0 +1,128 @@
+import json
+
+from utils.triage import _open_output, load_checkpoint
+
+
+def _line(id, status="ok", **fields):
+    return json.dumps({"id": id, "status": status, **fields}, ensure_ascii=False) + "\n"
+
+
+def test_checkpoint_survives_a_line_cut_inside_a_character(tmp_path):
+    path = tmp_path / "triage.jsonl"
+    cut = _line("c", steps="Kühlen").encode("utf-8")
+    cut = cut[:cut.index("ü".encode("utf-8")) + 1]  # first byte of the two-byte "ü"
+    path.write_bytes(_line("a").encode("utf-8") + _line("b", status="error").encode("utf-8") + cut)
+
+    assert load_checkpoint(str(path)) == {"a"}
+
+    with _open_output(str(path), resume=True) as output:
+        output.write(_line("d", steps="Kühlen"))
+    assert load_checkpoint(str(path)) == {"a", "d"}
+    assert path.read_bytes().endswith(_line("d", steps="Kühlen").encode("utf-8"))
+
+
+def test_resume_appends_after_a_complete_last_line(tmp_path):
+    path = tmp_path / "triage.jsonl"
+    path.write_text(_line("a"), encoding="utf-8")
+    with _open_output(str(path), resume=True) as output:
+        output.write(_line("b"))
+    assert path.read_text(encoding="utf-8") == _line("a") + _line("b")
+
+
+def test_checkpoint_of_a_missing_file_is_empty(tmp_path):
+    assert load_checkpoint(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_stored_card_after_a_missed_budget_is_a_fallback_not_ok(gemini, monkeypatch):
+    from utils import settings
+    from utils.ai_helpers import TEXT_MODEL
+    from utils.triage import triage_text
+
+    monkeypatch.setattr(settings, "LATENCY_BUDGET_SECONDS", 0.2)
+    monkeypatch.setattr(settings, "HEDGE_ENABLED", False)
+    gemini({TEXT_MODEL: {"first_token_latency": 2.0}})
+    assert triage_text("a strange purple rash spreading on my leg")["status"] == "fallback"
+
+
+def test_fallbacks_are_retried_on_resume(tmp_path):
+    path = tmp_path / "triage.jsonl"
+    path.write_text(_line("a") + _line("b", status="fallback"), encoding="utf-8")
+    assert load_checkpoint(str(path)) == {"a"}
+
+
+def test_answered_text_is_ok(gemini):
+    from utils.triage import triage_text
+
+    gemini()
+    assert triage_text("a strange purple rash spreading on my leg")["status"] == "ok"
+
+
+def test_unreadable_image_is_invalid():
+    import asyncio
+
+    from utils.triage import TriageItem, TriageRunner
+
+    async def run():
+        async with TriageRunner(concurrency=1, prep_workers=1) as runner:
+            return await runner.triage(TriageItem(id="x", kind="image", source="test", data=b"not an image"))
+
+    assert asyncio.run(run())["status"] == "invalid"
+
+
+def test_closing_map_early_cancels_queued_items():
+    import asyncio
+
+    from utils.triage import TriageItem, TriageRunner
+
+    started = []
+
+    class Runner(TriageRunner):
+        async def triage(self, item):
+            started.append(item.id)
+            await asyncio.sleep(0.05)
+            return {"id": item.id, "status": "ok"}
+
+    async def run():
+        async with Runner(concurrency=4, prep_workers=1) as runner:
+            results = runner.map(TriageItem(id=str(i), kind="text", source="test", text="x") for i in range(20))
+            first = await results.__anext__()
+            await results.aclose()
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            await asyncio.sleep(0.1)
+            return first, tasks
+
+    first, tasks = asyncio.run(run())
+    assert first["status"] == "ok"
+    assert len(started) <= 10
+    assert all(task.cancelled() for task in tasks)
+
+
+def test_without_latency_budgets_the_model_answer_is_awaited(gemini, monkeypatch):
+    from utils import settings
+    from utils.ai_helpers import TEXT_MODEL
+    from utils.triage import triage_text
+
+    monkeypatch.setattr(settings, "LATENCY_BUDGET_SECONDS", 0.2)
+    monkeypatch.setattr(settings, "HEDGE_ENABLED", False)
+    gemini({TEXT_MODEL: {"first_token_latency": 0.4, "latency": 0.4}})
+    assert triage_text("a strange purple rash spreading on my leg", latency_budgets=False)["status"] == "ok"
+
+
+def test_cli_leaves_the_global_budgets_alone(gemini, tmp_path):
+    from utils import settings
+    from utils.triage import main
+
+    gemini()
+    reports = tmp_path / "reports.csv"
+    reports.write_text("id,description\n1,a strange purple rash spreading on my leg\n", encoding="utf-8")
+    budgets = settings.LATENCY_BUDGET_SECONDS, settings.IMAGE_LATENCY_BUDGET_SECONDS
+    assert main([str(reports), "-o", str(tmp_path / "triage.jsonl")]) == 0
+    assert (settings.LATENCY_BUDGET_SECONDS, settings.IMAGE_LATENCY_BUDGET_SECONDS) == budgets
+    assert '"status": "ok"' in (tmp_path / "triage.jsonl").read_text(encoding="utf-8")
+
+
+def test_cpu_time_without_the_resource_module(monkeypatch):
+    from utils import triage
+
+    monkeypatch.setattr(triage, "resource", None)
+    assert triage._cpu_seconds() >= 0
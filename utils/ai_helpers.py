@@ -1,56 +1,387 @@
-import streamlit as st
-import google.generativeai as genai
-from PIL import Image
+"""
+Gemini-backed injury analysis and first aid instructions.
 
-# Configure Gemini API
-genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+No Streamlit here: the app, the batch CLI (`utils.triage`) and the HTTP API all use
+these functions. Failures are logged and answered with the stored protocol cards
+(IMAGE_ANALYSIS_FAILED for a missing description); pass `on_error` (e.g. st.error)
+to also show the message to the user.
+"""
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from utils import metrics, settings
+from utils.hedging import LatencyBudgetExceeded, RaceInfo, hedged_generate, hedged_stream
+from utils.image_prep import PreparedImage, preprocess_image
+from utils.protocols import fallback_protocols, find_protocol
+from utils.result_cache import get_result, image_key, put_result, text_key
 
 # Use current recommended model names/aliases
 # The 'gemini-2.5-flash' model is multimodal, handling both vision and text.
 VISION_MODEL = "gemini-2.5-flash"
 TEXT_MODEL = "gemini-2.5-flash"
 
+# Bump whenever a prompt below changes so cached answers from the old prompt are not reused.
+PROMPT_VERSION = "1"
+
+ANALYSIS_PROMPT = (
+    "Describe clearly and medically what visible injury or condition appears in this image."
+)
+
+# Single-request image analysis: description and first aid steps as structured JSON.
+COMBINED_PROMPT = (
+    "Describe clearly and medically what visible injury or condition appears in this image, "
+    "then provide concise, safe, step-by-step first aid instructions for it. "
+    "Answer in JSON with the fields 'description' and 'first_aid_steps'."
+)
+COMBINED_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "object",
+        "properties": {
+            "description": {"type": "string"},
+            "first_aid_steps": {"type": "string"},
+        },
+        "required": ["description", "first_aid_steps"],
+    },
+}
+
+# Shown instead of an answer when a call fails; callers can compare against these.
+IMAGE_ANALYSIS_FAILED = "Unable to analyze the image."
+FIRST_AID_FAILED = "Unable to generate first aid instructions."
+# Put above the stored protocol card shown when no model answered within the latency budget.
+LATE_ANSWER_NOTE = "The AI assistant did not answer in time. These are the stored first aid instructions."
+# Put above the stored protocol card shown when the model call failed (errors after retries).
+UNAVAILABLE_NOTE = "The AI assistant is unavailable right now. These are the stored first aid instructions."
+# Put above the general card shown for an image that could not be analyzed (error or timeout).
+NO_ANALYSIS_NOTE = "The image could not be analyzed. These are the general stored first aid instructions."
+
+_json_decoder = json.JSONDecoder()
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GenerationStats:
+    """Timings of one streamed generation, in seconds."""
+    time_to_first_token: Optional[float] = None
+    total_time: Optional[float] = None
 
-def analyze_image(uploaded_file):
-    """Analyze an image using the Gemini Vision model."""
+
+def _report_error(on_error: Optional[Callable[[str], None]], message: str) -> None:
+    logger.error(message)
+    if on_error is not None:
+        on_error(message)
+
+
+def _late_answer(injury_description, note: str = LATE_ANSWER_NOTE) -> str:
+    """
+    The stored protocol cards for a description, shown when the latency budget is missed,
+    when the model call failed (pass UNAVAILABLE_NOTE) or when there is no description
+    because the image analysis failed.
+    """
+    if injury_description == IMAGE_ANALYSIS_FAILED:
+        description, note = "", NO_ANALYSIS_NOTE
+    else:
+        description = injury_description
     try:
-        image = Image.open(uploaded_file)
-        # Use a model that supports vision
-        model = genai.GenerativeModel(VISION_MODEL)
+        cards = "\n\n".join(card.format() for card in fallback_protocols(description))
+    except Exception as e:
+        # A missing or malformed protocols.json must not turn a fallback into a crash
+        logger.error(f"Stored protocol cards unavailable: {e}")
+        return FIRST_AID_FAILED
+    return f"_{note}_\n\n{cards}"
+
+
+def _stored_card(injury_description):
+    """The confident protocol card match, or None (also when the cards cannot be loaded)."""
+    try:
+        return find_protocol(injury_description)
+    except Exception as e:
+        metrics.record_error("find_protocol", e)
+        logger.error(f"Protocol matching failed, asking the model: {e}")
+        return None
+
+
+def is_stored_fallback(steps) -> bool:
+    """True when `steps` are (or end with) stored cards shown in place of a model answer."""
+    return isinstance(steps, str) and any(f"_{note}_" in steps for note in (LATE_ANSWER_NOTE, UNAVAILABLE_NOTE, NO_ANALYSIS_NOTE))
+
+
+def is_complete_answer(steps) -> bool:
+    """
+    False for failed answers (also when the stream failed after some text) and for
+    stored-card fallbacks: those should be asked for again rather than kept.
+    """
+    return isinstance(steps, str) and bool(steps.strip()) and FIRST_AID_FAILED not in steps and not is_stored_fallback(steps)
+
+
+def _prepared(uploaded_file) -> PreparedImage:
+    if isinstance(uploaded_file, PreparedImage):
+        return uploaded_file
+    return preprocess_image(uploaded_file)
 
-        prompt = (
-            "Describe clearly and medically what visible injury or condition appears in this image."
-        )
 
-        # Pass both the text prompt and the image object
-        response = model.generate_content([prompt, image])
-        if hasattr(response, "text") and response.text:
-            return response.text.strip()
+@metrics.timed()
+def analyze_image(uploaded_file, on_error: Optional[Callable[[str], None]] = None, budget: Optional[float] = None):
+    """
+    Analyze an image using the Gemini Vision model.
+    Accepts an uploaded file or an already preprocessed PreparedImage.
+    `budget` overrides IMAGE_LATENCY_BUDGET_SECONDS (0 = wait for the answer).
+    """
+    budget = settings.IMAGE_LATENCY_BUDGET_SECONDS if budget is None else budget
+    try:
+        prepared = _prepared(uploaded_file)
+        cache_key = image_key("analysis", VISION_MODEL, PROMPT_VERSION, prepared.data)
+        cached = get_result(cache_key)
+        if cached is not None:
+            return cached
+
+        # Pass both the text prompt and the image to a model that supports vision
+        info = RaceInfo()
+        text = hedged_generate(
+            "analysis", [ANALYSIS_PROMPT, prepared.as_blob()], VISION_MODEL, settings.HEDGE_VISION_MODEL,
+            budget=budget, info=info,
+        )
+        if text.strip():
+            result = text.strip()
+            # The cache key names the primary model: answers from the hedge model are not stored
+            if info.model == VISION_MODEL:
+                put_result(cache_key, result)
+            return result
         return "No description detected."
 
+    except LatencyBudgetExceeded as e:
+        metrics.record_error("analyze_image", e)
+        _report_error(on_error, f"Image analysis took longer than {budget:g}s.")
+        return IMAGE_ANALYSIS_FAILED
+
     except Exception as e:
+        metrics.record_error("analyze_image", e)
         # Check if the error is related to a missing model and provide a helpful tip
         if "404" in str(e) and "models" in str(e):
-             st.error("Error: Model not found. Please ensure you are using the latest 'google-genai' library and supported model names.")
+            _report_error(on_error, "Error: Model not found. Please ensure you are using the latest 'google-genai' library and supported model names.")
         else:
-             st.error(f"Error analyzing image: {e}")
-        return "Unable to analyze the image."
+            _report_error(on_error, f"Error analyzing image: {e}")
+        return IMAGE_ANALYSIS_FAILED
+
+
+def first_aid_prompt(injury_description):
+    return f"Provide concise, safe, step-by-step first aid instructions for: {injury_description}."
+
 
+@metrics.timed()
+def generate_first_aid_steps(injury_description, on_error: Optional[Callable[[str], None]] = None,
+                             budget: Optional[float] = None):
+    """
+    Generate short, step-by-step first aid instructions.
+    Common conditions are answered from the local protocol cards; the rest go to Gemini,
+    and the closest stored card is shown if no model answers within the latency budget
+    or the call fails. `budget` overrides LATENCY_BUDGET_SECONDS (0 = wait for the answer).
+    """
+    budget = settings.LATENCY_BUDGET_SECONDS if budget is None else budget
+    card = _stored_card(injury_description)
+    if card is not None:
+        logger.info(f"Answered from protocol card '{card.id}'")
+        return card.format()
 
-def generate_first_aid_steps(injury_description):
-    """Generate short, step-by-step first aid instructions."""
     try:
+        if injury_description == IMAGE_ANALYSIS_FAILED:
+            return _late_answer(injury_description)
+
+        cache_key = text_key("steps", TEXT_MODEL, PROMPT_VERSION, injury_description)
+        cached = get_result(cache_key)
+        if cached is not None:
+            return cached
+
         # Use the same model for text generation
-        model = genai.GenerativeModel(TEXT_MODEL)
-        prompt = (
-            f"Provide concise, safe, step-by-step first aid instructions for: {injury_description}."
+        info = RaceInfo()
+        text = hedged_generate(
+            "steps", first_aid_prompt(injury_description), TEXT_MODEL, settings.HEDGE_TEXT_MODEL,
+            budget=budget, info=info,
         )
-
-        response = model.generate_content(prompt)
-        if hasattr(response, "text") and response.text:
-            return response.text.strip()
+        if text.strip():
+            result = text.strip()
+            if info.model == TEXT_MODEL:
+                put_result(cache_key, result)
+            return result
         return "No first aid steps generated."
 
+    except LatencyBudgetExceeded as e:
+        metrics.record_error("generate_first_aid_steps", e)
+        logger.warning(f"Showing the stored protocol: {e}")
+        return _late_answer(injury_description)
+
+    except Exception as e:
+        metrics.record_error("generate_first_aid_steps", e)
+        _report_error(on_error, f"Error generating first aid steps: {e}")
+        return _late_answer(injury_description, UNAVAILABLE_NOTE)
+
+
+@metrics.timed()
+def stream_first_aid_steps(
+    injury_description,
+    stats: Optional[GenerationStats] = None,
+    on_error: Optional[Callable[[str], None]] = None,
+    budget: Optional[float] = None,
+):
+    """
+    Stream first aid instructions chunk by chunk as Gemini generates them (for st.write_stream).
+    Common conditions are answered at once from the local protocol cards, and the closest
+    stored card follows whatever arrived if the answer misses the latency budget or fails.
+    Time to first token and total generation time are stored in `stats` and logged.
+    `budget` overrides LATENCY_BUDGET_SECONDS (0 = wait for the answer).
+    """
+    stats = stats if stats is not None else GenerationStats()
+    budget = settings.LATENCY_BUDGET_SECONDS if budget is None else budget
+    start = time.perf_counter()
+    parts = []
+    try:
+        card = _stored_card(injury_description)
+        if card is not None:
+            logger.info(f"Answered from protocol card '{card.id}'")
+            stats.time_to_first_token = time.perf_counter() - start
+            yield card.format()
+            return
+        if injury_description == IMAGE_ANALYSIS_FAILED:
+            yield _late_answer(injury_description)
+            return
+
+        # Shares cache entries with generate_first_aid_steps
+        cache_key = text_key("steps", TEXT_MODEL, PROMPT_VERSION, injury_description)
+        cached = get_result(cache_key)
+        if cached is not None:
+            stats.time_to_first_token = time.perf_counter() - start
+            yield cached
+            return
+
+        info = RaceInfo()
+        chunks = hedged_stream(
+            "steps", first_aid_prompt(injury_description), TEXT_MODEL, settings.HEDGE_TEXT_MODEL,
+            budget=budget, info=info,
+        )
+        for text in chunks:
+            if stats.time_to_first_token is None:
+                stats.time_to_first_token = time.perf_counter() - start
+            parts.append(text)
+            yield text
+        if parts:
+            if info.model == TEXT_MODEL:
+                put_result(cache_key, "".join(parts).strip())
+        else:
+            yield "No first aid steps generated."
+
+    except LatencyBudgetExceeded as e:
+        metrics.record_error("stream_first_aid_steps", e)
+        logger.warning(f"Showing the stored protocol: {e}")
+        yield ("\n\n" if parts else "") + _late_answer(injury_description)
+
+    except Exception as e:
+        metrics.record_error("stream_first_aid_steps", e)
+        _report_error(on_error, f"Error generating first aid steps: {e}")
+        yield ("\n\n" if parts else "") + _late_answer(injury_description, UNAVAILABLE_NOTE)
+
+    finally:
+        stats.total_time = time.perf_counter() - start
+        logger.info(
+            "first aid stream: ttft=%s total=%.3fs",
+            f"{stats.time_to_first_token:.3f}s" if stats.time_to_first_token is not None else "n/a",
+            stats.total_time,
+        )
+
+
+def _completed_json_string(buffer, key):
+    """Returns the string value of `key` once it has fully arrived in a partial JSON buffer, else None."""
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(key), buffer)
+    if not match:
+        return None
+    try:
+        value, _ = _json_decoder.raw_decode(buffer, match.end() - 1)
+    except ValueError:
+        return None
+    return value
+
+
+@metrics.timed()
+def analyze_image_with_steps(uploaded_file, on_error: Optional[Callable[[str], None]] = None,
+                             budget: Optional[float] = None):
+    """
+    Analyze an image and generate first aid steps in one multimodal request.
+    Yields ("description", text) and then ("steps", text), each as soon as it is parsed from the stream;
+    both are always yielded, with the stored protocol cards as the steps when the call fails.
+    Accepts an uploaded file or an already preprocessed PreparedImage.
+    `budget` overrides IMAGE_LATENCY_BUDGET_SECONDS (0 = wait for the answer, for the steps too).
+    """
+    # A second call for the steps keeps the text budget, unless budgets are off altogether
+    steps_budget = 0 if budget == 0 else None
+    budget = settings.IMAGE_LATENCY_BUDGET_SECONDS if budget is None else budget
+    sections = {}
+    try:
+        prepared = _prepared(uploaded_file)
+        cache_key = image_key("combined", VISION_MODEL, PROMPT_VERSION, prepared.data)
+        cached = get_result(cache_key)
+        if cached is not None:
+            yield "description", cached["description"]
+            yield "steps", cached["steps"]
+            return
+
+        info = RaceInfo()
+        chunks = hedged_stream(
+            "combined",
+            [COMBINED_PROMPT, prepared.as_blob()],
+            VISION_MODEL,
+            settings.HEDGE_VISION_MODEL,
+            budget=budget,
+            info=info,
+            generation_config=COMBINED_GENERATION_CONFIG,
+        )
+
+        buffer = ""
+        pending = [("description", "description"), ("first_aid_steps", "steps")]
+        for text in chunks:
+            buffer += text
+            # Sections arrive in schema order; emit each one the moment its string closes
+            while pending:
+                value = _completed_json_string(buffer, pending[0][0])
+                if value is None:
+                    break
+                section = pending.pop(0)[1]
+                sections[section] = value.strip()
+                yield section, sections[section]
+
+        if not pending:
+            if info.model == VISION_MODEL:
+                put_result(cache_key, sections)
+            return
+
+        # The answer was cut off or not the expected JSON. The raw buffer is never shown:
+        # keep the description if it arrived complete and get the steps from a second call
+        logger.warning(f"Incomplete structured answer ({len(buffer)} chars); missing {[k for k, _ in pending]}")
+        if "description" not in sections:
+            _report_error(on_error, "The image analysis answer was incomplete.")
+            sections["description"] = IMAGE_ANALYSIS_FAILED
+            yield "description", IMAGE_ANALYSIS_FAILED
+        yield "steps", generate_first_aid_steps(sections["description"], on_error=on_error, budget=steps_budget)
+
+    except LatencyBudgetExceeded as e:
+        metrics.record_error("analyze_image_with_steps", e)
+        _report_error(on_error, f"Image analysis took longer than {budget:g}s.")
+        if "description" not in sections:
+            sections["description"] = IMAGE_ANALYSIS_FAILED
+            yield "description", IMAGE_ANALYSIS_FAILED
+        if "steps" not in sections:
+            yield "steps", _late_answer(sections["description"])
+
     except Exception as e:
-        st.error(f"Error generating first aid steps: {e}")
-        return "Unable to generate first aid instructions."
\ No newline at end of file
+        metrics.record_error("analyze_image_with_steps", e)
+        if "description" not in sections:
+            _report_error(on_error, f"Error analyzing image: {e}")
+            yield "description", IMAGE_ANALYSIS_FAILED
+            yield "steps", _late_answer(IMAGE_ANALYSIS_FAILED)
+        elif "steps" not in sections:
+            # The description arrived before the stream failed: the steps can still be generated from it
+            logger.warning(f"Image analysis failed after the description: {e}")
+            yield "steps", generate_first_aid_steps(sections["description"], on_error=on_error, budget=steps_budget)
@@ -0,0 +1,253 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from utils import metrics
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with per-entry TTL.
+    Same interface as SQLiteCache, but nothing survives a restart or is shared between processes.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    Persistent key/value cache stored in a SQLite file.
+    Values are JSON-encoded. Entries expire after `ttl` seconds and the least
+    recently used entries are evicted once `max_entries` is exceeded.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        # WAL lets several Streamlit worker processes share the same file.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        return count
+
+
+class RedisCache:
+    """
+    Cache stored in Redis (or any Redis-compatible local server).
+    Expiry uses native key TTLs; a sorted set of access times per namespace enforces the LRU bound,
+    and one of expiry times lets `len()` drop keys Redis has already expired.
+    Requires the optional `redis` package.
+    """
+
+    def __init__(self, url: str, ttl: float, max_entries: int, namespace: str = "firstaid"):
+        import redis  # optional dependency, only needed for this backend
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self._client = redis.Redis.from_url(url)
+        self._lru_key = f"{namespace}:__lru__"
+        self._expiry_key = f"{namespace}:__expiry__"
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._client.get(self._key(key))
+        if value is None:
+            pipe = self._client.pipeline()
+            pipe.zrem(self._lru_key, key)
+            pipe.zrem(self._expiry_key, key)
+            pipe.execute()
+            return None
+        self._client.zadd(self._lru_key, {key: time.time()})
+        return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        ttl = max(int(self.ttl), 1)
+        now = time.time()
+        pipe = self._client.pipeline()
+        pipe.set(self._key(key), json.dumps(value), ex=ttl)
+        pipe.zadd(self._lru_key, {key: now})
+        pipe.zadd(self._expiry_key, {key: now + ttl})
+        pipe.execute()
+        overflow = self._client.zcard(self._lru_key) - self.max_entries
+        if overflow > 0:
+            oldest = self._client.zrange(self._lru_key, 0, overflow - 1)
+            if oldest:
+                pipe = self._client.pipeline()
+                pipe.delete(*(self._key(k.decode()) for k in oldest))
+                pipe.zrem(self._lru_key, *oldest)
+                pipe.zrem(self._expiry_key, *oldest)
+                pipe.execute()
+
+    def clear(self) -> None:
+        keys = self._client.zrange(self._lru_key, 0, -1)
+        if keys:
+            self._client.delete(*(self._key(k.decode()) for k in keys))
+        self._client.delete(self._lru_key, self._expiry_key)
+
+    def __len__(self) -> int:
+        # Expired keys are gone from Redis but not from the sorted sets: prune them first
+        now = time.time()
+        expired = self._client.zrangebyscore(self._expiry_key, "-inf", now)
+        pipe = self._client.pipeline()
+        if expired:
+            pipe.zrem(self._lru_key, *expired)
+        pipe.zremrangebyscore(self._expiry_key, "-inf", now)
+        pipe.zcard(self._lru_key)
+        return pipe.execute()[-1]
+
+
+def make_cache(backend: str, ttl: float, max_entries: int, path: str = "", url: str = "", namespace: str = "firstaid"):
+    """
+    Builds a cache backend by name: "memory", "sqlite" (file at `path`) or "redis" (server at `url`).
+    """
+    if backend == "memory":
+        return MemoryCache(ttl=ttl, max_entries=max_entries)
+    if backend == "sqlite":
+        return SQLiteCache(path, ttl=ttl, max_entries=max_entries)
+    if backend == "redis":
+        return RedisCache(url, ttl=ttl, max_entries=max_entries, namespace=namespace)
+    raise ValueError(f"Unknown cache backend: {backend!r}")
+
+
+class ResponseCache:
+    """
+    Counts hits and misses in front of any cache backend.
+    `name` labels the cache in the exported metrics.
+    """
+
+    def __init__(self, backend, name: str = "responses"):
+        self.backend = backend
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            # A broken cache must never take the request path down with it.
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.inc("firstaid_cache_requests_total", cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            self.backend.set(key, value)
+        except Exception:
+            pass
+
+    def clear(self) -> None:
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.backend),
+        }
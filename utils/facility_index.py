@@ -0,0 +1,241 @@
+"""
+Offline hospital index for nearest-facility lookups without calling Gemini.
+
+Build it once from an OSM (Overpass JSON), GeoJSON or CSV extract of hospitals:
+
+    python -m utils.facility_index build hospitals.geojson -o data/facilities.npz
+    python -m utils.facility_index query data/facilities.npz 30.2672 -97.7431 -k 5
+"""
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from utils import settings
+from utils.geo import haversine_km, km_to_chord, to_unit_vectors
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy is optional; fall back to a vectorized linear scan
+    cKDTree = None
+
+
+class FacilityIndex:
+    """
+    Spatial index over hospital locations.
+    A KD-tree over unit-sphere vectors finds candidates; a vectorized haversine ranks them.
+    """
+
+    def __init__(self, names, addresses, lats, lons):
+        self.names = np.asarray(names, dtype=str)
+        self.addresses = np.asarray(addresses, dtype=str)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self._tree = cKDTree(to_unit_vectors(self.lats, self.lons)) if cKDTree and len(self) else None
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def _candidates(self, lat: float, lon: float, k: int, radius_km: Optional[float]) -> np.ndarray:
+        if self._tree is None:
+            return np.arange(len(self))
+        point = to_unit_vectors(lat, lon)[0]
+        bound = km_to_chord(radius_km) if radius_km is not None else np.inf
+        if k is None:
+            return np.asarray(self._tree.query_ball_point(point, bound), dtype=np.intp)
+        k = min(k, len(self))
+        _, idx = self._tree.query(point, k=k, distance_upper_bound=bound)
+        idx = np.atleast_1d(idx)
+        return idx[idx < len(self)]
+
+    def query(self, lat: float, lon: float, k: Optional[int] = 5, radius_km: Optional[float] = None):
+        """
+        Returns (indexes, distances_km) of the `k` nearest facilities, nearest first.
+        With `k=None` every facility within `radius_km` is returned.
+        """
+        if not len(self):
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        idx = self._candidates(lat, lon, k, radius_km)
+        dist = haversine_km(lat, lon, self.lats[idx], self.lons[idx])
+        if radius_km is not None:
+            keep = dist <= radius_km
+            idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        if k is not None:
+            order = order[:k]
+        return idx[order], dist[order]
+
+    def nearest(self, lat: float, lon: float, k: Optional[int] = 5, radius_km: Optional[float] = None):
+        """Same as `query`, returned as a DataFrame with name, address, lat, lon and distance_km."""
+        import pandas as pd
+
+        idx, dist = self.query(lat, lon, k=k, radius_km=radius_km)
+        return pd.DataFrame({
+            "name": self.names[idx],
+            "address": self.addresses[idx],
+            "lat": self.lats[idx],
+            "lon": self.lons[idx],
+            "distance_km": dist,
+        })
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, names=self.names, addresses=self.addresses, lats=self.lats, lons=self.lons)
+
+    @classmethod
+    def load(cls, path: str) -> "FacilityIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["names"], data["addresses"], data["lats"], data["lons"])
+
+
+# --- Loaders for hospital extracts ---
+
+def _address_from_tags(tags: dict) -> str:
+    if tags.get("addr:full"):
+        return tags["addr:full"]
+    street = " ".join(p for p in (tags.get("addr:housenumber"), tags.get("addr:street")) if p)
+    parts = [street, tags.get("addr:city"), tags.get("addr:postcode"), tags.get("addr:country")]
+    return ", ".join(p for p in parts if p)
+
+
+def _records_from_geojson(data: dict) -> List[dict]:
+    records = []
+    for feature in data.get("features", []):
+        geometry = feature.get("geometry") or {}
+        props = feature.get("properties") or {}
+        coords = geometry.get("coordinates")
+        if geometry.get("type") == "Point" and coords:
+            lon, lat = coords[:2]
+        elif geometry.get("type") in ("Polygon", "MultiPolygon") and coords:
+            # Use the mean of the outer ring as a cheap centroid.
+            ring = np.asarray(coords[0] if geometry["type"] == "Polygon" else coords[0][0], dtype=float)
+            lon, lat = ring[:, 0].mean(), ring[:, 1].mean()
+        else:
+            continue
+        records.append({
+            "name": props.get("name") or "Unnamed hospital",
+            "address": props.get("address") or _address_from_tags(props),
+            "lat": lat,
+            "lon": lon,
+        })
+    return records
+
+
+def _records_from_overpass(data: dict) -> List[dict]:
+    records = []
+    for element in data.get("elements", []):
+        tags = element.get("tags") or {}
+        point = element if "lat" in element else element.get("center")
+        if not point:
+            continue
+        records.append({
+            "name": tags.get("name") or "Unnamed hospital",
+            "address": _address_from_tags(tags),
+            "lat": point["lat"],
+            "lon": point["lon"],
+        })
+    return records
+
+
+def _records_from_csv(path: str) -> List[dict]:
+    records = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+            lat = row.get("lat") or row.get("latitude")
+            lon = row.get("lon") or row.get("lng") or row.get("longitude")
+            if not lat or not lon:
+                continue
+            records.append({
+                "name": row.get("name") or "Unnamed hospital",
+                "address": row.get("address", ""),
+                "lat": float(lat),
+                "lon": float(lon),
+            })
+    return records
+
+
+def load_records(path: str) -> List[dict]:
+    """Reads hospital records from a .csv, GeoJSON or Overpass JSON file."""
+    if path.lower().endswith(".csv"):
+        return _records_from_csv(path)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if "features" in data:
+        return _records_from_geojson(data)
+    if "elements" in data:
+        return _records_from_overpass(data)
+    raise ValueError(f"Unrecognised hospital extract format: {path}")
+
+
+def build_index(records: List[dict]) -> FacilityIndex:
+    return FacilityIndex(
+        [r["name"] for r in records],
+        [r["address"] for r in records],
+        [float(r["lat"]) for r in records],
+        [float(r["lon"]) for r in records],
+    )
+
+
+_index: Optional[FacilityIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_facility_index() -> Optional[FacilityIndex]:
+    """Returns the process-wide index loaded from settings.FACILITY_INDEX_PATH, or None if it was never built."""
+    global _index
+    if _index is None and os.path.exists(settings.FACILITY_INDEX_PATH):
+        with _index_lock:
+            if _index is None:
+                _index = FacilityIndex.load(settings.FACILITY_INDEX_PATH)
+    return _index
+
+
+def find_nearest_facilities(lat: float, lon: float, radius_km: float = 10.0, k: int = 5):
+    """
+    Looks up the nearest hospitals in the offline index.
+    Returns None when there is no index or it has no hospital within `radius_km`,
+    so callers can fall back to the LLM search.
+    """
+    index = get_facility_index()
+    if index is None:
+        return None
+    df = index.nearest(lat, lon, k=k, radius_km=radius_km)
+    return df if not df.empty else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the offline hospital index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="build an index from CSV, GeoJSON or Overpass JSON extracts")
+    build.add_argument("inputs", nargs="+")
+    build.add_argument("-o", "--output", default=settings.FACILITY_INDEX_PATH)
+
+    query = sub.add_parser("query", help="print the nearest hospitals to a point")
+    query.add_argument("index")
+    query.add_argument("lat", type=float)
+    query.add_argument("lon", type=float)
+    query.add_argument("-k", type=int, default=5)
+    query.add_argument("--radius-km", type=float, default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        start = time.perf_counter()
+        records = [r for path in args.inputs for r in load_records(path)]
+        index = build_index(records)
+        index.save(args.output)
+        print(f"Indexed {len(index)} facilities into {args.output} in {time.perf_counter() - start:.2f}s")
+    else:
+        index = FacilityIndex.load(args.index)
+        print(index.nearest(args.lat, args.lon, k=args.k, radius_km=args.radius_km).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
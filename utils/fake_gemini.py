@@ -0,0 +1,145 @@
+"""
+Offline stand-in for google.generativeai.GenerativeModel.
+
+Set GEMINI_FAKE=1 (or pass `model_factory=FakeModel` to GeminiClient) to run the
+app, benchmarks and manual checks without an API key or network access.
+"""
+import json
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+class FakeAPIError(Exception):
+    """Mimics google.api_core errors, which carry the HTTP status in `.code`."""
+
+    def __init__(self, code: int, message: str = ""):
+        super().__init__(f"{code} {message}".strip())
+        self.code = code
+
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt_tokens: int = 0, output_tokens: Optional[int] = None):
+        self.text = text
+        output_tokens = len(text.split()) if output_tokens is None else output_tokens
+        self.usage_metadata = FakeUsageMetadata(prompt_tokens, output_tokens)
+
+
+CANNED_STEPS = (
+    "1. Make sure the area is safe.\n"
+    "2. Rinse the injury with clean, cool water.\n"
+    "3. Cover it with a sterile dressing.\n"
+    "4. Seek medical help if symptoms worsen."
+)
+
+CANNED_DESCRIPTION = "A superficial abrasion with mild redness on the back of the hand; no deep tissue visible."
+
+
+def default_responder(model_name: str, contents) -> str:
+    """Returns a short canned answer that looks like a Gemini reply."""
+    return CANNED_STEPS
+
+
+CANNED_FACILITIES = [
+    {"name": "City General Hospital", "address": "1500 Red River St, Austin, TX 78701",
+     "lat": 30.2746, "lon": -97.7341, "distance_km": 1.2, "phone": "+1 512-324-7000"},
+    {"name": "St. Mary's Medical Center", "address": "919 E 32nd St, Austin, TX 78705",
+     "lat": 30.2905, "lon": -97.7250, "distance_km": 3.1, "phone": "+1 512-544-7111"},
+    {"name": "Riverside Community Hospital", "address": "4900 Mueller Blvd, Austin, TX 78723",
+     "lat": None, "lon": None, "distance_km": 5.4, "phone": None},
+]
+
+
+def _wants_json(generation_config) -> bool:
+    return bool(generation_config) and generation_config.get("response_mime_type") == "application/json"
+
+
+def _canned_json(generation_config, text: str) -> str:
+    """Wraps the canned answer in whichever JSON shape the request's schema asks for."""
+    schema = generation_config.get("response_schema") or {}
+    if schema.get("type") == "array":
+        return json.dumps(CANNED_FACILITIES)
+    return json.dumps({"description": CANNED_DESCRIPTION, "first_aid_steps": text})
+
+
+class FakeModel:
+    """
+    Drop-in replacement for GenerativeModel with configurable latency and failures.
+
+    `errors` is a list of HTTP status codes raised by the first calls (e.g. [429, 503]).
+    Streaming yields the answer word by word, spreading `latency` across the chunks
+    after `first_token_latency`.
+    """
+
+    calls = 0
+    _calls_lock = threading.Lock()
+
+    def __init__(
+        self,
+        model_name: str,
+        system_instruction=None,
+        generation_config=None,
+        latency: float = 0.05,
+        first_token_latency: Optional[float] = None,
+        errors: Optional[List[int]] = None,
+        responder: Callable[[str, object], str] = default_responder,
+        **kwargs,
+    ):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.generation_config = generation_config
+        self.latency = latency
+        self.first_token_latency = latency / 2 if first_token_latency is None else first_token_latency
+        self.responder = responder
+        self._errors = iter(errors or [])
+        self._lock = threading.Lock()
+
+    def _next_error(self) -> Optional[int]:
+        with self._lock:
+            return next(self._errors, None)
+
+    def generate_content(self, contents, *, stream: bool = False, generation_config=None, request_options=None, **kwargs):
+        with FakeModel._calls_lock:
+            FakeModel.calls += 1
+        code = self._next_error()
+        if code is not None:
+            time.sleep(self.first_token_latency)
+            raise FakeAPIError(code, "fake upstream error")
+
+        text = self.responder(self.model_name, contents)
+        config = generation_config or self.generation_config
+        if _wants_json(config) and not text.lstrip().startswith(("{", "[")):
+            # Structured-output requests get a canned answer in the requested schema.
+            text = _canned_json(config, text)
+        prompt_tokens = sum(len(str(c).split()) for c in (contents if isinstance(contents, list) else [contents]))
+        if not stream:
+            time.sleep(self.latency)
+            return FakeResponse(text, prompt_tokens)
+        return self._stream(text, prompt_tokens)
+
+    def _stream(self, text: str, prompt_tokens: int):
+        words = text.split(" ")
+        chunks = [" ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "") for i in range(0, len(words), 4)]
+        rest = max(self.latency - self.first_token_latency, 0) / max(len(chunks), 1)
+        output_tokens = 0
+        for i, chunk in enumerate(chunks):
+            time.sleep(self.first_token_latency if i == 0 else rest)
+            # Like the real API, each chunk reports the usage so far
+            output_tokens += len(chunk.split())
+            yield FakeResponse(chunk, prompt_tokens, output_tokens)
+
+
+def fake_model_factory(**defaults):
+    """Returns a FakeModel factory with fixed settings (latency, errors, responder, ...)."""
+
+    def factory(model_name, **kwargs):
+        return FakeModel(model_name, **{**defaults, **kwargs})
+
+    return factory
@@ -0,0 +1,394 @@
+"""
+Offline reverse geocoder: nearest named place from a local gazetteer.
+
+Build it once from a GeoNames dump (e.g. cities500.txt, optionally with
+admin1CodesASCII.txt for state names) or an OSM places extract (Overpass JSON,
+GeoJSON or CSV):
+
+    python -m utils.gazetteer build cities500.txt --admin1 admin1CodesASCII.txt -o data/gazetteer
+    python -m utils.gazetteer query data/gazetteer 30.2672 -97.7431
+
+The output directory holds plain .npy arrays that are memory-mapped, not read:
+
+* `lats.npy`, `lons.npy` (float32) - places sorted by grid cell;
+* `cells.npy`, `offsets.npy` (uint32) - sorted ids of the occupied grid cells and
+  where each cell's places start, so a cell is found with one binary search;
+* `place_strings.npy` (int32, n x 3) - name, region and country of each place as
+  indexes into a deduplicated string table (`strings.bin` + `string_offsets.npy`).
+
+That is about 20 bytes per place plus the unique strings (a GeoNames cities500
+extract stays under 10 MB), and a lookup only pages in the cells around the query.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils import settings
+from utils.geo import EARTH_RADIUS_KM, haversine_km
+
+FORMAT_VERSION = 1
+DEFAULT_CELL_DEG = 0.1  # ~11 km grid cells
+
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+# OSM place=* values worth naming a position after
+OSM_PLACE_TYPES = {"city", "town", "village", "hamlet", "suburb", "quarter", "neighbourhood", "borough", "locality"}
+
+
+class Gazetteer:
+    """
+    Nearest-place lookups over memory-mapped arrays.
+    Places are bucketed in a regular lat/lon grid; a query scans a window of cells
+    around its own, large enough that no place outside it can be closer.
+    """
+
+    def __init__(self, lats, lons, cells, offsets, place_strings, strings_blob, string_offsets,
+                 cell_deg: float = DEFAULT_CELL_DEG):
+        self.lats = lats
+        self.lons = lons
+        self.cells = cells
+        self.offsets = offsets
+        self.place_strings = place_strings
+        self._blob = strings_blob
+        self._string_offsets = string_offsets
+        self.cell_deg = cell_deg
+        self.n_rows = int(round(180 / cell_deg))
+        self.n_cols = int(round(360 / cell_deg))
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        row = min(max(int((lat + 90) // self.cell_deg), 0), self.n_rows - 1)
+        col = int((lon + 180) // self.cell_deg) % self.n_cols
+        return row, col
+
+    def _window(self, row: int, col: int, r_row: int, r_col: int) -> np.ndarray:
+        """
+        Indexes of the places in the (2 r_row + 1) x (2 r_col + 1) cells around (row, col).
+        Cells of one grid row have consecutive ids, so each row of the window is a single
+        slice of the sorted places, found with two binary searches.
+        """
+        rows = np.arange(max(row - r_row, 0), min(row + r_row, self.n_rows - 1) + 1) * self.n_cols
+        first, last = col - r_col, col + r_col
+        if last - first + 1 >= self.n_cols:
+            spans = [(0, self.n_cols - 1)]
+        elif first < 0:  # wraps around the antimeridian
+            spans = [(first + self.n_cols, self.n_cols - 1), (0, last)]
+        elif last >= self.n_cols:
+            spans = [(first, self.n_cols - 1), (0, last - self.n_cols)]
+        else:
+            spans = [(first, last)]
+        # Same dtype as the mapped array, or searchsorted would convert all of it on every call
+        lo = np.concatenate([rows + a for a, _ in spans]).astype(self.cells.dtype)
+        hi = np.concatenate([rows + b for _, b in spans]).astype(self.cells.dtype)
+        starts = self.offsets[np.searchsorted(self.cells, lo, "left")].tolist()
+        ends = self.offsets[np.searchsorted(self.cells, hi, "right")].tolist()
+        ranges = [np.arange(s, e) for s, e in zip(starts, ends) if e > s]
+        return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.intp)
+
+    def _column_km(self, lat: float, r_row: int) -> float:
+        """Narrowest cell width in km within r_row rows of the query (cells shrink towards the poles)."""
+        edge_lat = min(abs(lat) + (r_row + 1) * self.cell_deg, 90.0)
+        return self.cell_deg * KM_PER_DEG * math.cos(math.radians(edge_lat))
+
+    def _column_radius(self, lat: float, r_row: int, km: float) -> int:
+        """Columns each side of the query needed to cover `km` within r_row rows; the whole row near a pole."""
+        column_km = self._column_km(lat, r_row)
+        if column_km <= 0 or km / column_km >= self.n_cols // 2:
+            return self.n_cols // 2
+        return int(km / column_km) + 2
+
+    def _covered_km(self, lat: float, r_row: int, r_col: int) -> float:
+        """Lower bound on the distance from the query to any place outside its window."""
+        rows_km = r_row * self.cell_deg * KM_PER_DEG
+        if 2 * r_col + 1 >= self.n_cols:
+            return rows_km
+        return min(rows_km, r_col * self._column_km(lat, r_row))
+
+    def query(self, lat: float, lon: float, max_km: Optional[float] = None) -> Tuple[int, float]:
+        """
+        Returns (index, distance_km) of the nearest place, or (-1, inf) if none lies within `max_km`.
+        Searches the 3x3 cells around the query first and widens to `max_km` only if a
+        closer place could still lie outside them. The window is wider than tall away from
+        the equator, where a degree of longitude is shorter than one of latitude.
+        """
+        max_km = settings.GAZETTEER_MAX_KM if max_km is None else max_km
+        if not len(self):
+            return -1, math.inf
+        row, col = self._cell(lat, lon)
+        max_row = min(int(max_km / (self.cell_deg * KM_PER_DEG)) + 2, self.n_rows)
+        widest = (max_row, self._column_radius(lat, max_row, max_km))
+        for r_row, r_col in ((1, 1), widest) if widest != (1, 1) else (widest,):
+            idx = self._window(row, col, r_row, r_col)
+            if idx.size:
+                dist = haversine_km(lat, lon, self.lats[idx], self.lons[idx])
+                i = int(np.argmin(dist))
+                best, best_km = int(idx[i]), float(dist[i])
+            else:
+                best, best_km = -1, math.inf
+            if best_km <= self._covered_km(lat, r_row, r_col):
+                break
+        if best_km > max_km:
+            return -1, math.inf
+        return best, best_km
+
+    def string(self, i: int) -> str:
+        start, end = self._string_offsets[i], self._string_offsets[i + 1]
+        return bytes(self._blob[start:end]).decode("utf-8")
+
+    def place(self, i: int) -> dict:
+        name, region, country = (self.string(int(s)) for s in self.place_strings[i])
+        return {"name": name, "region": region, "country": country,
+                "lat": float(self.lats[i]), "lon": float(self.lons[i])}
+
+    def nearest(self, lat: float, lon: float, max_km: Optional[float] = None) -> Optional[dict]:
+        """The nearest place as a dict (name, region, country, lat, lon, distance_km), or None."""
+        i, dist = self.query(lat, lon, max_km=max_km)
+        if i < 0:
+            return None
+        return {**self.place(i), "distance_km": dist}
+
+    def describe(self, lat: float, lon: float, max_km: Optional[float] = None) -> Optional[str]:
+        """Human-readable location, e.g. "Austin, Texas, US" or "3.2 km from Buda, Texas, US"."""
+        place = self.nearest(lat, lon, max_km=max_km)
+        if place is None:
+            return None
+        label = ", ".join(p for p in (place["name"], place["region"], place["country"]) if p)
+        if place["distance_km"] < 1.0:
+            return label
+        return f"{place['distance_km']:.1f} km from {label}"
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        for name in ("lats", "lons", "cells", "offsets", "place_strings"):
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        np.save(os.path.join(path, "string_offsets.npy"), np.ascontiguousarray(self._string_offsets))
+        with open(os.path.join(path, "strings.bin"), "wb") as f:
+            f.write(bytes(self._blob))
+        # Written last: a directory without meta.json is an unfinished build and is not loaded
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": FORMAT_VERSION, "cell_deg": self.cell_deg, "places": len(self)}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "Gazetteer":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Gazetteer format {meta.get('version')} in {path}, expected {FORMAT_VERSION}; rebuild it")
+
+        def array(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        blob_path = os.path.join(path, "strings.bin")
+        blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else np.empty(0, np.uint8)
+        return cls(array("lats"), array("lons"), array("cells"), array("offsets"), array("place_strings"),
+                   blob, array("string_offsets"), cell_deg=meta["cell_deg"])
+
+    def nbytes(self) -> int:
+        """Size of the arrays (on disk, and at most in memory once every page was touched)."""
+        arrays = (self.lats, self.lons, self.cells, self.offsets, self.place_strings, self._blob, self._string_offsets)
+        return sum(a.nbytes for a in arrays)
+
+
+# --- Loaders for place extracts ---
+
+def _records_from_geonames(path: str, admin1: Dict[str, str]) -> List[dict]:
+    """GeoNames dump columns: id, name, asciiname, alternatenames, lat, lon, class, code, country, cc2, admin1, ..."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 11 or fields[6] not in ("P", "A"):
+                continue
+            country, admin_code = fields[8], fields[10]
+            records.append({
+                "name": fields[1],
+                "region": admin1.get(f"{country}.{admin_code}", ""),
+                "country": country,
+                "lat": float(fields[4]),
+                "lon": float(fields[5]),
+            })
+    return records
+
+
+def load_admin1_names(path: str) -> Dict[str, str]:
+    """Reads GeoNames admin1CodesASCII.txt into {"US.TX": "Texas", ...}."""
+    names = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 2:
+                names[fields[0]] = fields[1]
+    return names
+
+
+def _record_from_tags(tags: dict, lat: float, lon: float) -> Optional[dict]:
+    if not tags.get("name") or tags.get("place", "city") not in OSM_PLACE_TYPES:
+        return None
+    return {
+        "name": tags["name"],
+        "region": tags.get("is_in:state") or tags.get("addr:state") or tags.get("region") or "",
+        "country": tags.get("is_in:country_code") or tags.get("addr:country") or tags.get("country") or "",
+        "lat": float(lat),
+        "lon": float(lon),
+    }
+
+
+def _records_from_geojson(data: dict) -> List[dict]:
+    records = []
+    for feature in data.get("features", []):
+        geometry = feature.get("geometry") or {}
+        coords = geometry.get("coordinates")
+        if geometry.get("type") != "Point" or not coords:
+            continue
+        record = _record_from_tags(feature.get("properties") or {}, coords[1], coords[0])
+        if record:
+            records.append(record)
+    return records
+
+
+def _records_from_overpass(data: dict) -> List[dict]:
+    records = []
+    for element in data.get("elements", []):
+        point = element if "lat" in element else element.get("center")
+        if not point:
+            continue
+        record = _record_from_tags(element.get("tags") or {}, point["lat"], point["lon"])
+        if record:
+            records.append(record)
+    return records
+
+
+def _records_from_csv(path: str) -> List[dict]:
+    records = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+            lat = row.get("lat") or row.get("latitude")
+            lon = row.get("lon") or row.get("lng") or row.get("longitude")
+            if not row.get("name") or not lat or not lon:
+                continue
+            records.append({
+                "name": row["name"],
+                "region": row.get("region") or row.get("state") or row.get("admin1", ""),
+                "country": row.get("country") or row.get("country_code", ""),
+                "lat": float(lat),
+                "lon": float(lon),
+            })
+    return records
+
+
+def load_records(path: str, admin1: Optional[Dict[str, str]] = None) -> List[dict]:
+    """Reads places from a GeoNames .txt dump, a .csv, GeoJSON or Overpass JSON file."""
+    lower = path.lower()
+    if lower.endswith(".txt") or lower.endswith(".tsv"):
+        return _records_from_geonames(path, admin1 or {})
+    if lower.endswith(".csv"):
+        return _records_from_csv(path)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if "features" in data:
+        return _records_from_geojson(data)
+    if "elements" in data:
+        return _records_from_overpass(data)
+    raise ValueError(f"Unrecognised places extract format: {path}")
+
+
+def build_gazetteer(records: List[dict], cell_deg: float = DEFAULT_CELL_DEG) -> Gazetteer:
+    lats = np.array([r["lat"] for r in records], dtype=np.float64)
+    lons = np.array([r["lon"] for r in records], dtype=np.float64)
+
+    # Deduplicated string table: regions and countries repeat across many places
+    ids: Dict[str, int] = {}
+    place_strings = np.array(
+        [[ids.setdefault(r[key], len(ids)) for key in ("name", "region", "country")] for r in records],
+        dtype=np.int32,
+    ).reshape(len(records), 3)
+    encoded = [s.encode("utf-8") for s in ids]
+    string_offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    np.cumsum([len(b) for b in encoded], out=string_offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    # Sort places by grid cell so each cell is one contiguous slice
+    n_rows, n_cols = int(round(180 / cell_deg)), int(round(360 / cell_deg))
+    rows = np.clip(((lats + 90) // cell_deg).astype(np.int64), 0, n_rows - 1)
+    cols = ((lons + 180) // cell_deg).astype(np.int64) % n_cols
+    cell_ids = rows * n_cols + cols
+    order = np.argsort(cell_ids, kind="stable")
+    cell_ids = cell_ids[order]
+    cells, starts = np.unique(cell_ids, return_index=True)
+    offsets = np.append(starts, len(cell_ids)).astype(np.uint32)
+
+    return Gazetteer(
+        lats[order].astype(np.float32), lons[order].astype(np.float32),
+        cells.astype(np.uint32), offsets, place_strings[order],
+        blob, string_offsets, cell_deg=cell_deg,
+    )
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """Returns the process-wide gazetteer mapped from settings.GAZETTEER_PATH, or None if it was never built."""
+    global _gazetteer
+    if _gazetteer is None and os.path.exists(os.path.join(settings.GAZETTEER_PATH, "meta.json")):
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.load(settings.GAZETTEER_PATH)
+    return _gazetteer
+
+
+def describe_location(lat: float, lon: float) -> Optional[str]:
+    """
+    Names the place nearest to the coordinates from the offline gazetteer.
+    Returns None when there is no gazetteer or no place within GAZETTEER_MAX_KM,
+    so callers can fall back to Nominatim.
+    """
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return None
+    return gazetteer.describe(lat, lon)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the offline reverse-geocoding gazetteer.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="build from GeoNames dumps or CSV, GeoJSON or Overpass JSON place extracts")
+    build.add_argument("inputs", nargs="+")
+    build.add_argument("-o", "--output", default=settings.GAZETTEER_PATH)
+    build.add_argument("--admin1", help="GeoNames admin1CodesASCII.txt, to name states/regions")
+    build.add_argument("--cell-deg", type=float, default=DEFAULT_CELL_DEG, help="grid cell size in degrees")
+
+    query = sub.add_parser("query", help="print the place nearest to a point")
+    query.add_argument("gazetteer")
+    query.add_argument("lat", type=float)
+    query.add_argument("lon", type=float)
+    query.add_argument("--max-km", type=float, default=None)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        start = time.perf_counter()
+        admin1 = load_admin1_names(args.admin1) if args.admin1 else {}
+        records = [r for path in args.inputs for r in load_records(path, admin1)]
+        gazetteer = build_gazetteer(records, cell_deg=args.cell_deg)
+        gazetteer.save(args.output)
+        print(f"Indexed {len(gazetteer)} places into {args.output} "
+              f"({gazetteer.nbytes() / 1e6:.1f} MB) in {time.perf_counter() - start:.2f}s")
+    else:
+        gazetteer = Gazetteer.load(args.gazetteer)
+        print(gazetteer.nearest(args.lat, args.lon, max_km=args.max_km))
+
+
+if __name__ == "__main__":
+    main()
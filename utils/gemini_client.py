@@ -0,0 +1,259 @@
+"""
+Process-wide Gemini client.
+
+`get_gemini_client()` returns one client shared by every Streamlit session in the
+process (the same lifetime as `st.cache_resource`). It configures the SDK once,
+keeps one GenerativeModel per (model, system prompt, generation config) so the
+underlying connection is reused, applies per-call timeouts, retries 429/5xx
+answers with jittered exponential backoff and caps concurrent upstream calls.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+from utils import metrics, settings
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """Extracts the HTTP status from google.api_core (or fake) errors."""
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    return _status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def _payload_bytes(contents) -> int:
+    """Approximate request size: UTF-8 text plus inline image data."""
+    total = 0
+    for part in contents if isinstance(contents, (list, tuple)) else [contents]:
+        if isinstance(part, str):
+            total += len(part.encode("utf-8"))
+        elif isinstance(part, dict):
+            total += len(part.get("data") or b"")
+        elif isinstance(part, (bytes, bytearray)):
+            total += len(part)
+    return total
+
+
+def _record_usage(model_name: str, response) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("output", "candidates_token_count")):
+        count = getattr(usage, field, None)
+        if count:
+            metrics.inc("firstaid_gemini_tokens_total", count, model=model_name, kind=kind)
+
+
+class GeminiClient:
+    """
+    Shared, thread-safe wrapper around google.generativeai.
+
+    `model_factory` builds model objects; it defaults to genai.GenerativeModel and
+    can be swapped for `utils.fake_gemini.FakeModel` to run offline.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        timeout: float = settings.GEMINI_TIMEOUT,
+        max_retries: int = settings.GEMINI_MAX_RETRIES,
+        max_concurrency: int = settings.GEMINI_MAX_CONCURRENCY,
+        retry_base_delay: float = settings.GEMINI_RETRY_BASE_DELAY,
+        model_factory: Optional[Callable] = None,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.calls = 0    # generate_content attempts, including retries (what counts against the quota)
+        self.retries = 0
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._models = {}
+        self._lock = threading.Lock()
+
+        if model_factory is None:
+            import google.generativeai as genai
+
+            if settings.GEMINI_API_ENDPOINT:
+                genai.configure(
+                    api_key=api_key or settings.get_gemini_api_key(),
+                    transport="rest",
+                    client_options={"api_endpoint": settings.GEMINI_API_ENDPOINT},
+                )
+            else:
+                genai.configure(api_key=api_key or settings.get_gemini_api_key())
+            model_factory = genai.GenerativeModel
+        self._model_factory = model_factory
+
+    def model(self, model_name: str, system_instruction: Optional[str] = None, generation_config: Optional[dict] = None):
+        """Returns the cached model object for this model name, system prompt and config."""
+        key = (model_name, system_instruction, json.dumps(generation_config, sort_keys=True, default=str))
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = self._model_factory(
+                        model_name,
+                        system_instruction=system_instruction,
+                        generation_config=generation_config,
+                    )
+                    self._models[key] = model
+        return model
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": spreads retries from many sessions instead of synchronising them.
+        return random.uniform(0, self.retry_base_delay * (2 ** attempt))
+
+    def generate(
+        self,
+        model_name: str,
+        contents,
+        system_instruction: Optional[str] = None,
+        generation_config: Optional[dict] = None,
+        timeout: Optional[float] = None,
+        stream: bool = False,
+        deadline: Optional[float] = None,
+    ):
+        """
+        Calls generate_content with timeout, retries and the concurrency cap.
+        With `stream=True` the concurrency slot is held until the stream is consumed, closed or dropped.
+        `deadline` (a time.monotonic() value) caps the timeout and skips retries that could not finish in time.
+        """
+        model = self.model(model_name, system_instruction, generation_config)
+        timeout = timeout or self.timeout
+        if metrics.enabled:
+            metrics.inc("firstaid_gemini_request_bytes_total", _payload_bytes(contents), model=model_name)
+
+        attempt = 0
+        while True:
+            # retry=None turns off the SDK's own retry policy, so only the retries below apply
+            request_options = {"timeout": timeout, "retry": None}
+            if deadline is not None:
+                request_options["timeout"] = max(min(timeout, deadline - time.monotonic()), 0.01)
+            if not self._semaphore.acquire(timeout=request_options["timeout"] if deadline is not None else None):
+                raise TimeoutError("No free Gemini slot before the deadline")
+            with self._lock:
+                self.calls += 1
+            start = time.perf_counter()
+            try:
+                response = model.generate_content(contents, stream=stream, request_options=request_options)
+            except Exception as e:
+                self._semaphore.release()
+                metrics.inc("firstaid_gemini_requests_total", model=model_name, status=_status_code(e) or type(e).__name__)
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                metrics.inc("firstaid_gemini_retries_total", model=model_name)
+                logger.warning(f"Gemini call failed ({e}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            if not stream:
+                self._semaphore.release()
+                if metrics.enabled:
+                    metrics.observe("firstaid_gemini_request_duration_seconds", time.perf_counter() - start, model=model_name)
+                    metrics.inc("firstaid_gemini_requests_total", model=model_name, status="ok")
+                    _record_usage(model_name, response)
+                return response
+            return _SlotStream(self._semaphore, response, model_name, start)
+
+
+class _SlotStream:
+    """
+    A streamed response holding one of the client's concurrency slots.
+    The slot is released exactly once: when the stream is exhausted, fails or is
+    closed, or when it is garbage collected, even if it was never iterated.
+    """
+
+    def __init__(self, semaphore: threading.BoundedSemaphore, chunks, model_name: str, start: float):
+        self._semaphore = semaphore
+        self._chunks = iter(chunks)
+        self._model_name = model_name
+        self._start = start
+        self._last = None
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._released:
+            raise StopIteration
+        try:
+            self._last = next(self._chunks)
+        except StopIteration:
+            self._release("ok")
+            raise
+        except Exception as e:
+            self._release(_status_code(e) or type(e).__name__)
+            raise
+        return self._last
+
+    def close(self) -> None:
+        """Stops reading the response and frees the slot."""
+        close = getattr(self._chunks, "close", None)
+        try:
+            if close is not None:
+                close()
+        finally:
+            self._release("ok")
+
+    def __del__(self):
+        self._release("ok")
+
+    def _release(self, status) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._semaphore.release()
+        if metrics.enabled:
+            metrics.observe("firstaid_gemini_request_duration_seconds", time.perf_counter() - self._start, model=self._model_name)
+            metrics.inc("firstaid_gemini_requests_total", model=self._model_name, status=status)
+            # Streamed chunks carry the usage so far; the last one has the totals
+            _record_usage(self._model_name, self._last)
+
+
+_client: Optional[GeminiClient] = None
+_client_lock = threading.Lock()
+
+
+def get_gemini_client() -> GeminiClient:
+    """
+    Returns the process-wide client, creating it on first use.
+    With GEMINI_FAKE=1 it is backed by the offline FakeModel.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if settings.GEMINI_FAKE:
+                    from utils.fake_gemini import FakeModel
+
+                    _client = GeminiClient(model_factory=FakeModel)
+                else:
+                    _client = GeminiClient()
+    return _client
+
+
+def set_gemini_client(client: Optional[GeminiClient]) -> None:
+    """Replaces the process-wide client (e.g. with a fake-backed one); None resets it."""
+    global _client
+    with _client_lock:
+        _client = client
@@ -0,0 +1,90 @@
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat: float, lon: float, precision: int = 6) -> str:
+    """
+    Encodes coordinates as a geohash string.
+    Nearby points share a prefix; precision 6 is a cell of about 1.2 km x 0.6 km, precision 7 about 150 m.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat, lon, lats, lons):
+    """
+    Great-circle distance in km from one point to arrays of points (vectorized with NumPy).
+    """
+    import numpy as np
+
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def to_unit_vectors(lats, lons):
+    """
+    Maps coordinates onto the unit sphere as (n, 3) xyz vectors.
+    Euclidean (chord) distance between them is monotonic in great-circle distance,
+    so an ordinary KD-tree over these vectors answers haversine nearest-neighbour queries.
+    """
+    import numpy as np
+
+    lat, lon = np.radians(lats), np.radians(lons)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def km_to_chord(distance_km: float) -> float:
+    """Converts a great-circle distance to the matching chord length on the unit sphere."""
+    return 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+COMPASS_POINTS = ("N", "NE", "E", "SE", "S", "SW", "W", "NW")
+
+
+def bearing_deg(lat, lon, lats, lons):
+    """
+    Initial great-circle bearing in degrees (0 = north, 90 = east) from one point to arrays of points.
+    """
+    import numpy as np
+
+    lat1, lat2 = np.radians(lat), np.radians(lats)
+    dlon = np.radians(np.asarray(lons) - lon)
+    x = np.sin(dlon) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return np.degrees(np.arctan2(x, y)) % 360
+
+
+def compass_point(bearings):
+    """Eight-point compass labels ("N", "NE", ...) for an array of bearings; NaN maps to ""."""
+    import numpy as np
+
+    bearings = np.asarray(bearings, dtype=float)
+    labels = np.array(COMPASS_POINTS + ("",))
+    sector = np.where(np.isnan(bearings), len(COMPASS_POINTS), np.round(np.nan_to_num(bearings) / 45) % 8)
+    return labels[sector.astype(int)]
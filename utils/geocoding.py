@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+
+from utils import metrics, settings
+from utils.cache import SQLiteCache
+from utils.rate_limit import TokenBucket
+from utils.singleflight import make_flight_group
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[requests.Session] = None
+_cache: Optional[SQLiteCache] = None
+_init_lock = threading.Lock()
+
+# One bucket for the whole process, shared by forward and reverse lookups.
+nominatim_bucket = TokenBucket(rate=settings.NOMINATIM_RATE_PER_SEC, capacity=1)
+# Concurrent lookups of the same normalized address share one request.
+geocode_flights = make_flight_group()
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide pooled HTTP session used for Nominatim.
+    Keeps TCP/TLS connections alive across lookups instead of reconnecting each time.
+    """
+    global _session
+    if _session is None:
+        with _init_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(settings.GEOCODE_MAX_WORKERS, 4))
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["User-Agent"] = settings.NOMINATIM_USER_AGENT
+                _session = session
+    return _session
+
+
+def get_cache() -> SQLiteCache:
+    """Returns the persistent geocoding cache (created on first use)."""
+    global _cache
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                _cache = SQLiteCache(
+                    os.path.join(settings.CACHE_DIR, "geocode.sqlite3"),
+                    ttl=settings.GEOCODE_CACHE_TTL,
+                    max_entries=settings.GEOCODE_CACHE_MAX_ENTRIES,
+                )
+    return _cache
+
+
+def normalize_address(address: str) -> str:
+    """Lower-cases and collapses whitespace/punctuation so equivalent addresses share a cache key."""
+    address = re.sub(r"[\s,]+", " ", address.lower())
+    return address.strip(" .;")
+
+
+def nominatim_get(path: str, params: dict) -> Optional[requests.Response]:
+    """Rate-limited GET against the configured Nominatim server."""
+    nominatim_bucket.acquire()
+    with metrics.span(f"nominatim_{path}"):
+        response = get_session().get(
+            f"{settings.NOMINATIM_URL}/{path}", params=params, timeout=settings.NOMINATIM_TIMEOUT
+        )
+    metrics.inc("firstaid_nominatim_requests_total", endpoint=path, status=response.status_code)
+    if response.status_code != 200:
+        logger.debug("Nominatim %s returned HTTP %s", path, response.status_code)
+        return None
+    return response
+
+
+def geocode(address: str, use_cache: bool = True) -> Optional[Tuple[float, float]]:
+    """
+    Geocodes an address to (lat, lon) through the cache, rate limiter and pooled session.
+    Concurrent lookups of the same address wait for a single request.
+    "Not found" answers are cached too; network errors are not.
+    """
+    key = normalize_address(address)
+    if not key:
+        return None
+
+    if use_cache:
+        cached = get_cache().get(key)
+        metrics.inc("firstaid_cache_requests_total", cache="geocode", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return (cached[0], cached[1]) if cached else None
+
+    try:
+        return geocode_flights.do(key, _lookup, address, key, use_cache)
+    except TimeoutError as e:
+        logger.debug("Geocoding %s: %s", address, e)
+        return None
+
+
+def _lookup(address: str, key: str, use_cache: bool) -> Optional[Tuple[float, float]]:
+    if use_cache:
+        # A lookup that finished while this one was queued may have filled the cache
+        cached = get_cache().get(key)
+        if cached is not None:
+            return (cached[0], cached[1]) if cached else None
+
+    try:
+        response = nominatim_get("search", {"q": address, "format": "json", "limit": 1})
+        if response is None:
+            return None
+        data = response.json()
+        coords = (float(data[0]["lat"]), float(data[0]["lon"])) if data else None
+    except Exception as e:
+        logger.debug("Geocoding error for %s: %s", address, e)
+        return None
+
+    if use_cache:
+        get_cache().set(key, list(coords) if coords else [])
+    return coords
+
+
+def geocode_many(
+    addresses: Iterable[str], max_workers: Optional[int] = None, use_cache: bool = True
+) -> List[Optional[Tuple[float, float]]]:
+    """
+    Geocodes several addresses concurrently through a bounded worker pool.
+    Results are returned in input order; duplicate addresses are looked up once.
+    Uncached lookups still share the NOMINATIM_RATE_PER_SEC limit, so the pool only
+    saves time on cache hits or against a server without a rate limit.
+    """
+    addresses = list(addresses)
+    if not addresses:
+        return []
+
+    unique = list(dict.fromkeys(addresses))
+    workers = min(max_workers or settings.GEOCODE_MAX_WORKERS, len(unique))
+    if workers <= 1:
+        resolved = [geocode(a, use_cache=use_cache) for a in unique]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="geocode") as pool:
+            resolved = list(pool.map(lambda a: geocode(a, use_cache=use_cache), unique))
+
+    lookup = dict(zip(unique, resolved))
+    return [lookup[a] for a in addresses]
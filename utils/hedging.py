@@ -0,0 +1,292 @@
+"""
+Latency budgets and hedged Gemini requests.
+
+An emergency answer that arrives after 20 s is as bad as none. Every request here
+gets a deadline. The primary model is asked first; if it has not produced a first
+token after the hedge delay, the same request also goes to a lighter model. The
+first complete answer wins (when streaming, the first to start answering) and the
+other stream is closed. Past the deadline `LatencyBudgetExceeded` is raised and
+callers show the stored protocol card instead.
+
+The hedge delay adapts: `HedgePolicy` keeps the primary's recent times to first
+token per operation and hedges after their HEDGE_PERCENTILE, so only the slow tail
+costs a second call. Primaries abandoned before answering are left out of the
+percentile, so a stalling primary makes hedges more frequent, never later.
+"""
+import logging
+import math
+import queue
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+from utils import metrics, settings
+from utils.gemini_client import GeminiClient, _status_code, get_gemini_client
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+# A primary that answers fewer than this share of recent requests is treated as down.
+PRIMARY_DOWN_SHARE = 0.5
+
+
+class LatencyBudgetExceeded(TimeoutError):
+    """No model finished answering within the latency budget."""
+
+
+@dataclass
+class RaceInfo:
+    """Filled in by hedged_generate / hedged_stream: which model's answer was used."""
+    model: Optional[str] = None
+    hedged: bool = False
+
+
+class HedgePolicy:
+    """Per-operation hedge delays learned from the primary model's recent times to first token."""
+
+    def __init__(
+        self,
+        percentile: float = settings.HEDGE_PERCENTILE,
+        window: int = settings.HEDGE_WINDOW,
+        min_samples: int = settings.HEDGE_MIN_SAMPLES,
+        initial_delay: float = settings.HEDGE_INITIAL_DELAY,
+        min_delay: float = settings.HEDGE_MIN_DELAY,
+    ):
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self._samples: Dict[str, deque] = {}
+        self._outcomes: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    def delay(self, op: str, budget: float) -> float:
+        """Seconds to wait for the primary's first token before hedging."""
+        with self._lock:
+            samples = list(self._samples.get(op, ()))
+        answered = sorted(s for s in samples if s != math.inf)
+        if len(samples) < self.min_samples:
+            delay = self.initial_delay
+        elif len(answered) < len(samples) * PRIMARY_DOWN_SHARE:
+            # The primary mostly does not answer any more, and the few answers that do
+            # arrive are stragglers: hedge at once
+            delay = self.min_delay
+        else:
+            # Percentile of the answers that arrived. Counting the abandoned ones (as inf or
+            # as their wait) would push the delay up exactly when the primary degrades.
+            delay = answered[min(int(len(answered) * self.percentile / 100), len(answered) - 1)]
+        # Leave the hedge at least half of the budget to answer in
+        return min(max(delay, self.min_delay), budget / 2)
+
+    def record(self, op: str, first_token: Optional[float], outcome: str) -> None:
+        """
+        Records one request. `first_token` is the primary's time to first token: inf when
+        it was cancelled or timed out before answering, None when it failed.
+        """
+        with self._lock:
+            if first_token is not None:
+                self._samples.setdefault(op, deque(maxlen=self.window)).append(first_token)
+            self._outcomes.setdefault(op, Counter())[outcome] += 1
+        metrics.inc("firstaid_hedge_outcomes_total", op=op, outcome=outcome)
+        if first_token is not None and first_token != math.inf:
+            metrics.observe("firstaid_gemini_first_token_seconds", first_token, op=op)
+
+    def stats(self, budget: float = settings.LATENCY_BUDGET_SECONDS) -> dict:
+        """Current delay, sample count and outcome counts per operation."""
+        with self._lock:
+            ops = {op: (len(samples), dict(self._outcomes.get(op, {}))) for op, samples in self._samples.items()}
+            for op, outcomes in self._outcomes.items():
+                ops.setdefault(op, (0, dict(outcomes)))
+        return {
+            op: {"hedge_delay": round(self.delay(op, budget), 3), "samples": count, "outcomes": outcomes}
+            for op, (count, outcomes) in ops.items()
+        }
+
+
+_policy: Optional[HedgePolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_hedge_policy() -> HedgePolicy:
+    global _policy
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                _policy = HedgePolicy()
+    return _policy
+
+
+class _Attempt:
+    """One streamed model call on its own daemon thread, posting (attempt, chunk) events to a queue."""
+
+    def __init__(self, role: str, client: GeminiClient, model_name: str, contents, kwargs: dict,
+                 deadline: Optional[float], events: queue.Queue):
+        self.role = role
+        self.model_name = model_name
+        self.parts = []
+        self.error: Optional[Exception] = None
+        self._cancelled = threading.Event()
+        self._args = (client, contents, kwargs, deadline, events)
+        # Daemon: a call stuck in the SDK is abandoned, and bounded by its deadline timeout
+        self._thread = threading.Thread(target=self._run, name=f"gemini-{role}", daemon=True)
+        self._thread.start()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def _run(self) -> None:
+        client, contents, kwargs, deadline, events = self._args
+        chunks = None
+        try:
+            chunks = client.generate(self.model_name, contents, stream=True, deadline=deadline, **kwargs)
+            for chunk in chunks:
+                if self._cancelled.is_set():
+                    return
+                if chunk.text:
+                    events.put((self, chunk.text))
+            events.put((self, _DONE))
+        except Exception as e:
+            events.put((self, e))
+        finally:
+            if chunks is not None:
+                # Closing the stream stops reading the response and frees the client's slot
+                chunks.close()
+
+
+def _missed_deadline(error: Exception, deadline: Optional[float]) -> bool:
+    """A request timeout caused by the deadline (the SDK's DeadlineExceeded is a 504)."""
+    if deadline is None:
+        return False
+    return isinstance(error, TimeoutError) or _status_code(error) == 504 or time.monotonic() >= deadline
+
+
+def _cancel_others(attempts, winner: _Attempt) -> None:
+    for attempt in attempts:
+        if attempt is not winner:
+            attempt.cancel()
+
+
+def _race(op: str, contents, primary_model: str, hedge_model: Optional[str], budget: float,
+          policy: HedgePolicy, complete: bool, info: Optional[RaceInfo], kwargs: dict) -> Iterator[str]:
+    info = info if info is not None else RaceInfo()
+    deadline = time.monotonic() + budget if budget > 0 else None
+    # Resolve the client and the primary's model object before the race: on a cold worker
+    # the SDK import and setup would otherwise count as the primary's time to first token,
+    # so the first request would always hedge and skew the learned delay
+    client = get_gemini_client()
+    client.model(primary_model, kwargs.get("system_instruction"), kwargs.get("generation_config"))
+    start = time.monotonic()
+    hedge_at = start + policy.delay(op, budget) if hedge_model and deadline is not None else None
+    events = queue.Queue()
+    primary = _Attempt("primary", client, primary_model, contents, kwargs, deadline, events)
+    attempts = [primary]
+    winner = None
+    first_token = None
+    outcome = "timeout"
+
+    def start_hedge():
+        nonlocal hedge_at
+        hedge_at = None
+        info.hedged = True
+        attempts.append(_Attempt("hedge", client, hedge_model, contents, kwargs, deadline, events))
+
+    try:
+        while True:
+            timeouts = [t for t in (deadline, hedge_at) if t is not None]
+            try:
+                attempt, event = events.get(timeout=max(min(timeouts) - time.monotonic(), 0) if timeouts else None)
+            except queue.Empty:
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    start_hedge()
+                    continue
+                raise LatencyBudgetExceeded(f"No answer from {primary_model} within {budget:g}s")
+
+            if winner is not None and attempt is not winner:
+                continue  # a late event from a cancelled attempt
+
+            if isinstance(event, Exception):
+                attempt.error = event
+                if winner is attempt or all(a.error is not None for a in attempts) and hedge_at is None:
+                    if _missed_deadline(event, deadline):
+                        raise LatencyBudgetExceeded(f"No answer from {primary_model} within {budget:g}s") from event
+                    outcome = "error"
+                    # The primary's error is the more telling one (e.g. a wrong model name)
+                    raise primary.error or event
+                if hedge_at is not None:
+                    start_hedge()  # the primary failed outright: hedge now rather than later
+                continue
+
+            if attempt is primary and first_token is None:
+                first_token = time.monotonic() - start
+                hedge_at = None  # the primary is answering: no hedge needed
+
+            if event is _DONE:
+                if winner is None:
+                    winner = attempt
+                    info.model = attempt.model_name
+                    _cancel_others(attempts, winner)
+                    if complete:
+                        yield "".join(attempt.parts)
+                outcome = attempt.role
+                return
+
+            attempt.parts.append(event)
+            if not complete:
+                if winner is None:
+                    # Streaming: keep the first attempt to start answering
+                    winner = attempt
+                    info.model = attempt.model_name
+                    _cancel_others(attempts, winner)
+                yield event
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+        if first_token is None and primary.error is None:
+            first_token = math.inf
+        if len(attempts) > 1 and outcome == "primary":
+            outcome = "primary_hedged"
+        policy.record(op, first_token, outcome)
+        if outcome not in ("primary", "primary_hedged"):
+            logger.info(f"{op}: {outcome} after {time.monotonic() - start:.2f}s ({len(attempts)} attempts)")
+
+
+def hedged_generate(
+    op: str,
+    contents,
+    primary_model: str,
+    hedge_model: Optional[str] = None,
+    budget: float = settings.LATENCY_BUDGET_SECONDS,
+    policy: Optional[HedgePolicy] = None,
+    info: Optional[RaceInfo] = None,
+    **kwargs,
+) -> str:
+    """
+    Returns the first complete answer from the primary or the hedge model (which one
+    is stored in `info`). Raises LatencyBudgetExceeded after `budget` seconds (0 = no
+    budget, no hedge), or the primary's error when every attempt failed. `kwargs` go to
+    GeminiClient.generate.
+    """
+    hedge_model = hedge_model if settings.HEDGE_ENABLED else None
+    policy = policy or get_hedge_policy()
+    return "".join(_race(op, contents, primary_model, hedge_model, budget, policy, True, info, kwargs))
+
+
+def hedged_stream(
+    op: str,
+    contents,
+    primary_model: str,
+    hedge_model: Optional[str] = None,
+    budget: float = settings.LATENCY_BUDGET_SECONDS,
+    policy: Optional[HedgePolicy] = None,
+    info: Optional[RaceInfo] = None,
+    **kwargs,
+) -> Iterator[str]:
+    """
+    Like hedged_generate, but yields text chunks from whichever model starts answering
+    first. LatencyBudgetExceeded can also be raised mid-stream, after some chunks.
+    """
+    hedge_model = hedge_model if settings.HEDGE_ENABLED else None
+    return _race(op, contents, primary_model, hedge_model, budget, policy or get_hedge_policy(), False, info, kwargs)
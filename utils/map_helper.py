@@ -1,291 +1,524 @@
-import streamlit as st
-import google.generativeai as genai
-import pandas as pd
+"""
+Hospital search and geocoding helpers.
+
+This module is a side-effect-free library: it never touches Streamlit and defers
+importing google.generativeai, pandas and requests until they are first needed,
+so importing it from a Streamlit script is cheap. UI code lives in `utils.ui_helper`.
+Errors are logged; pass `on_error` (e.g. st.error) to also show them to the user.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
 import re
-import requests
-from typing import Tuple, Optional
+import threading
+from typing import TYPE_CHECKING, Callable, Tuple, Optional
+
+from utils import metrics, settings
+from utils.cache import ResponseCache, make_cache
+from utils.gemini_client import get_gemini_client
+from utils.geo import bearing_deg, compass_point, geohash, haversine_km
+from utils.geocoding import geocode, geocode_many, nominatim_get, normalize_address
+from utils.singleflight import make_flight_group
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FACILITY_MODEL = "gemini-2.5-flash"
+
+COORDS_SYSTEM_PROMPT = (
+    "You are a helpful emergency assistant. "
+    "Find the top 3-5 nearest public or general hospitals near the given coordinates. "
+    "For each hospital, provide its name, full address, latitude and longitude, "
+    "distance in km from the location and phone number. Use null for anything you do not know; never guess coordinates."
+)
+
+QUERY_SYSTEM_PROMPT = (
+    "You are a helpful emergency assistant. "
+    "Find the top 3-5 nearest public or general hospitals near the user's requested location. "
+    "For each hospital, provide its name, full address, latitude and longitude, "
+    "distance in km from the location and phone number. Use null for anything you do not know; never guess coordinates."
+)
+
+# Bump when the prompts or schema change so cached answers in the old format are not reused.
+FACILITY_PROMPT_VERSION = "2"
+
+FACILITY_COLUMNS = ["name", "address", "lat", "lon", "distance_km", "phone"]
+
+FACILITY_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string"},
+                "address": {"type": "string"},
+                "lat": {"type": "number", "nullable": True},
+                "lon": {"type": "number", "nullable": True},
+                "distance_km": {"type": "number", "nullable": True},
+                "phone": {"type": "string", "nullable": True},
+            },
+            "required": ["name", "address"],
+        },
+    },
+}
+
+# Fallback patterns for free-text answers, compiled once
+_NUMBERED_LINE = re.compile(r'^\d+\.')
+_NUMBER_PREFIX = re.compile(r'^\d+\.\s*')
+# "1. Name | Address | Lat, Lon"
+_PIPE_WITH_COORDS = re.compile(r'^\d+\.\s*(.+?)\s*\|\s*(.+?)\s*\|\s*([+-]?\d+\.?\d*),\s*([+-]?\d+\.?\d*)')
+# "Lat, Lon" anywhere in the line; both need decimals so "1200 Main St, 55" is not read as coordinates
+_COORD_PAIR = re.compile(r'([+-]?\d{1,3}\.\d+)\s*,\s*([+-]?\d{1,3}\.\d+)')
+# "1. Name, Address"
+_NAME_COMMA_ADDRESS = re.compile(r'^\d+\.\s*(.+?),\s*(.+)$')
+# "1. Anything"
+_NUMBERED_CONTENT = re.compile(r'^\d+\.\s*(.+)$')
+_DELIMITERS = re.compile(r'[|,\-–—]')
+_CODE_FENCE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+_facility_cache: Optional[ResponseCache] = None
+_facility_cache_lock = threading.Lock()
+# Process-wide: identical Gemini hospital searches in flight at the same time share one call.
+facility_flights = make_flight_group()
+reverse_flights = make_flight_group()
+
+
+def get_facility_cache() -> ResponseCache:
+    """
+    Returns the cache in front of the Gemini hospital searches (created on first use).
+    Backend, TTL and size come from `utils.settings`; `.stats()` exposes hit/miss counters.
+    """
+    global _facility_cache
+    if _facility_cache is None:
+        with _facility_cache_lock:
+            if _facility_cache is None:
+                _facility_cache = ResponseCache(make_cache(
+                    settings.FACILITY_CACHE_BACKEND,
+                    ttl=settings.FACILITY_CACHE_TTL,
+                    max_entries=settings.FACILITY_CACHE_MAX_ENTRIES,
+                    path=os.path.join(settings.CACHE_DIR, "facilities.sqlite3"),
+                    url=settings.REDIS_URL,
+                    namespace="firstaid:facilities",
+                ), name="facilities")
+    return _facility_cache
+
+
+def _report_error(on_error: Optional[Callable[[str], None]], message: str) -> None:
+    logger.error(message)
+    if on_error is not None:
+        on_error(message)
+
+
+def _search_facilities(cache_key: str, user_prompt: str, system_instruction: str) -> Optional[str]:
+    """
+    Asks Gemini for hospitals and caches a non-empty answer.
+    Identical searches from concurrent sessions (same query, or coordinates in the same
+    geohash cell) wait for one in-flight call and share its answer or its error.
+    """
+    def search():
+        # A search that finished while this one was waiting may have filled the cache
+        cached = get_facility_cache().get(cache_key)
+        if cached is not None:
+            return cached
+
+        response = get_gemini_client().generate(
+            FACILITY_MODEL,
+            user_prompt,
+            system_instruction=system_instruction,
+            generation_config=FACILITY_GENERATION_CONFIG,
+        )
+        if response and hasattr(response, "text") and response.text:
+            result = response.text.strip()
+            get_facility_cache().set(cache_key, result)
+            return result
+        return None
 
+    return facility_flights.do(cache_key, search)
 
+
+def facilities_cache_key_for_query(location_query: str, radius_km: float = 10.0) -> str:
+    return f"v{FACILITY_PROMPT_VERSION}:query:{normalize_address(location_query)}:{float(radius_km):g}"
+
+
+def facilities_cache_key_for_coords(lat: float, lon: float, radius_km: float) -> str:
+    cell = geohash(lat, lon, settings.FACILITY_CACHE_GEOHASH_PRECISION)
+    return f"v{FACILITY_PROMPT_VERSION}:coords:{cell}:{float(radius_km):g}"
+
+
+@metrics.timed()
 def geocode_address(address: str) -> Optional[Tuple[float, float]]:
     """
     Geocodes an address to get latitude and longitude using Nominatim (OpenStreetMap).
-    Free service, no API key required.
+    Free service, no API key required. Results are cached on disk and rate limited.
     """
-    try:
-        url = "https://nominatim.openstreetmap.org/search"
-        params = {
-            "q": address,
-            "format": "json",
-            "limit": 1
-        }
-        headers = {
-            "User-Agent": "FirstAid-AI-Agent/1.0"  # Required by Nominatim
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data and len(data) > 0:
-                lat = float(data[0]["lat"])
-                lon = float(data[0]["lon"])
-                return (lat, lon)
-        return None
-    except Exception as e:
-        st.debug(f"Geocoding error for {address}: {e}")
-        return None
+    return geocode(address)
 
 
-def reverse_geocode(lat: float, lon: float) -> Optional[str]:
+@metrics.timed()
+def reverse_geocode(lat: float, lon: float, refine: Optional[bool] = None) -> Optional[str]:
     """
-    Reverse geocodes coordinates to get an address using Nominatim (OpenStreetMap).
-    Free service, no API key required.
+    Reverse geocodes coordinates to a human-readable location.
+    The nearest place in the offline gazetteer (if one was built) is answered locally;
+    Nominatim (OpenStreetMap) is only asked when the gazetteer has nothing nearby or
+    `refine` (default: settings.REVERSE_GEOCODE_REFINE) requests a street-level address.
+    Concurrent Nominatim lookups within the same ~40 m geohash cell share one request.
     """
+    from utils.gazetteer import describe_location
+
+    refine = settings.REVERSE_GEOCODE_REFINE if refine is None else refine
     try:
-        url = "https://nominatim.openstreetmap.org/reverse"
-        params = {
-            "lat": lat,
-            "lon": lon,
-            "format": "json"
-        }
-        headers = {
-            "User-Agent": "FirstAid-AI-Agent/1.0"  # Required by Nominatim
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data and "display_name" in data:
-                return data["display_name"]
-        return None
+        local = describe_location(lat, lon)
     except Exception as e:
-        st.debug(f"Reverse geocoding error for ({lat}, {lon}): {e}")
-        return None
+        metrics.record_error("reverse_geocode", e)
+        logger.warning(f"Offline gazetteer lookup failed for ({lat}, {lon}): {e}")
+        local = None
+    if local is not None and not refine:
+        return local
+
+    try:
+        return reverse_flights.do(geohash(lat, lon, 8), _reverse_lookup, lat, lon) or local
+    except Exception as e:
+        metrics.record_error("reverse_geocode", e)
+        logger.debug(f"Reverse geocoding error for ({lat}, {lon}): {e}")
+        return local
 
 
-def find_nearby_facilities_by_coords(lat: float, lon: float, radius_km: float = 10.0) -> str:
+def _reverse_lookup(lat: float, lon: float) -> Optional[str]:
+    response = nominatim_get("reverse", {"lat": lat, "lon": lon, "format": "json"})
+    if response is not None:
+        data = response.json()
+        if data and "display_name" in data:
+            return data["display_name"]
+    return None
+
+
+@metrics.timed()
+def find_nearby_facilities_by_coords(lat: float, lon: float, radius_km: float = 10.0,
+                                     on_error: Optional[Callable[[str], None]] = None) -> str:
     """
     Finds nearby healthcare facilities using coordinates and Gemini AI.
     Uses the user's exact location to find the closest hospitals.
+    Answers are cached per geohash cell and radius, so small GPS jitter reuses the same result.
     """
-    try:
-        # 1. Configure Gemini API
-        genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
+    cache = get_facility_cache()
+    cache_key = facilities_cache_key_for_coords(lat, lon, radius_km)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-        # 2. Use the grounded (Google search) mode
-        model = genai.GenerativeModel(
-            "gemini-2.5-flash",
-            # generation_config={"mode": "google_search_retrieval"}
-        )
-
-        # 3. Build prompts - request structured format with coordinates
-        system_prompt = (
-            "You are a helpful emergency assistant. "
-            "Find the top 3-5 nearest public or general hospitals near the given coordinates. "
-            "For each hospital, provide: Name, Full Address, and if possible Latitude and Longitude coordinates. "
-            "Format each result on a new line starting with a number, followed by the hospital name, address, and coordinates if available."
-        )
-
-        user_prompt = (
-            f"Find hospitals near latitude {lat}, longitude {lon} within {radius_km} km radius. "
-            "Format as: Number. Hospital Name | Address | Latitude, Longitude (if available)"
-        )
+    try:
+        # 1. Build prompt - the answer format is set by the JSON schema
+        user_prompt = f"Find hospitals near latitude {lat}, longitude {lon} within {radius_km} km radius."
 
-        # 4. Generate response
-        response = model.generate_content([system_prompt, user_prompt])
+        # 2. Generate response with the shared Gemini client (coalesced with identical searches)
+        result = _search_facilities(cache_key, user_prompt, COORDS_SYSTEM_PROMPT)
 
-        # 5. Return formatted text
-        if response and hasattr(response, "text") and response.text:
-            return response.text.strip()
+        # 3. Return the JSON text (parse it with parse_facilities_to_df)
+        if result:
+            return result
         else:
             return "⚠️ No hospitals found near your location. Try another location."
 
     except Exception as e:
-        st.error(f"Error finding facilities: {e}")
+        metrics.record_error("find_nearby_facilities_by_coords", e)
+        _report_error(on_error, f"Error finding facilities: {e}")
         return "⚠️ Could not search for hospitals. Please check your Gemini API key and network connection."
 
 
-def find_nearby_facilities(location_query: str):
+@metrics.timed()
+def find_nearby_facilities(location_query: str, radius_km: float = 10.0,
+                           on_error: Optional[Callable[[str], None]] = None):
     """
     Finds nearby healthcare facilities using Gemini's grounded search tool
     based on a text-based location query (e.g., "Austin, TX").
+    Answers are cached by normalized query and radius.
     """
-    try:
-        # 1. Configure Gemini API
-        genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
-
-        # 2. Use the grounded (Google search) mode
-        model = genai.GenerativeModel(
-            "gemini-2.5-flash",
-            # generation_config={"mode": "google_search_retrieval"}
-        )
+    cache = get_facility_cache()
+    cache_key = facilities_cache_key_for_query(location_query, radius_km)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-        # 3. Build prompts - request structured format with coordinates
-        system_prompt = (
-            "You are a helpful emergency assistant. "
-            "Find the top 3-5 nearest public or general hospitals near the user's requested location. "
-            "For each hospital, provide: Name, Full Address, and if possible Latitude and Longitude coordinates. "
-            "Format each result on a new line starting with a number, followed by the hospital name, address, and coordinates if available."
-        )
-
-        user_prompt = (
-            f"Find hospitals near: {location_query}. "
-            "Format as: Number. Hospital Name | Address | Latitude, Longitude (if available)"
-        )
+    try:
+        # 1. Build prompt - the answer format is set by the JSON schema
+        user_prompt = f"Find hospitals within {radius_km} km of: {location_query}."
 
-        # 4. Generate response
-        response = model.generate_content([system_prompt, user_prompt])
+        # 2. Generate response with the shared Gemini client (coalesced with identical searches)
+        result = _search_facilities(cache_key, user_prompt, QUERY_SYSTEM_PROMPT)
 
-        # 5. Return formatted text
-        if response and hasattr(response, "text") and response.text:
-            return response.text.strip()
+        # 3. Return the JSON text (parse it with parse_facilities_to_df)
+        if result:
+            return result
         else:
             return "⚠️ No hospitals found. Try another location."
 
     except Exception as e:
-        st.error(f"Error finding facilities: {e}")
+        metrics.record_error("find_nearby_facilities", e)
+        _report_error(on_error, f"Error finding facilities: {e}")
         return "⚠️ Could not search for hospitals. Please check your Gemini API key and network connection."
 
 
-def parse_facilities_to_df(text_result: str) -> pd.DataFrame:
+def _load_structured(text_result: str) -> Optional[list]:
+    """Returns the facility records of a JSON answer, or None if the text is not JSON."""
+    text = _CODE_FENCE.sub("", text_result.strip())
+    if not text.startswith(("[", "{")):
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        data = data.get("facilities") or data.get("hospitals") or [data]
+    if not isinstance(data, list):
+        return None
+    return [record for record in data if isinstance(record, dict)]
+
+
+def _structured_to_df(records: list) -> pd.DataFrame:
+    """Builds the facilities DataFrame from JSON records, dropping unnamed rows and impossible coordinates."""
+    import numpy as np
+    import pandas as pd
+
+    # Object dtype keeps each value as the model sent it; the columns are then coerced in bulk
+    raw = pd.DataFrame(records, columns=FACILITY_COLUMNS, dtype=object).to_numpy()
+    columns = {}
+    for i, column in enumerate(FACILITY_COLUMNS):
+        values = raw[:, i]
+        if column in ("lat", "lon", "distance_km"):
+            columns[column] = pd.to_numeric(values, errors="coerce").astype(float)
+        else:
+            # StringDType calls str() on anything, as the old per-record code did
+            columns[column] = np.strings.strip(np.where(pd.isna(values), "", values).astype(np.dtypes.StringDType()))
+    # Better no pin than a pin in the wrong place
+    invalid = ~((np.abs(columns["lat"]) <= 90) & (np.abs(columns["lon"]) <= 180))
+    columns["lat"][invalid] = columns["lon"][invalid] = np.nan
+    named = columns["name"] != ""
+    return pd.DataFrame({column: values[named] for column, values in columns.items()})
+
+
+def _valid_coords(lat: float, lon: float) -> bool:
+    return -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def _parse_free_text(text_result: str) -> Tuple[list, list]:
     """
-    Converts Gemini's text output (numbered list) into a DataFrame with coordinates.
-    Tries to extract coordinates from text, or geocodes addresses if coordinates not found.
+    Fallback parser for numbered free-text answers.
+    Returns the rows and the indexes of rows that still need geocoding.
     """
     data = []
+    pending = []  # indexes of rows that still need geocoding
     lines = text_result.split('\n')
     
     for line in lines:
         line = line.strip()
-        if not line or not re.match(r'^\d+\.', line):
+        if not line or not _NUMBERED_LINE.match(line):
             continue
             
         # Try multiple patterns to extract information
         # Pattern 1: "1. Name | Address | Lat, Lon"
-        match1 = re.match(r'^\d+\.\s*(.+?)\s*\|\s*(.+?)\s*\|\s*([+-]?\d+\.?\d*),\s*([+-]?\d+\.?\d*)', line)
+        match1 = _PIPE_WITH_COORDS.match(line)
         if match1:
             name, address, lat, lon = match1.groups()
             try:
-                data.append({
-                    "name": name.strip(),
-                    "address": address.strip(),
-                    "lat": float(lat),
-                    "lon": float(lon)
-                })
-                continue
+                if _valid_coords(float(lat), float(lon)):
+                    data.append({
+                        "name": name.strip(),
+                        "address": address.strip(),
+                        "lat": float(lat),
+                        "lon": float(lon)
+                    })
+                    continue
             except ValueError:
                 pass
         
         # Pattern 2: "1. Name, Address (Lat, Lon)" or "1. Name - Address - Lat, Lon"
-        match2 = re.search(r'([+-]?\d+\.?\d*)\s*,\s*([+-]?\d+\.?\d*)', line)
-        if match2:
+        match2 = _COORD_PAIR.search(line)
+        if match2 and _valid_coords(float(match2.group(1)), float(match2.group(2))):
             lat, lon = match2.groups()
             # Extract name and address (everything before the coordinates)
             prefix = line[:match2.start()].strip()
             # Remove leading number and period
-            prefix = re.sub(r'^\d+\.\s*', '', prefix)
+            prefix = _NUMBER_PREFIX.sub('', prefix)
             # Try to split name and address
-            parts = re.split(r'[|,\-–—]', prefix, 1)
+            parts = _DELIMITERS.split(prefix, 1)
             name = parts[0].strip() if parts else prefix
             address = parts[1].strip() if len(parts) > 1 else prefix
             
-            try:
-                data.append({
-                    "name": name,
-                    "address": address,
-                    "lat": float(lat),
-                    "lon": float(lon)
-                })
-                continue
-            except ValueError:
-                pass
+            data.append({
+                "name": name,
+                "address": address,
+                "lat": float(lat),
+                "lon": float(lon)
+            })
+            continue
         
         # Pattern 3: "1. Name, Address" - extract name and address, then geocode
-        match3 = re.match(r'^\d+\.\s*(.+?),\s*(.+)$', line)
+        match3 = _NAME_COMMA_ADDRESS.match(line)
         if match3:
             name, address = match3.groups()
             name = name.strip()
             address = address.strip()
             
-            # Try to geocode the address
-            coords = geocode_address(address)
-            if coords:
-                data.append({
-                    "name": name,
-                    "address": address,
-                    "lat": coords[0],
-                    "lon": coords[1]
-                })
-            else:
-                # If geocoding fails, still add it without coordinates
-                data.append({
-                    "name": name,
-                    "address": address
-                })
+            # Geocode the address later, together with the other rows
+            data.append({
+                "name": name,
+                "address": address
+            })
+            pending.append(len(data) - 1)
             continue
         
         # Pattern 4: Simple numbered list - try to parse manually
-        match4 = re.match(r'^\d+\.\s*(.+)$', line)
+        match4 = _NUMBERED_CONTENT.match(line)
         if match4:
             content = match4.group(1).strip()
             # Try to split by common delimiters
-            parts = [p.strip() for p in re.split(r'[|,\-–—]', content) if p.strip()]
+            parts = [p.strip() for p in _DELIMITERS.split(content) if p.strip()]
             if len(parts) >= 2:
                 name = parts[0]
                 address = ' '.join(parts[1:])
-                coords = geocode_address(address)
-                if coords:
-                    data.append({
-                        "name": name,
-                        "address": address,
-                        "lat": coords[0],
-                        "lon": coords[1]
-                    })
-                else:
-                    data.append({
-                        "name": name,
-                        "address": address
-                    })
+                data.append({
+                    "name": name,
+                    "address": address
+                })
+                pending.append(len(data) - 1)
 
-    return pd.DataFrame(data)
+    return data, pending
 
 
-def show_facilities_results(location_query: str):
+@metrics.timed()
+def parse_facilities_to_df(text_result: str) -> pd.DataFrame:
     """
-    Combines search + display logic for Streamlit.
+    Converts Gemini's answer into a DataFrame with coordinates.
+    JSON answers (the normal case) are parsed directly; numbered free-text lists go
+    through the regex fallback. Addresses without coordinates are geocoded in one concurrent batch.
     """
-    st.subheader("🗺️ Nearby Healthcare Facilities")
+    import pandas as pd
+
+    records = _load_structured(text_result)
+    if records is not None:
+        df = _structured_to_df(records)
+        missing = df.index[df["lat"].isna() & (df["address"] != "")]
+        if len(missing):
+            results = geocode_many(df.loc[missing, "address"])
+            for i, coords in zip(missing, results):
+                if coords:
+                    df.loc[i, ["lat", "lon"]] = coords
+        return df
 
-    with st.spinner("Searching for nearby hospitals..."):
-        result_text = find_nearby_facilities(location_query)
+    data, pending = _parse_free_text(text_result)
 
-    st.markdown(result_text)
+    # Geocode all rows without coordinates concurrently; rows that fail stay without coordinates
+    if pending:
+        results = geocode_many(data[i]["address"] for i in pending)
+        for i, coords in zip(pending, results):
+            if coords:
+                data[i]["lat"], data[i]["lon"] = coords
 
-    facilities_df = parse_facilities_to_df(result_text)
+    return pd.DataFrame(data)
 
-    if not facilities_df.empty:
-        st.dataframe(facilities_df, use_container_width=True)
-    else:
-        st.info("Gemini returned text results only — no coordinates available for mapping.")
 
+def facilities_to_markdown(facilities_df: pd.DataFrame) -> str:
+    """Numbered markdown list of facilities with whatever details are known."""
+    import pandas as pd
 
-def show_facilities_map(facilities_df: pd.DataFrame):
+    lines = []
+    for i, row in enumerate(facilities_df.to_dict("records"), start=1):
+        details = [row.get("address") or ""]
+        if pd.notna(row.get("distance_km")):
+            details.append(f"{row['distance_km']:.1f} km")
+        if row.get("phone"):
+            details.append(f"☎️ {row['phone']}")
+        lines.append(f"{i}. **{row['name']}** — " + " · ".join(d for d in details if d))
+    return "\n".join(lines)
+
+
+@metrics.timed()
+def search_facilities_near(lat: float, lon: float, radius_km: float = 10.0, timer=None, on_error=None):
     """
-    Displays a map if lat/lon are available.
+    Full hospital search for a coordinate: offline index first, otherwise Gemini plus parsing
+    (which geocodes any addresses without coordinates), ranked nearest first within `radius_km`.
+    Returns (results_text, facilities_df); results_text is None when the offline index answered.
+    Sub-step timings are recorded on `timer` (a utils.orchestration.StageTimer) when given.
+    `on_error` is called from the calling thread, so st.error only works outside worker threads.
     """
-    if not facilities_df.empty and {"lat", "lon"}.issubset(facilities_df.columns):
-        st.map(facilities_df[["lat", "lon"]])
-        st.markdown("### 🏥 Nearby Healthcare Facilities (Map)")
-        for _, row in facilities_df.iterrows():
-            st.markdown(f"**{row['name']}** \n📍 ({row['lat']:.4f}, {row['lon']:.4f})")
-    else:
-        st.warning("Map skipped — Gemini results do not include coordinates.")
+    from utils.facility_index import find_nearest_facilities
+    from utils.orchestration import StageTimer
+
+    timer = timer or StageTimer()
+    facilities_df = timer.measure("offline index", find_nearest_facilities, lat, lon, radius_km)
+    if facilities_df is not None:
+        return None, rank_facilities(facilities_df, lat, lon, radius_km)
+
+    results_text = timer.measure("Gemini search", find_nearby_facilities_by_coords, lat, lon, radius_km,
+                                 on_error=on_error)
+    facilities_df = timer.measure("parse + geocode", parse_facilities_to_df, results_text)
+    facilities_df = timer.measure("rank", rank_facilities, facilities_df, lat, lon, radius_km)
+    return results_text, facilities_df
+
 
+@metrics.timed()
+def search_facilities_for_query(location_query: str, radius_km: float = 10.0, timer=None, on_error=None):
+    """
+    Full hospital search for a place name or address: Gemini plus parsing, ranked nearest first
+    within `radius_km` of the searched place, which is geocoded while Gemini is searching.
+    Returns (results_text, facilities_df, origin); origin is None if the place could not be geocoded.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from utils.orchestration import StageTimer
+
+    timer = timer or StageTimer()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="origin") as pool:
+        origin_future = pool.submit(geocode_address, location_query)
+        results_text = timer.measure("Gemini search", find_nearby_facilities, location_query, radius_km,
+                                     on_error=on_error)
+        facilities_df = timer.measure("parse + geocode", parse_facilities_to_df, results_text)
+        origin = origin_future.result()
 
-# --- Streamlit UI Layout ---
-st.set_page_config(page_title="Nearby Healthcare Finder", page_icon="🏥", layout="centered")
+    lat, lon = origin if origin else (None, None)
+    facilities_df = timer.measure("rank", rank_facilities, facilities_df, lat, lon, radius_km)
+    return results_text, facilities_df, origin
 
-st.title("🏥 Nearby Healthcare Facilities Finder")
-st.write("Enter a city, state, or area to find hospitals near you.")
 
-location_query = st.text_input("📍 Enter a location", placeholder="e.g., Austin, TX")
+@metrics.timed()
+def rank_facilities(facilities_df: pd.DataFrame, lat: Optional[float], lon: Optional[float],
+                    radius_km: Optional[float] = None) -> pd.DataFrame:
+    """
+    Distance and bearing from (lat, lon) to every facility in one vectorized pass, nearest first.
+    Adds `distance_km`, `bearing_deg` and `direction` ("N", "NE", ...). Facilities farther than
+    `radius_km` are dropped. Rows without coordinates (or every row, without an origin) keep
+    the distance Gemini reported, if any; rows with no distance at all are listed last.
+    """
+    import numpy as np
+    import pandas as pd
 
-if st.button("Find Hospitals") and location_query:
-    show_facilities_results(location_query)
+    n = len(facilities_df)
+    reported = _float_column(facilities_df, "distance_km")
+    if lat is None or lon is None or not n:
+        distance, bearing = reported, np.full(n, np.nan)
+    else:
+        lats, lons = _float_column(facilities_df, "lat"), _float_column(facilities_df, "lon")
+        distance = np.where(np.isnan(lats), reported, haversine_km(lat, lon, lats, lons))
+        bearing = bearing_deg(lat, lon, lats, lons)
+
+    keep = np.flatnonzero(~(distance > radius_km)) if radius_km is not None else np.arange(n)
+    order = keep[np.argsort(np.nan_to_num(distance[keep], nan=np.inf), kind="stable")]
+    # One DataFrame built from reordered arrays: cheaper than iloc plus per-column assignment
+    columns = {name: facilities_df[name].to_numpy()[order] for name in facilities_df.columns}
+    columns["distance_km"] = distance[order]
+    columns["bearing_deg"] = bearing[order]
+    columns["direction"] = compass_point(bearing[order])
+    return pd.DataFrame(columns)
+
+
+def _float_column(df: pd.DataFrame, name: str):
+    """Column as a float array with NaN for missing values (all NaN if the column is absent)."""
+    import numpy as np
+
+    if name not in df:
+        return np.full(len(df), np.nan)
+    return df[name].to_numpy(dtype=float, na_value=np.nan)
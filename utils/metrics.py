@@ -0,0 +1,417 @@
+"""
+Lightweight metrics and tracing for the hot paths.
+
+Off by default; set METRICS_ENABLED=1 to turn it on. While disabled, `timed`,
+`span`, `inc` and `observe` cost a single flag check per call. While enabled:
+
+* latency histograms, error counts, retries, cache hits/misses, bytes sent and
+  Gemini token usage are kept in-process and rendered in the Prometheus text
+  format by `render_prometheus()` (served on METRICS_PORT when it is set);
+* with METRICS_JSON_LOGS=1 every finished span is also logged as one JSON line
+  on the `firstaid.metrics` logger.
+
+`Profile` wraps a single request in cProfile or pyinstrument (optional).
+"""
+import bisect
+import cProfile
+import functools
+import inspect
+import io
+import json
+import logging
+import pstats
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from utils import settings
+
+logger = logging.getLogger(__name__)
+json_logger = logging.getLogger("firstaid.metrics")
+
+enabled = settings.METRICS_ENABLED
+
+# Latency buckets in seconds, from cache hits to slow multimodal calls.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+OPERATION_SECONDS = "firstaid_operation_duration_seconds"
+OPERATION_ERRORS = "firstaid_operation_errors_total"
+
+_HELP = {
+    OPERATION_SECONDS: ("histogram", "Latency of instrumented operations."),
+    OPERATION_ERRORS: ("counter", "Errors raised or reported by instrumented operations."),
+    "firstaid_cache_requests_total": ("counter", "Cache lookups by cache and result (hit/miss)."),
+    "firstaid_gemini_requests_total": ("counter", "Gemini generate_content calls by model and status."),
+    "firstaid_gemini_retries_total": ("counter", "Gemini calls retried after a 429/5xx answer."),
+    "firstaid_gemini_request_duration_seconds": ("histogram", "Gemini call latency, until the stream is consumed."),
+    "firstaid_gemini_request_bytes_total": ("counter", "Approximate request payload bytes sent to Gemini."),
+    "firstaid_gemini_tokens_total": ("counter", "Tokens reported in Gemini usage metadata, by kind."),
+    "firstaid_nominatim_requests_total": ("counter", "Nominatim requests by endpoint and HTTP status."),
+    "firstaid_image_bytes_total": ("counter", "Uploaded image bytes before (in) and after (out) preprocessing."),
+}
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Thread-safe in-process store of counters and histograms with labels."""
+
+    def __init__(self):
+        self._counters: Dict[LabelKey, float] = {}
+        self._histograms: Dict[LabelKey, _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get(_key(name, labels), 0.0)
+
+    def histogram_count(self, name: str, **labels) -> int:
+        histogram = self._histograms.get(_key(name, labels))
+        return histogram.count if histogram else 0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(h.buckets), h.sum, h.count)) for key, h in self._histograms.items()
+            )
+
+        lines, described = [], set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, text = _HELP.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+        for (name, labels), (buckets, total, count) in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, n in zip((*BUCKETS, "+Inf"), buckets):
+                cumulative += n
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+def set_enabled(value: bool) -> None:
+    global enabled
+    enabled = value
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    if enabled:
+        registry.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    if enabled:
+        registry.observe(name, value, **labels)
+
+
+def record_error(op: str, error: BaseException) -> None:
+    """Counts an error that the operation handled itself (e.g. turned into a warning message)."""
+    if enabled:
+        registry.inc(OPERATION_ERRORS, op=op, error=type(error).__name__)
+
+
+class Span:
+    """Times one operation; an exception escaping the block is counted as an error."""
+
+    __slots__ = ("op", "attrs", "start")
+
+    def __init__(self, op: str, attrs: dict):
+        self.op = op
+        self.attrs = attrs
+        self.start = 0.0
+
+    def set(self, **attrs) -> None:
+        """Adds attributes to the span's JSON log line."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        registry.observe(OPERATION_SECONDS, elapsed, op=self.op)
+        # A consumer closing a traced generator early is not an error
+        failed = exc_type is not None and not issubclass(exc_type, GeneratorExit)
+        if failed:
+            registry.inc(OPERATION_ERRORS, op=self.op, error=exc_type.__name__)
+        if settings.METRICS_JSON_LOGS:
+            json_logger.info(json.dumps({
+                "event": "span",
+                "op": self.op,
+                "duration_ms": round(elapsed * 1000, 3),
+                "status": "error" if failed else "ok",
+                **({"error": exc_type.__name__} if failed else {}),
+                "thread": threading.current_thread().name,
+                **self.attrs,
+            }, default=str))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(op: str, **attrs):
+    """Context manager timing the enclosed block as operation `op` (a no-op while disabled)."""
+    return Span(op, attrs) if enabled else _NOOP_SPAN
+
+
+def timed(op: Optional[str] = None) -> Callable:
+    """
+    Decorator recording each call of the function as a span named `op` (default: the function name).
+    Generator functions are timed until the generator is exhausted or closed.
+    """
+    def decorate(fn):
+        name = op or fn.__name__
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                if not enabled:
+                    return (yield from fn(*args, **kwargs))
+                with Span(name, {}):
+                    return (yield from fn(*args, **kwargs))
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def render_prometheus() -> str:
+    return registry.render()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve(port: int = settings.METRICS_PORT, host: str = "0.0.0.0") -> bool:
+    """
+    Serves `render_prometheus()` at http://host:port/metrics from a daemon thread.
+    Safe to call on every Streamlit rerun: the server is started once per process.
+    """
+    global _server
+    if not enabled or not port:
+        return False
+    with _server_lock:
+        if _server is not None:
+            return True
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            _server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            # Another Streamlit worker on this host may already be serving the port
+            logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+            return False
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return True
+
+
+class ProfilerBusy(RuntimeError):
+    """Another request in this process is being profiled."""
+
+
+# One profile at a time per process: from Python 3.12 cProfile raises if a second one is enabled
+_profile_lock = threading.Lock()
+
+
+# From Python 3.12 cProfile is built on sys.monitoring and records every thread by itself
+_CPROFILE_SEES_ALL_THREADS = sys.version_info >= (3, 12)
+# Seconds `Profile.stop()` waits for the request's worker threads to finish before reporting
+THREAD_JOIN_GRACE = 0.5
+
+
+class Profile:
+    """
+    Profiles a request between `start()` and `stop()` (or as a context manager).
+    `kind` is "cprofile" (standard library) or "pyinstrument" (optional package).
+    `stop()` returns a text report, also kept in `.report`. Only one profile runs at a
+    time; `start()` raises ProfilerBusy while another one is running.
+
+    cProfile also covers worker threads (run_stages, hedged model calls): natively from
+    Python 3.12, and before that through a profiler per thread started during the
+    profile. Threads still running at `stop()` are left out. pyinstrument only samples
+    the calling thread; time spent in workers shows up as waiting there. The report
+    starts with a line saying which threads it covers.
+    """
+
+    def __init__(self, kind: str = settings.PROFILER, limit: int = 30):
+        self.kind = kind.lower()
+        self.limit = limit
+        self.report = ""
+        self._profiler = None
+        self._thread_profilers = []
+        self._threads_lock = threading.Lock()
+
+    def _profile_new_thread(self, frame, event, arg):
+        # threading.setprofile hook, called once at the start of each new thread
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        with self._threads_lock:
+            self._thread_profilers.append((threading.current_thread(), profiler))
+        profiler.enable()
+
+    def start(self) -> "Profile":
+        if not _profile_lock.acquire(blocking=False):
+            raise ProfilerBusy("Another request is being profiled")
+        try:
+            if self.kind == "pyinstrument":
+                from pyinstrument import Profiler  # optional dependency, only needed for this profiler
+
+                self._profiler = Profiler()
+                self._profiler.start()
+            else:
+                self._profiler = cProfile.Profile()
+                self._profiler.enable()
+                if not _CPROFILE_SEES_ALL_THREADS:
+                    threading.setprofile(self._profile_new_thread)
+        except BaseException:
+            self._profiler = None
+            _profile_lock.release()
+            raise
+        return self
+
+    def stop(self) -> str:
+        if self._profiler is None:
+            return self.report
+        try:
+            if self.kind == "pyinstrument":
+                self._profiler.stop()
+                self.report = "Calling thread only; worker threads are not sampled.\n" + self._profiler.output_text()
+            else:
+                self._profiler.disable()
+                out = io.StringIO()
+                stats = pstats.Stats(self._profiler, stream=out)
+                self.report = self._merge_threads(stats)
+                stats.sort_stats("cumulative").print_stats(self.limit)
+                self.report += out.getvalue()
+        finally:
+            self._profiler = None
+            _profile_lock.release()
+        return self.report
+
+    def _merge_threads(self, stats: pstats.Stats) -> str:
+        """Adds the worker threads' profiles to `stats`; returns the report's coverage line."""
+        if _CPROFILE_SEES_ALL_THREADS:
+            return "All threads.\n"
+        threading.setprofile(None)
+        with self._threads_lock:
+            threads, self._thread_profilers = self._thread_profilers, []
+        running = 0
+        grace_until = time.monotonic() + THREAD_JOIN_GRACE
+        for thread, profiler in threads:
+            # Pool workers exit just after the request; a thread still running has a live profiler
+            thread.join(max(grace_until - time.monotonic(), 0))
+            if thread.is_alive():
+                running += 1
+            else:
+                stats.add(profiler)
+        note = f"; {running} still running, not included" if running else ""
+        return f"Calling thread and {len(threads) - running} worker threads{note}.\n"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
@@ -0,0 +1,78 @@
+"""
+Fan-out of independent calls with an overall deadline.
+
+`run_stages` starts every stage at once on a thread pool and yields each
+result as soon as it finishes, so the UI can render pieces as they arrive
+instead of waiting for the slowest call. Stages still running at the deadline
+are reported as timed out and abandoned.
+"""
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageResult:
+    name: str
+    value: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class StageTimer:
+    """Collects named timings, e.g. the sub-steps of one stage."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    def measure(self, name: str, fn: Callable, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+
+def _timed(fn: Callable):
+    start = time.perf_counter()
+    try:
+        return fn(), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+
+def run_stages(stages: Dict[str, Callable[[], Any]], deadline: float) -> Iterator[StageResult]:
+    """
+    Runs the zero-argument callables in `stages` concurrently and yields a StageResult
+    for each one in completion order. Errors are captured on the result, not raised.
+    Stages that have not finished `deadline` seconds after the start are yielded with
+    a TimeoutError; their threads are left to finish in the background.
+    """
+    start = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix="stage")
+    futures = {pool.submit(_timed, fn): name for name, fn in stages.items()}
+    pending = set(futures)
+    try:
+        while pending:
+            remaining = deadline - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                value, error, elapsed = future.result()
+                yield StageResult(futures[future], value, error, elapsed)
+
+        for future in pending:
+            name = futures[future]
+            logger.warning(f"Stage '{name}' missed the {deadline:.1f}s deadline")
+            yield StageResult(name, error=TimeoutError(f"{name} timed out"), elapsed=time.perf_counter() - start)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,237 @@
+"""
+Local library of vetted first-aid protocol cards with a fast intent matcher.
+
+Most descriptions are common conditions (burns, cuts, sprains, nosebleeds,
+choking, ...). The matcher scores a description against each card's example
+phrases using character n-gram TF-IDF vectors and NumPy cosine similarity;
+confident matches are answered from the card without calling Gemini. Emergencies
+(RED_FLAG_PATTERNS), negated descriptions ("not choking") and one-word or off-topic
+text always go to the model, whatever their n-gram score.
+When Gemini misses its latency budget, the "general" card (no examples, never
+matched; it says when to call emergency services) is shown with the closest card.
+"""
+import json
+import math
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from utils import metrics, settings
+
+GENERAL_CARD_ID = "general"
+
+# Possible emergencies: never answered from a card, however similar the wording is.
+RED_FLAG_PATTERNS = re.compile(
+    r"\b("
+    r"(heat ?)?strokes?|slurred speech|face (is )?droop\w*|"
+    r"chest (pain|pains|tightness|pressure)|heart attack|cardiac|"
+    r"(not|stopped|isn'?t|wasn'?t|no longer) breathing|(can'?t|cannot|can not|unable to) breathe|"
+    r"(trouble|difficulty|struggling) breathing|short(ness)? of breath|"
+    r"unconscious|unresponsive|passed out|collapsed?|fainted|"
+    r"seizures?|convuls\w*|fitting|"
+    r"overdosed?|poison\w*|suicid\w*|"
+    r"bleeding (heavily|badly|won'?t stop)|spurting|"
+    r"anaphyla\w*|throat (closing|swelling)"
+    r")\b"
+)
+# Followed by one of the card's words, these turn its meaning around ("not choking", "no burn").
+NEGATIONS = {"not", "no", "never", "without", "isnt", "wasnt", "doesnt", "dont", "didnt", "cant", "cannot", "nor", "denies"}
+# Ignored when counting a description's words and comparing them with a card's
+STOPWORDS = {
+    "a", "an", "the", "my", "his", "her", "their", "our", "your", "i", "me", "he", "she", "they", "we", "it", "its",
+    "is", "was", "are", "be", "been", "has", "have", "had", "got", "get", "on", "in", "of", "and", "or", "to", "at",
+    "with", "from", "after", "for", "by", "this", "that", "some", "very", "so", "just", "im",
+}
+
+
+@dataclass(frozen=True)
+class ProtocolCard:
+    id: str
+    title: str
+    steps: str
+    examples: tuple
+
+    def format(self) -> str:
+        return f"**{self.title}**\n\n{self.steps}"
+
+
+@dataclass(frozen=True)
+class ProtocolMatch:
+    card: ProtocolCard
+    score: float
+    runner_up: float
+
+
+def _content_words(text: str) -> List[str]:
+    """Lowercase words without apostrophes ("can't" -> "cant"), stopwords removed."""
+    words = (w.replace("'", "") for w in re.findall(r"[a-z0-9']+", text.lower()))
+    return [w for w in words if w and w not in STOPWORDS]
+
+
+def _stem(word: str) -> str:
+    # Crude, but enough to tell "burned" and "burning" share a word with "burn"
+    return word[:4]
+
+
+def _char_ngrams(text: str, n_min: int = 3, n_max: int = 5) -> Counter:
+    """Character n-grams taken inside word boundaries, like scikit-learn's char_wb analyzer."""
+    grams = Counter()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        padded = f" {word} "
+        for n in range(n_min, n_max + 1):
+            for i in range(max(len(padded) - n + 1, 1)):
+                grams[padded[i:i + n]] += 1
+    return grams
+
+
+class ProtocolMatcher:
+    """
+    TF-IDF char n-gram index over the cards' titles and example phrases.
+    A card's score is its best cosine similarity over its examples.
+    """
+
+    def __init__(self, cards: List[ProtocolCard]):
+        self.cards = cards
+        # Stems of each card's words, to require word-level overlap on top of the n-gram score
+        self.card_stems = {
+            card.id: {_stem(w) for text in (card.title, *card.examples) for w in _content_words(text)}
+            for card in cards
+        }
+        docs, owners = [], []
+        for card_index, card in enumerate(cards):
+            for text in (card.title, *card.examples):
+                docs.append(_char_ngrams(text))
+                owners.append(card_index)
+
+        self.vocabulary = {}
+        for grams in docs:
+            for gram in grams:
+                self.vocabulary.setdefault(gram, len(self.vocabulary))
+
+        df = np.zeros(len(self.vocabulary))
+        for grams in docs:
+            df[[self.vocabulary[g] for g in grams]] += 1
+        self.idf = np.log((1 + len(docs)) / (1 + df)) + 1
+        self._max_idf = float(self.idf.max())
+
+        matrix = np.zeros((len(docs), len(self.vocabulary)), dtype=np.float32)
+        for row, grams in enumerate(docs):
+            cols = [self.vocabulary[g] for g in grams]
+            matrix[row, cols] = [(1 + math.log(c)) * self.idf[self.vocabulary[g]] for g, c in grams.items()]
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        # Column-major, so selecting the query's columns is a contiguous gather.
+        self.matrix = np.asfortranarray(matrix)
+        # Rows are grouped by card; reduceat over these offsets takes the best row per card.
+        self._card_starts = np.flatnonzero(np.r_[True, np.diff(owners) != 0])
+
+    def scores(self, text: str) -> np.ndarray:
+        """Cosine similarity of `text` to every card (best matching example per card)."""
+        grams = _char_ngrams(text)
+        cols, weights = [], []
+        for gram, count in grams.items():
+            col = self.vocabulary.get(gram)
+            if col is not None:
+                cols.append(col)
+                weights.append((1 + math.log(count)) * self.idf[col])
+        if not cols:
+            return np.zeros(len(self.cards))
+        # N-grams no card uses still count towards the query norm (weighted as the rarest
+        # known n-gram), so mostly off-topic text scores low.
+        unknown = sum(((1 + math.log(c)) * self._max_idf) ** 2 for g, c in grams.items() if g not in self.vocabulary)
+        weights = np.asarray(weights, dtype=np.float32)
+        norm = math.sqrt(float(weights @ weights) + unknown)
+        similarities = self.matrix[:, cols] @ (weights / norm)
+        return np.maximum.reduceat(similarities, self._card_starts)
+
+    def match(self, text: str) -> Optional[ProtocolMatch]:
+        """Returns the best card and its score, or None when nothing matches at all."""
+        scores = self.scores(text)
+        if not scores.any():
+            return None
+        order = np.argsort(scores)[::-1]
+        runner_up = float(scores[order[1]]) if len(order) > 1 else 0.0
+        return ProtocolMatch(self.cards[order[0]], float(scores[order[0]]), runner_up)
+
+
+def load_cards(path: str = settings.PROTOCOLS_PATH) -> List[ProtocolCard]:
+    with open(path, encoding="utf-8") as f:
+        return [
+            ProtocolCard(id=c["id"], title=c["title"], steps=c["steps"], examples=tuple(c["examples"]))
+            for c in json.load(f)
+        ]
+
+
+_matcher: Optional[ProtocolMatcher] = None
+_general_card: Optional[ProtocolCard] = None
+_matcher_lock = threading.Lock()
+
+
+def get_protocol_matcher() -> ProtocolMatcher:
+    global _matcher, _general_card
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                cards = load_cards()
+                _general_card = next((c for c in cards if c.id == GENERAL_CARD_ID), None)
+                _matcher = ProtocolMatcher([c for c in cards if c.examples])
+    return _matcher
+
+
+def is_red_flag(injury_description: str) -> bool:
+    """True when the description mentions a possible emergency (stroke, chest pain, not breathing, ...)."""
+    return RED_FLAG_PATTERNS.search(injury_description.lower().replace("’", "'")) is not None
+
+
+def safe_match(
+    injury_description: str,
+    threshold: float = settings.PROTOCOL_MATCH_THRESHOLD,
+    margin: float = settings.PROTOCOL_MATCH_MARGIN,
+) -> Optional[ProtocolMatch]:
+    """
+    The best card match if it is safe to answer from the card alone: at least
+    PROTOCOL_MIN_WORDS content words, no red flag, a score above the threshold that
+    beats the runner-up by the margin, and a word shared with the card that is not
+    negated.
+    """
+    words = _content_words(injury_description)
+    if len(words) < settings.PROTOCOL_MIN_WORDS or is_red_flag(injury_description):
+        return None
+    matcher = get_protocol_matcher()
+    match = matcher.match(injury_description)
+    if match is None or match.score < threshold or match.score - match.runner_up < margin:
+        return None
+    stems = matcher.card_stems[match.card.id]
+    if not stems.intersection(_stem(w) for w in words):
+        return None
+    for i, word in enumerate(words):
+        if word in NEGATIONS and any(_stem(w) in stems for w in words[i + 1:i + 3]):
+            return None
+    return match
+
+
+@metrics.timed()
+def find_protocol(injury_description: str) -> Optional[ProtocolCard]:
+    """
+    Returns the protocol card for a description when the match is confident enough
+    to skip the LLM, otherwise None.
+    """
+    if not settings.PROTOCOLS_ENABLED:
+        return None
+    match = safe_match(injury_description)
+    return match.card if match is not None else None
+
+
+def fallback_protocols(injury_description: str) -> List[ProtocolCard]:
+    """
+    The cards to show when no model answered in time: the general card (which says when
+    to call emergency services), then the matched card only if it passes `safe_match`.
+    """
+    get_protocol_matcher()  # loads the cards, the general one included
+    if _general_card is None:
+        raise LookupError(f"No '{GENERAL_CARD_ID}' card in {settings.PROTOCOLS_PATH}")
+    match = safe_match(injury_description or "")
+    return [_general_card] if match is None else [_general_card, match.card]
@@ -0,0 +1,62 @@
+"""
+Content-addressed cache for model answers.
+
+Image answers are keyed by the SHA-256 of the preprocessed image bytes and text
+answers by the normalized description. Every key also carries the model name and
+prompt version, so changing either one stops old entries from being served.
+The cache is a SQLite file, shared by all sessions and Streamlit worker processes.
+"""
+import hashlib
+import os
+import re
+import threading
+from typing import Any, Optional
+
+from utils import settings
+from utils.cache import ResponseCache, SQLiteCache
+
+_cache: Optional[ResponseCache] = None
+_lock = threading.Lock()
+
+
+def get_result_cache() -> ResponseCache:
+    """Returns the process-wide model answer cache (created on first use)."""
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = ResponseCache(SQLiteCache(
+                    os.path.join(settings.CACHE_DIR, "results.sqlite3"),
+                    ttl=settings.RESULT_CACHE_TTL,
+                    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+                ), name="results")
+    return _cache
+
+
+def normalize_text(text: str) -> str:
+    """Lower-cases, collapses whitespace and trims punctuation so trivially different descriptions match."""
+    return re.sub(r"\s+", " ", text.lower()).strip(" .,!?;:")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def text_key(kind: str, model: str, prompt_version: str, text: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{kind}:{model}:{prompt_version}:text:{digest}"
+
+
+def image_key(kind: str, model: str, prompt_version: str, data: bytes) -> str:
+    return f"{kind}:{model}:{prompt_version}:image:{content_hash(data)}"
+
+
+def get_result(key: str) -> Optional[Any]:
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    return get_result_cache().get(key)
+
+
+def put_result(key: str, value: Any) -> None:
+    if settings.RESULT_CACHE_ENABLED:
+        get_result_cache().set(key, value)
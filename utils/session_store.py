@@ -0,0 +1,81 @@
+"""
+Per-session store for results that should survive Streamlit reruns.
+
+Streamlit re-executes app.py on every widget interaction. Results kept here
+(hospital search DataFrames, model answers, ...) are shown again on the next
+rerun instead of calling Gemini or Nominatim a second time. Entries live in
+`st.session_state`, so they are private to one browser session, and they stay
+until they are evicted (oldest first) or explicitly invalidated.
+"""
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import streamlit as st
+
+from utils import settings
+from utils.result_cache import content_hash, normalize_text
+
+_STATE_KEY = "_session_results"
+_ACTIVE_KEY = "_session_results_active"
+
+
+def _entries() -> OrderedDict:
+    if _STATE_KEY not in st.session_state:
+        st.session_state[_STATE_KEY] = OrderedDict()
+    return st.session_state[_STATE_KEY]
+
+
+def get(key: Hashable) -> Optional[Any]:
+    """Returns the stored result for `key`, or None."""
+    entries = _entries()
+    if key not in entries:
+        return None
+    entries.move_to_end(key)
+    return entries[key]
+
+
+def put(key: Hashable, value: Any) -> None:
+    entries = _entries()
+    entries[key] = value
+    entries.move_to_end(key)
+    while len(entries) > settings.SESSION_RESULTS_MAX_ENTRIES:
+        entries.popitem(last=False)
+
+
+def invalidate(key: Optional[Hashable] = None) -> None:
+    """Drops one stored result, or all of them (and the active results) when no key is given."""
+    if key is None:
+        _entries().clear()
+        st.session_state.pop(_ACTIVE_KEY, None)
+        return
+    _entries().pop(key, None)
+
+
+def set_active(page: str, key: Optional[Hashable]) -> None:
+    """Remembers which stored result a page is currently showing."""
+    active = st.session_state.setdefault(_ACTIVE_KEY, {})
+    active[page] = key
+
+
+def get_active(page: str) -> Optional[Hashable]:
+    """Returns the key of the result `page` was showing, if it is still stored."""
+    key = st.session_state.get(_ACTIVE_KEY, {}).get(page)
+    return key if key in _entries() else None
+
+
+def coords_key(lat: float, lon: float, radius_km: float) -> tuple:
+    # ~10 m: GPS jitter between two fixes of the same spot maps to the same entry
+    return ("coords", round(lat, 4), round(lon, 4), float(radius_km))
+
+
+def query_key(location_query: str, radius_km: float) -> tuple:
+    return ("query", normalize_text(location_query), float(radius_km))
+
+
+def analysis_key(uploaded_file=None, description: str = "") -> Optional[tuple]:
+    """Key for the first aid inputs; an uploaded image takes precedence over the text, as in the app."""
+    if uploaded_file is not None:
+        return ("image", content_hash(uploaded_file.getbuffer()))
+    if description.strip():
+        return ("text", normalize_text(description))
+    return None
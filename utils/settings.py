@@ -0,0 +1,149 @@
+import os
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# --- Nominatim (OpenStreetMap) geocoding ---
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org").rstrip("/")
+NOMINATIM_USER_AGENT = "FirstAid-AI-Agent/1.0"  # Required by Nominatim
+NOMINATIM_TIMEOUT = _env_float("NOMINATIM_TIMEOUT", 5.0)
+# Nominatim's usage policy allows at most one request per second.
+NOMINATIM_RATE_PER_SEC = _env_float("NOMINATIM_RATE_PER_SEC", 1.0)
+GEOCODE_MAX_WORKERS = _env_int("GEOCODE_MAX_WORKERS", 4)
+
+# --- Local caches ---
+CACHE_DIR = os.environ.get("FIRSTAID_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "first-aid-ai-agent"))
+GEOCODE_CACHE_TTL = _env_float("GEOCODE_CACHE_TTL", 30 * 24 * 3600)
+GEOCODE_CACHE_MAX_ENTRIES = _env_int("GEOCODE_CACHE_MAX_ENTRIES", 10_000)
+
+# --- Hospital search response cache ---
+# Backend is one of "memory", "sqlite" or "redis".
+FACILITY_CACHE_BACKEND = os.environ.get("FACILITY_CACHE_BACKEND", "sqlite")
+FACILITY_CACHE_TTL = _env_float("FACILITY_CACHE_TTL", 24 * 3600)
+FACILITY_CACHE_MAX_ENTRIES = _env_int("FACILITY_CACHE_MAX_ENTRIES", 1_000)
+# Coordinates inside the same geohash cell share cached results (6 = ~1.2 km x 0.6 km).
+FACILITY_CACHE_GEOHASH_PRECISION = _env_int("FACILITY_CACHE_GEOHASH_PRECISION", 6)
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+# --- Hospital search ---
+# Default search radius; hospitals farther than the selected radius are not listed.
+FACILITY_SEARCH_RADIUS_KM = _env_float("FACILITY_SEARCH_RADIUS_KM", 10.0)
+SEARCH_RADIUS_OPTIONS_KM = (2.0, 5.0, 10.0, 25.0, 50.0)
+
+# --- "Detect My Location" flow ---
+# Overall deadline for reverse geocoding + hospital search, which run concurrently.
+LOCATION_FLOW_DEADLINE = _env_float("LOCATION_FLOW_DEADLINE", 20.0)
+
+# --- Coalescing of identical concurrent requests (see utils/singleflight.py) ---
+SINGLEFLIGHT_ENABLED = os.environ.get("SINGLEFLIGHT_ENABLED", "1").lower() not in ("0", "false", "no")
+# How long a request waits for an identical one already in flight before giving up.
+SINGLEFLIGHT_TIMEOUT = _env_float("SINGLEFLIGHT_TIMEOUT", 60.0)
+
+# --- Metrics and tracing (see utils/metrics.py) ---
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+# Also log every finished span as a JSON line on the "firstaid.metrics" logger.
+METRICS_JSON_LOGS = os.environ.get("METRICS_JSON_LOGS", "0").lower() in ("1", "true", "yes")
+# Serve the Prometheus text format on this port (0 = don't serve).
+METRICS_PORT = _env_int("METRICS_PORT", 0)
+# Profiler for the per-request "Profile this request" switch: "cprofile" or "pyinstrument".
+PROFILER = os.environ.get("PROFILER", "cprofile")
+
+# --- Per-session results kept across Streamlit reruns ---
+SESSION_RESULTS_MAX_ENTRIES = _env_int("SESSION_RESULTS_MAX_ENTRIES", 20)
+
+# --- Offline hospital index (build with `python -m utils.facility_index build ...`) ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FACILITY_INDEX_PATH = os.environ.get("FACILITY_INDEX_PATH", os.path.join(PROJECT_ROOT, "data", "facilities.npz"))
+
+# --- Offline reverse geocoding (build with `python -m utils.gazetteer build ...`) ---
+GAZETTEER_PATH = os.environ.get("GAZETTEER_PATH", os.path.join(PROJECT_ROOT, "data", "gazetteer"))
+# Positions farther than this from every known place fall back to Nominatim.
+GAZETTEER_MAX_KM = _env_float("GAZETTEER_MAX_KM", 25.0)
+# Also ask Nominatim for a street-level address when the gazetteer already named the place.
+REVERSE_GEOCODE_REFINE = os.environ.get("REVERSE_GEOCODE_REFINE", "").lower() in ("1", "true", "yes")
+
+# --- Gemini client ---
+GEMINI_TIMEOUT = _env_float("GEMINI_TIMEOUT", 30.0)
+GEMINI_MAX_RETRIES = _env_int("GEMINI_MAX_RETRIES", 3)
+GEMINI_RETRY_BASE_DELAY = _env_float("GEMINI_RETRY_BASE_DELAY", 0.5)
+# Upper bound on simultaneous upstream calls from this process.
+GEMINI_MAX_CONCURRENCY = _env_int("GEMINI_MAX_CONCURRENCY", 8)
+# Alternative API endpoint (e.g. a proxy or the local stub in benchmarks/stubs.py); uses the REST transport.
+GEMINI_API_ENDPOINT = os.environ.get("GEMINI_API_ENDPOINT", "")
+# Use the offline FakeModel instead of the real API (no key or network needed).
+GEMINI_FAKE = os.environ.get("GEMINI_FAKE", "").lower() in ("1", "true", "yes")
+# Requests per minute allowed by the project's quota (0 = unknown); only used in throughput reports.
+GEMINI_QUOTA_RPM = _env_float("GEMINI_QUOTA_RPM", 0)
+
+# --- Headless batch triage (`python -m utils.triage`, api.py) ---
+# Model calls in flight at once; above GEMINI_MAX_CONCURRENCY they just queue in the client.
+TRIAGE_CONCURRENCY = _env_int("TRIAGE_CONCURRENCY", GEMINI_MAX_CONCURRENCY)
+# Processes decoding and downscaling images (CPU bound).
+TRIAGE_PREP_WORKERS = _env_int("TRIAGE_PREP_WORKERS", os.cpu_count() or 1)
+
+# --- Image triage ---
+# "combined": one structured multimodal request returns the description and the steps.
+# "two_step": describe the image first, then generate steps from the description.
+IMAGE_ANALYSIS_MODE = os.environ.get("IMAGE_ANALYSIS_MODE", "combined")
+# Uploads are downscaled to this many pixels on the longest edge and re-encoded before sending.
+IMAGE_MAX_EDGE = _env_int("IMAGE_MAX_EDGE", 1024)
+IMAGE_FORMAT = os.environ.get("IMAGE_FORMAT", "JPEG")  # "JPEG" or "WEBP"
+IMAGE_QUALITY = _env_int("IMAGE_QUALITY", 85)
+
+# --- Latency budget and hedged requests (see utils/hedging.py) ---
+# Deadline for a complete model answer, in seconds; past it the stored protocol card is shown.
+# 0 waits as long as GEMINI_TIMEOUT allows, without hedging.
+LATENCY_BUDGET_SECONDS = _env_float("LATENCY_BUDGET_SECONDS", 12.0)
+IMAGE_LATENCY_BUDGET_SECONDS = _env_float("IMAGE_LATENCY_BUDGET_SECONDS", 20.0)
+# When the primary model is slow to start answering, the request also goes to these lighter models.
+HEDGE_ENABLED = os.environ.get("HEDGE_ENABLED", "1").lower() not in ("0", "false", "no")
+HEDGE_TEXT_MODEL = os.environ.get("HEDGE_TEXT_MODEL", "gemini-2.5-flash-lite")
+HEDGE_VISION_MODEL = os.environ.get("HEDGE_VISION_MODEL", "gemini-2.5-flash-lite")
+# Hedge after this percentile of the primary's recent times to first token (so about 10% of
+# requests are hedged), learned per operation from the last HEDGE_WINDOW requests.
+# HEDGE_INITIAL_DELAY applies until HEDGE_MIN_SAMPLES have been seen.
+HEDGE_PERCENTILE = _env_float("HEDGE_PERCENTILE", 90)
+HEDGE_WINDOW = _env_int("HEDGE_WINDOW", 200)
+HEDGE_MIN_SAMPLES = _env_int("HEDGE_MIN_SAMPLES", 20)
+HEDGE_INITIAL_DELAY = _env_float("HEDGE_INITIAL_DELAY", 2.0)
+HEDGE_MIN_DELAY = _env_float("HEDGE_MIN_DELAY", 0.25)
+
+# --- Model answer cache (repeated images and descriptions) ---
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+RESULT_CACHE_TTL = _env_float("RESULT_CACHE_TTL", 7 * 24 * 3600)
+RESULT_CACHE_MAX_ENTRIES = _env_int("RESULT_CACHE_MAX_ENTRIES", 5_000)
+
+# --- Offline first-aid protocol cards ---
+PROTOCOLS_ENABLED = os.environ.get("PROTOCOLS_ENABLED", "1").lower() not in ("0", "false", "no")
+PROTOCOLS_PATH = os.environ.get("PROTOCOLS_PATH", os.path.join(PROJECT_ROOT, "data", "protocols.json"))
+# A description is answered from a card only if its similarity is at least the threshold
+# and beats the second-best card by the margin; everything else goes to Gemini.
+PROTOCOL_MATCH_THRESHOLD = _env_float("PROTOCOL_MATCH_THRESHOLD", 0.45)
+PROTOCOL_MATCH_MARGIN = _env_float("PROTOCOL_MATCH_MARGIN", 0.1)
+# Shorter descriptions ("eye", "bone", "stroke") always go to Gemini.
+PROTOCOL_MIN_WORDS = _env_int("PROTOCOL_MIN_WORDS", 2)
+
+
+def get_gemini_api_key() -> str:
+    """
+    Returns the Gemini API key from the GEMINI_API_KEY environment variable,
+    falling back to Streamlit secrets (.streamlit/secrets.toml).
+    """
+    key = os.environ.get("GEMINI_API_KEY")
+    if key:
+        return key
+    import streamlit as st  # only needed when the key lives in Streamlit secrets
+
+    return st.secrets["GEMINI_API_KEY"]
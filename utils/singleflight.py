@@ -0,0 +1,97 @@
+"""
+Process-wide coalescing of identical in-flight requests ("single flight").
+
+When many sessions ask for the same thing at the same moment (the same city,
+coordinates in the same geohash cell, the same address), only the first
+caller runs the upstream call; the others wait for it and get its result or
+its exception. Nothing is kept once the call finishes: put a cache in front
+(or inside the call) to serve later requests.
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from utils import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ("done", "value", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+
+    `do(key, fn)` runs `fn` if no call for `key` is in flight, otherwise waits up to
+    `timeout` seconds for the running call and shares its result. Errors are raised
+    in the caller and in every waiter; a waiter that times out raises TimeoutError
+    while the original call carries on.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, enabled: bool = True):
+        self.timeout = timeout
+        self.enabled = enabled
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.calls = 0    # upstream calls actually made
+        self.shared = 0   # requests answered by another caller's call
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        if not self.enabled:
+            return fn(*args, **kwargs)
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if leader:
+            try:
+                call.value = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            if call.waiters:
+                logger.debug(f"Single flight {key!r}: result shared with {call.waiters} waiting request(s)")
+        else:
+            timeout = self.timeout if timeout is None else timeout
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Timed out after {timeout:.1f}s waiting for in-flight request {key!r}")
+
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> dict:
+        total = self.calls + self.shared
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "coalesced_rate": self.shared / total if total else 0.0,
+            "in_flight": self.in_flight(),
+        }
+
+
+def make_flight_group() -> SingleFlight:
+    """A SingleFlight configured from `utils.settings`."""
+    return SingleFlight(timeout=settings.SINGLEFLIGHT_TIMEOUT, enabled=settings.SINGLEFLIGHT_ENABLED)
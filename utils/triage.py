@@ -0,0 +1,463 @@
+"""
+Headless first aid triage: the app's image and text analysis without Streamlit.
+
+`triage_text` and `triage_image` answer one report or photo. `TriageRunner` runs
+many of them from asyncio: images are decoded and downscaled in a process pool
+(CPU bound, one core per worker) and model calls go through a thread pool with at
+most `concurrency` in flight. The CLI triages folders of incident photos and CSVs
+of text reports, appending each result to a JSONL file as soon as it is ready;
+that file is also the checkpoint, so `--resume` skips items already answered:
+
+    python -m utils.triage photos/ reports.csv -o triage.jsonl --resume --report report.json
+
+The HTTP API in `api.py` is built on the same runner.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional, Set
+
+from utils import settings
+from utils.ai_helpers import (
+    FIRST_AID_FAILED,
+    IMAGE_ANALYSIS_FAILED,
+    analyze_image,
+    analyze_image_with_steps,
+    generate_first_aid_steps,
+    is_stored_fallback,
+)
+from utils.image_prep import PreparedImage, preprocess_image
+
+try:
+    import resource
+except ImportError:  # Windows: CPU time falls back to time.process_time()
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+# CSV columns holding the report text and the incident id, in order of preference
+TEXT_COLUMNS = ("description", "report", "text", "injury")
+ID_COLUMNS = ("id", "incident_id", "report_id")
+
+
+@dataclass
+class TriageItem:
+    """One photo (`path` or raw `data`) or text report to triage."""
+    id: str
+    kind: str  # "image" or "text"
+    source: str
+    text: str = ""
+    path: Optional[str] = None
+    data: Optional[bytes] = None
+
+
+# --- Single items (blocking; safe to call from threads) ---
+
+def _status(failed: bool, steps: Optional[str]) -> str:
+    # "fallback": no model answer (budget missed or the call failed); the steps are stored protocol cards
+    if failed:
+        return "error"
+    return "fallback" if is_stored_fallback(steps) else "ok"
+
+
+def _budget(latency_budgets: bool) -> Optional[float]:
+    # None keeps the configured budget; 0 waits for the model's answer (up to GEMINI_TIMEOUT)
+    return None if latency_budgets else 0
+
+
+def triage_text(description: str, latency_budgets: bool = True) -> dict:
+    """
+    First aid steps for a text report: {"status", "steps"[, "error"]}.
+    With `latency_budgets=False` the model's answer is awaited instead of a stored card.
+    """
+    errors: List[str] = []
+    steps = generate_first_aid_steps(description, on_error=errors.append, budget=_budget(latency_budgets))
+    result = {"status": _status(steps == FIRST_AID_FAILED, steps), "steps": steps}
+    if errors:
+        result["error"] = errors[0]
+    return result
+
+
+def triage_image(prepared: PreparedImage, latency_budgets: bool = True) -> dict:
+    """Description and first aid steps for a preprocessed photo, as the app produces them."""
+    errors: List[str] = []
+    budget = _budget(latency_budgets)
+    if settings.IMAGE_ANALYSIS_MODE == "two_step":
+        description = analyze_image(prepared, on_error=errors.append, budget=budget)
+        # A failed description still gets the general stored card as its steps
+        steps = generate_first_aid_steps(description, on_error=errors.append, budget=budget)
+        sections = {"description": description, "steps": steps}
+    else:
+        sections = dict(analyze_image_with_steps(prepared, on_error=errors.append, budget=budget))
+
+    failed = sections.get("description") == IMAGE_ANALYSIS_FAILED or sections.get("steps", FIRST_AID_FAILED) == FIRST_AID_FAILED
+    result = {"status": _status(failed, sections.get("steps")), **sections}
+    if errors:
+        result["error"] = errors[0]
+    return result
+
+
+def prepare_image(path: Optional[str] = None, data: Optional[bytes] = None) -> PreparedImage:
+    """Preprocesses an image file or raw bytes; a top-level function so process pools can pickle it."""
+    import io
+
+    if data is not None:
+        return preprocess_image(io.BytesIO(data))
+    with open(path, "rb") as f:
+        return preprocess_image(f)
+
+
+# --- Inputs ---
+
+def _items_from_csv(path: str) -> Iterator[TriageItem]:
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        columns = {name.strip().lower(): name for name in reader.fieldnames or [] if name}
+        text_column = next((columns[c] for c in TEXT_COLUMNS if c in columns), None)
+        if text_column is None:
+            logger.warning(f"Skipping {path}: no {'/'.join(TEXT_COLUMNS)} column")
+            return
+        id_column = next((columns[c] for c in ID_COLUMNS if c in columns), None)
+        for row_number, row in enumerate(reader, start=1):
+            text = (row.get(text_column) or "").strip()
+            if not text:
+                continue
+            row_id = (row.get(id_column) or "").strip() if id_column else ""
+            yield TriageItem(
+                id=f"{path}#{row_id or row_number}",
+                kind="text",
+                source=f"{path}:{row_number + 1}",  # line in the file, after the header
+                text=text,
+            )
+
+
+def _item_for_file(path: str) -> Iterator[TriageItem]:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        yield TriageItem(id=path, kind="image", source=path, path=path)
+    elif extension == ".csv":
+        yield from _items_from_csv(path)
+
+
+def iter_items(paths: Iterable[str]) -> Iterator[TriageItem]:
+    """
+    Lazily lists the photos and CSV text reports in `paths` (files or folders, searched
+    recursively in sorted order). Item ids are stable across runs, for resuming.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield from _item_for_file(os.path.join(root, name))
+        else:
+            yield from _item_for_file(path)
+
+
+# --- Output and checkpointing ---
+
+def load_checkpoint(path: str) -> Set[str]:
+    """
+    Ids answered successfully in an earlier run's JSONL output (a cut-off last line is
+    ignored). Errors and stored-card fallbacks are not counted, so they are retried.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    # Binary: a line cut inside a multi-byte character must not stop the whole read
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:  # includes UnicodeDecodeError
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def _open_output(path: str, resume: bool):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    if not resume:
+        return open(path, "w", encoding="utf-8")
+    # A run killed mid-write leaves a partial line: start the next record on a fresh line.
+    # Checked in binary mode, since the cut can fall inside a multi-byte character.
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    return open(path, "a", encoding="utf-8")
+
+
+# --- Async runner ---
+
+class TriageRunner:
+    """
+    Runs triage items from asyncio with bounded concurrency.
+    Image preprocessing goes to a process pool (started on the first image) and model
+    calls to a thread pool of `concurrency` threads. Use as an async context manager.
+    `latency_budgets=False` waits for every model answer instead of showing stored cards
+    after the app's latency budgets.
+    """
+
+    def __init__(self, concurrency: int = settings.TRIAGE_CONCURRENCY, prep_workers: int = settings.TRIAGE_PREP_WORKERS,
+                 latency_budgets: bool = True):
+        self.concurrency = max(concurrency, 1)
+        self.prep_workers = max(prep_workers, 1)
+        self.latency_budgets = latency_budgets
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+
+    async def __aenter__(self) -> "TriageRunner":
+        self._threads = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="triage")
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        if self._processes is not None:
+            self._processes.shutdown(wait=True, cancel_futures=True)
+            self._processes = None
+        if self._threads is not None:
+            self._threads.shutdown(wait=True, cancel_futures=True)
+            self._threads = None
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(max_workers=self.prep_workers)
+        return self._processes
+
+    async def _call(self, pool, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+    async def triage(self, item: TriageItem) -> dict:
+        """
+        Triages one item. Failures are returned, never raised: status "invalid" for an
+        unreadable image, "error" when the model call failed.
+        """
+        record = {"id": item.id, "kind": item.kind, "source": item.source}
+        start = time.perf_counter()
+        try:
+            if item.kind == "image":
+                try:
+                    prepared = await self._call(self._process_pool(), prepare_image, item.path, item.data)
+                except BrokenExecutor:
+                    raise
+                except Exception as e:
+                    # Not a model failure: the file or upload is not a readable image
+                    return {**record, "status": "invalid", "error": f"Error reading image: {e}"}
+                record["image"] = {"bytes_in": prepared.bytes_in, "bytes_out": prepared.bytes_out,
+                                   "width": prepared.width, "height": prepared.height}
+                record["prep_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                model_start = time.perf_counter()
+                result = await self._call(self._threads, triage_image, prepared, self.latency_budgets)
+            else:
+                model_start = time.perf_counter()
+                result = await self._call(self._threads, triage_text, item.text, self.latency_budgets)
+            record["model_ms"] = round((time.perf_counter() - model_start) * 1000, 1)
+            return {**record, **result}
+        except Exception as e:
+            logger.exception(f"Triage of {item.id} failed")
+            return {**record, "status": "error", "error": str(e)}
+
+    async def map(self, items: Iterable[TriageItem]) -> AsyncIterator[dict]:
+        """
+        Triages `items` and yields results in completion order. At most `concurrency +
+        prep_workers` items are in progress, so images are preprocessed while others
+        wait for the model, and inputs are read lazily.
+        """
+        window = self.concurrency + self.prep_workers
+        pending = set()
+        try:
+            for item in items:
+                if len(pending) >= window:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+                pending.add(asyncio.ensure_future(self.triage(item)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # The consumer stopped early (e.g. an API client disconnected): drop the items
+            # still queued. Model calls already running in a thread finish on their own.
+            for task in pending:
+                task.cancel()
+
+
+# --- Batch runs and throughput reports ---
+
+@dataclass
+class BatchReport:
+    items: int = 0
+    ok: int = 0
+    fallback: int = 0  # stored protocol cards after a missed latency budget
+    failed: int = 0
+    skipped: int = 0  # already answered in an earlier run
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0  # this process plus the preprocessing workers
+    concurrency: int = 0
+    prep_workers: int = 0
+    gemini_calls: int = 0
+    gemini_retries: int = 0
+    quota_rpm: float = 0.0
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def items_per_cpu_second(self) -> float:
+        """Throughput per core: items one fully busy core would get through per second."""
+        return self.items / self.cpu_seconds if self.cpu_seconds else 0.0
+
+    @property
+    def calls_per_item(self) -> float:
+        return self.gemini_calls / self.items if self.items else 0.0
+
+    @property
+    def calls_per_minute(self) -> float:
+        return self.gemini_calls / self.wall_seconds * 60 if self.wall_seconds else 0.0
+
+    @property
+    def items_per_minute_at_quota(self) -> Optional[float]:
+        """Most items per minute the upstream quota allows at this run's calls per item."""
+        if not self.quota_rpm or not self.calls_per_item:
+            return None
+        return self.quota_rpm / self.calls_per_item
+
+    def to_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "items_per_second": round(self.items_per_second, 3),
+            "items_per_cpu_second": round(self.items_per_cpu_second, 3),
+            "calls_per_item": round(self.calls_per_item, 3),
+            "calls_per_minute": round(self.calls_per_minute, 1),
+            "items_per_minute_at_quota": self.items_per_minute_at_quota,
+        }
+
+    def format(self) -> str:
+        lines = [
+            f"Triaged {self.items} items ({self.ok} ok, {self.fallback} stored cards, {self.failed} failed, "
+            f"{self.skipped} skipped from checkpoint) "
+            f"in {self.wall_seconds:.1f}s",
+            f"  throughput        {self.items_per_second:.2f} items/s "
+            f"(concurrency {self.concurrency}, {self.prep_workers} preprocessing workers)",
+            f"  per core          {self.items_per_cpu_second:.2f} items per CPU-second "
+            f"({self.cpu_seconds:.1f} CPU-s in total)",
+            f"  upstream          {self.gemini_calls} Gemini calls ({self.gemini_retries} retries), "
+            f"{self.calls_per_item:.2f} per item, {self.calls_per_minute:.0f}/min",
+        ]
+        if self.items_per_minute_at_quota is not None:
+            lines.append(
+                f"  quota             {self.quota_rpm:g} requests/min allows {self.items_per_minute_at_quota:.0f} items/min "
+                f"(this run used {self.calls_per_minute / self.quota_rpm:.0%} of it)"
+            )
+        return "\n".join(lines)
+
+
+def _cpu_seconds() -> float:
+    if resource is None:
+        return time.process_time()  # this process only: worker processes are not counted
+    usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+async def _run_batch(items, output_path, resume, runner, report) -> None:
+    done = load_checkpoint(output_path) if resume else set()
+    if done:
+        logger.info(f"Resuming: {len(done)} items already answered in {output_path}")
+
+    def pending():
+        for item in items:
+            if item.id in done:
+                report.skipped += 1
+            else:
+                yield item
+
+    with _open_output(output_path, resume) as output:
+        async with runner:
+            async for record in runner.map(pending()):
+                # One line per result, flushed at once: the file is the checkpoint
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                report.items += 1
+                if record["status"] == "ok":
+                    report.ok += 1
+                elif record["status"] == "fallback":
+                    report.fallback += 1
+                else:
+                    report.failed += 1
+                    logger.warning(f"{record['id']}: {record.get('error', 'failed')}")
+
+
+def run_batch(
+    inputs: Iterable[str],
+    output_path: str,
+    resume: bool = False,
+    concurrency: int = settings.TRIAGE_CONCURRENCY,
+    prep_workers: int = settings.TRIAGE_PREP_WORKERS,
+    quota_rpm: float = settings.GEMINI_QUOTA_RPM,
+    latency_budgets: bool = True,
+) -> BatchReport:
+    """
+    Triages every photo and CSV report under `inputs` into `output_path` (JSONL) and reports throughput.
+    `latency_budgets` is passed to TriageRunner.
+    """
+    from utils.gemini_client import get_gemini_client
+
+    client = get_gemini_client()
+    calls, retries = client.calls, client.retries
+    report = BatchReport(concurrency=concurrency, prep_workers=prep_workers, quota_rpm=quota_rpm)
+    runner = TriageRunner(concurrency=concurrency, prep_workers=prep_workers, latency_budgets=latency_budgets)
+
+    cpu_start, start = _cpu_seconds(), time.perf_counter()
+    asyncio.run(_run_batch(iter_items(inputs), output_path, resume, runner, report))
+    # Worker processes have exited by now, so their CPU time is included
+    report.wall_seconds = time.perf_counter() - start
+    report.cpu_seconds = _cpu_seconds() - cpu_start
+    report.gemini_calls, report.gemini_retries = client.calls - calls, client.retries - retries
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Triage folders of incident photos and CSVs of text reports.")
+    parser.add_argument("inputs", nargs="+", help="image files, CSV files or folders containing them")
+    parser.add_argument("-o", "--output", default="triage.jsonl", help="JSONL results (and checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="skip items already answered in --output")
+    parser.add_argument("--concurrency", type=int, default=settings.TRIAGE_CONCURRENCY, help="model calls in flight")
+    parser.add_argument("--workers", type=int, default=settings.TRIAGE_PREP_WORKERS, help="image preprocessing processes")
+    parser.add_argument("--quota-rpm", type=float, default=settings.GEMINI_QUOTA_RPM,
+                        help="upstream requests/min quota, for the report")
+    parser.add_argument("--report", help="also write the throughput report as JSON to this file")
+    parser.add_argument("--latency-budget", action="store_true",
+                        help="keep the app's latency budgets (stored cards when a model answers late)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    # Nobody is waiting on a batch item: unless asked, wait for the model's answer (up to
+    # GEMINI_TIMEOUT) rather than settling for a stored card
+    report = run_batch(args.inputs, args.output, resume=args.resume, concurrency=args.concurrency,
+                       prep_workers=args.workers, quota_rpm=args.quota_rpm, latency_budgets=args.latency_budget)
+    print(report.format(), file=sys.stderr)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, indent=2)
+    return 0 if report.failed == 0 and report.fallback == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
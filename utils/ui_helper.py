@@ -1,5 +1,175 @@
+import numpy as np
 import streamlit as st
+import pandas as pd
+
+from utils.map_helper import facilities_to_markdown, find_nearby_facilities, parse_facilities_to_df
+
 
 def show_footer():
     st.markdown("---")
     st.caption("⚕️ Powered by OpenAI • Built with Streamlit • MVP Demo")
+
+
+def show_facilities_results(location_query: str):
+    """
+    Combines search + display logic for Streamlit.
+    """
+    st.subheader("🗺️ Nearby Healthcare Facilities")
+
+    with st.spinner("Searching for nearby hospitals..."):
+        result_text = find_nearby_facilities(location_query, on_error=st.error)
+
+    facilities_df = parse_facilities_to_df(result_text)
+
+    st.markdown(facilities_to_markdown(facilities_df) if not facilities_df.empty else result_text)
+
+    if not facilities_df.empty:
+        st.dataframe(facilities_df, use_container_width=True)
+    else:
+        st.info("Gemini returned text results only — no coordinates available for mapping.")
+
+
+def show_location_banner(slot, location: dict):
+    """
+    Shows the detected position (and its address once known) in `slot`, e.g. an st.empty().
+    """
+    lat, lon = location["lat"], location["lon"]
+    if location.get("address"):
+        slot.success(f"✅ Location detected: {location['address']}\n\nCoordinates: {lat:.6f}, {lon:.6f}")
+    else:
+        slot.success(f"✅ Location detected at coordinates: {lat:.6f}, {lon:.6f}")
+
+
+def show_location_result(result: dict):
+    """
+    Re-displays a stored "Detect My Location" search without any new requests.
+    """
+    show_location_banner(st, result)
+    show_nearby_hospitals(result["lat"], result["lon"], result["results_text"], result["facilities_df"])
+
+
+def show_first_aid_result(result: dict):
+    """
+    Shows a stored analysis: the image description (if any) and the first aid steps.
+    """
+    if result.get("description"):
+        st.success("✅ Image analyzed successfully.")
+        st.markdown(f"**Analysis Result:** {result['description']}")
+    st.markdown("### 🩹 First Aid Steps")
+    st.markdown(result["steps"])
+
+
+def show_nearby_hospitals(lat: float, lon: float, results_text, facilities_df: pd.DataFrame):
+    """
+    Shows hospitals found around the user's position, nearest first: one table and one map
+    with the user's location highlighted.
+    `results_text` is None when the results came from the offline hospital index.
+    """
+    st.markdown("### 🏥 Nearby Hospitals")
+    if results_text is None:
+        st.caption("Results from the offline hospital index.")
+    if facilities_df.empty:
+        st.markdown(_no_results_message(results_text))
+        return
+
+    show_facilities_table(facilities_df)
+    st.markdown("---")
+    st.markdown("### 📍 Hospital Locations Map")
+    show_facilities_map(facilities_df, origin=(lat, lon))
+
+
+def show_search_results(results_text: str, facilities_df: pd.DataFrame, origin=None):
+    """
+    Shows the hospitals found for an address search, with a map when coordinates are known.
+    `origin` is the geocoded search location, highlighted on the map when known.
+    """
+    st.markdown("### 🏥 Nearby Hospitals")
+    if facilities_df.empty:
+        st.markdown(_no_results_message(results_text))
+        return
+
+    show_facilities_table(facilities_df)
+    st.markdown("---")
+    st.markdown("### 📍 Hospital Locations Map")
+    show_facilities_map(facilities_df, origin=origin, origin_label="Searched location")
+
+
+def _no_results_message(results_text) -> str:
+    # A JSON answer that left nothing after radius filtering is not worth showing raw
+    if results_text and not results_text.lstrip().startswith(("[", "{", "```")):
+        return results_text
+    return "No hospitals found within the search radius. Try a larger radius or another location."
+
+
+def show_facilities_table(facilities_df: pd.DataFrame):
+    """
+    Lists the facilities as a single table (one element, however many rows), in the DataFrame's order.
+    """
+    columns = [c for c in ("name", "address", "distance_km", "direction", "phone") if c in facilities_df]
+    st.dataframe(
+        facilities_df[columns],
+        hide_index=True,
+        column_config={
+            "name": st.column_config.TextColumn("Hospital"),
+            "address": st.column_config.TextColumn("Address"),
+            "distance_km": st.column_config.NumberColumn("Distance", format="%.1f km"),
+            "direction": st.column_config.TextColumn("Direction"),
+            "phone": st.column_config.TextColumn("Phone"),
+        },
+    )
+
+
+FACILITY_COLOR = [220, 38, 38]
+ORIGIN_COLOR = [37, 99, 235]
+
+
+def show_facilities_map(facilities_df: pd.DataFrame, origin=None, origin_label: str = "Your Location"):
+    """
+    Displays facilities with known coordinates and the origin (lat, lon), if given,
+    as one pydeck scatter layer; the origin is drawn larger and in another colour.
+    """
+    import pydeck as pdk
+
+    if {"lat", "lon"}.issubset(facilities_df.columns):
+        located = facilities_df.dropna(subset=["lat", "lon"])
+    else:
+        located = facilities_df.iloc[:0]
+    if located.empty:
+        st.warning("Map skipped — Gemini results do not include coordinates.")
+        return
+
+    points = pd.DataFrame({
+        "name": located["name"].to_numpy(),
+        "address": located["address"].to_numpy() if "address" in located else "",
+        "lat": located["lat"].to_numpy(dtype=float),
+        "lon": located["lon"].to_numpy(dtype=float),
+        "color": [FACILITY_COLOR] * len(located),
+        "radius": 7,
+    })
+    if origin is not None:
+        lat, lon = origin
+        points = pd.concat([points, pd.DataFrame([{
+            "name": origin_label, "address": f"{lat:.5f}, {lon:.5f}", "lat": lat, "lon": lon,
+            "color": ORIGIN_COLOR, "radius": 11,
+        }])], ignore_index=True)
+
+    # Zoom so that every point fits: each zoom level halves the visible span
+    span = max(points["lat"].max() - points["lat"].min(), points["lon"].max() - points["lon"].min(), 0.01)
+    view = pdk.ViewState(
+        latitude=float(points["lat"].mean()),
+        longitude=float(points["lon"].mean()),
+        zoom=float(np.clip(np.log2(360 / span) - 1.5, 1, 15)),
+    )
+    layer = pdk.Layer(
+        "ScatterplotLayer",
+        data=points,
+        get_position="[lon, lat]",
+        get_fill_color="color",
+        get_radius="radius",
+        radius_units="pixels",
+        stroked=True,
+        get_line_color=[255, 255, 255],
+        line_width_min_pixels=1,
+        pickable=True,
+    )
+    st.pydeck_chart(pdk.Deck(layers=[layer], initial_view_state=view, tooltip={"text": "{name}\n{address}"}))